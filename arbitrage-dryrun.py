@@ -1,10 +1,11 @@
+import argparse
 import asyncio
-import json
+import functools
 import websockets
-from collections import defaultdict
 import time
 import logging
 import traceback
+import numpy as np
 
 ###############################################################################
 # LOGGING SETUP
@@ -19,11 +20,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Imported after logging is configured so config.py's basicConfig is a no-op here
+from config import Config
+from currency_graph import CurrencyGraph
+from decoders import TICKER, CONTROL, BOOK
+from exchanges import CoinbaseAdapter, VENUES, build_adapters, listed_mask
+from feed_capture import CaptureWriter, replay_capture
+from feed_session import Backoff, SubscriptionTracker
+from instruments import InstrumentRegistry
+from latency import LatencyRecorder, report_periodically, install_dump_signal
+from log_pipeline import TickLog, start_queue_logging
+from metrics import FeedStats, MetricsRegistry, MetricsServer
+from order_book import BookBoard, executable_spread
+from parquet_sink import ParquetSink, QUOTE_COLUMNS
+from quote_board import BoardReader, DEFAULT_NAME as DEFAULT_BOARD
+from shards import ShardedFeeds
+from spread_engine import ArbitrageEngine, BUY_MULT, SELL_MULT
+
 ###############################################################################
 # CONFIG
 ###############################################################################
 
-# We'll define a list of trading pairs we want to watch:
+CONFIG = Config.load()
+
+# Shared instrument registry built from config.json; quotes are keyed by its ids
+REGISTRY = InstrumentRegistry.from_config(CONFIG)
+
+# Per-pair overrides; every other pair in config.json uses DEFAULT_PAIR_PARAMS
 PAIRS_CONFIG = [
     {
         "cb_symbol": "BTC-USD",
@@ -41,131 +64,254 @@ PAIRS_CONFIG = [
     },
 ]
 
-# How frequently (in seconds) we check for arbitrage
+# Absolute thresholds only make sense per quote currency, so pairs without an
+# override qualify on a net spread relative to the buy price instead
+DEFAULT_PAIR_PARAMS = {
+    "min_spread_usd": 0.0,
+    "min_spread_pct": 0.001,  # 0.1% of the buy price
+    "fee_buy": 0.005,
+    "fee_sell": 0.005,
+}
+
+# Trade size for the depth-aware (--depth) check, in the pair's quote currency.
+# PAIRS_CONFIG entries can set their own "notional".
+DEFAULT_NOTIONAL = {
+    "USD": 1000.0,
+    "EUR": 1000.0,
+    "GBP": 1000.0,
+    "BTC": 0.02,
+    "ETH": 0.5,
+}
+
+# L2 book depth subscribed to with --depth on venues that take one (Kraken);
+# Coinbase's book channel is CoinbaseAdapter.BOOK_CHANNEL
+KRAKEN_BOOK_DEPTH = 25
+
+# Multi-currency cycles (--cycles): trades per cycle, and the minimum return after
+# fees (0.001 = 0.1%). Two-trade cycles are the cross-exchange routes checked anyway.
+CYCLE_MIN_LEGS = 3
+CYCLE_MAX_LEGS = 3
+CYCLE_MIN_PROFIT = 0.001
+
+# Watch every pair in config.json; set to False to watch only PAIRS_CONFIG
+WATCH_ALL_PAIRS = True
+
+# How frequently (in seconds) the optional polling fallback checks for arbitrage
 CHECK_INTERVAL_SECS = 2
 
-# We'll store the latest quotes in this global dictionary:
-# latest_quotes["coinbase"]["BTC-USD"] = {"bid": float, "ask": float}
-# latest_quotes["kraken"]["XBT/USD"]   = {"bid": float, "ask": float}
-latest_quotes = defaultdict(lambda: defaultdict(lambda: {"bid": None, "ask": None}))
+def build_engine(registry, pairs_config, watch_all=True, max_age=0.0, skew_window=1000):
+    """Create the quote/parameter arrays and mark the watched pairs"""
+    overrides = {}
+    for cfg in pairs_config:
+        pair_id = registry.venue("coinbase").get(cfg["cb_symbol"])
+        if pair_id is None or registry[pair_id].kraken_symbol != cfg["kr_symbol"]:
+            logger.warning(f"[CONFIG] {cfg['cb_symbol']}/{cfg['kr_symbol']} not in config.json; skipping")
+            continue
+        overrides[pair_id] = cfg
+
+    engine = ArbitrageEngine(len(registry), max_age, skew_window, VENUES, listed_mask(registry))
+    for instrument in registry:
+        cfg = overrides.get(instrument.id)
+        if cfg is None and not watch_all:
+            continue
+        if cfg is None:
+            params = DEFAULT_PAIR_PARAMS
+        else:
+            # Explicit overrides keep their absolute-only threshold
+            params = {**DEFAULT_PAIR_PARAMS, "min_spread_pct": 0.0, **cfg}
+        quote_ccy = instrument.standard_pair.split("-")[-1]
+        engine.configure(
+            instrument.id,
+            params["fee_buy"],
+            params["fee_sell"],
+            params["min_spread_usd"],
+            params["min_spread_pct"],
+            params.get("notional", DEFAULT_NOTIONAL.get(quote_ccy, 0.0))
+        )
+    return engine
+
+# Latest quotes, fees and thresholds for every pair, indexed by registry id
+ENGINE = build_engine(REGISTRY, PAIRS_CONFIG, WATCH_ALL_PAIRS,
+                      CONFIG.freshness.max_age, CONFIG.freshness.skew_window)
+WATCHED_PAIRS = [REGISTRY[pair_id] for pair_id in np.flatnonzero(ENGINE.watched)]
+
+# Wakes the evaluator when a quote changes; the pairs are tracked in ENGINE.dirty
+ARB_WAKEUP = asyncio.Event()
+
+# Set by --store or storage.enabled; every quote update is appended to this sink.
+# Its exchange column holds the venue's index in VENUES.
+QUOTES = None
+
+# Set by --capture; every raw frame received is appended to this writer
+CAPTURE = None
+
+# Set by --depth; per-pair L2 books that replace the ticker top of book
+BOOKS = None
+
+# Set by --cycles; currency graph over every watched pair on every venue
+GRAPH = None
+
+# Connection, subscription, decoding and symbol mapping per venue (exchanges.py)
+ADAPTERS = build_adapters(REGISTRY, CONFIG.feeds)
+
+# Per-stage latency histograms (exchange -> receive -> decode -> store -> signal)
+LATENCY = LatencyRecorder(VENUES, REGISTRY.standard_pairs, react="signal")
+LATENCY_REPORT_SECS = 60
+
+# Hot-path counters for the metrics endpoint; derived gauges are added in start_metrics()
+METRICS = MetricsRegistry("arbitrage")
+FEEDS = {venue: FeedStats(venue) for venue in VENUES}
+
+# Subscription acks since each connection's last (re)subscribe
+SUBSCRIPTIONS = {
+    name: SubscriptionTracker(name, adapter.symbols(WATCHED_PAIRS)) for name, adapter in ADAPTERS.items()
+}
+OPPORTUNITIES = METRICS.counter("opportunities_total", "Arbitrage opportunities logged", ("route",))
+STALE_SIGNALS = METRICS.counter("stale_signals_total",
+                                "Opportunities suppressed because a leg was older than max_age", ("route",))
+
+# Per-tick log lines are sampled and rate-limited per category (logging section of config.json);
+# the opportunities counter above still counts every opportunity
+TICKS = TickLog(logger)
+QUOTE_LOG = TICKS.category("quote", CONFIG.logging.quote_sample, CONFIG.logging.quote_rate)
+OPPORTUNITY_LOG = TICKS.category("opportunity", CONFIG.logging.opportunity_sample, CONFIG.logging.opportunity_rate)
+LABELS = [ADAPTERS[venue].label for venue in VENUES]
 
 ###############################################################################
 # 1) WebSocket Subscriptions
 ###############################################################################
 
-async def subscribe_coinbase(pairs_config):
-    """
-    Single WebSocket connection to Coinbase, subscribing to the 'ticker' channel
-    for all specified pairs (cb_symbol).
-    We'll store best bid/ask in latest_quotes["coinbase"][cb_symbol].
-    """
-    url = "wss://ws-feed.exchange.coinbase.com"
-    product_ids = [p["cb_symbol"] for p in pairs_config]
-
-    while True:
-        try:
-            async with websockets.connect(url) as ws:
-                logger.info("[Coinbase WS] Connected.")
-                subscribe_msg = {
-                    "type": "subscribe",
-                    "channels": [{"name": "ticker", "product_ids": product_ids}]
-                }
-                await ws.send(json.dumps(subscribe_msg))
-                logger.info(f"[Coinbase WS] Subscribed to: {product_ids}")
-
-                while True:
-                    message = await ws.recv()
-                    # Log every incoming message at DEBUG level
-                    logger.debug(f"[Coinbase WS] Raw message: {message}")
-
-                    data = json.loads(message)
-                    if data.get("type") == "ticker":
-                        cb_symbol = data.get("product_id")
-                        best_bid = data.get("best_bid")
-                        best_ask = data.get("best_ask")
-                        if cb_symbol and best_bid and best_ask:
-                            latest_quotes["coinbase"][cb_symbol]["bid"] = float(best_bid)
-                            latest_quotes["coinbase"][cb_symbol]["ask"] = float(best_ask)
-                            logger.info(
-                                f"[Coinbase WS] Updated {cb_symbol}: Bid={best_bid}, Ask={best_ask}"
-                            )
-
-        except websockets.ConnectionClosed:
-            logger.warning("[Coinbase WS] Connection closed; reconnecting...")
-            logger.warning(f"[Coinbase WS] Connection close details: {traceback.format_exc()}")
-            await asyncio.sleep(5)
-        except Exception as e:
-            logger.error(f"[Coinbase WS] Error: {e}; reconnecting...")
-            logger.error(f"[Coinbase WS] Full traceback: {traceback.format_exc()}")
-            await asyncio.sleep(5)
+def apply_quote(venue, pair_id, bid, ask, exchange_ts, received, decoded_ns):
+    """Store one venue's top of book and wake the evaluator"""
+    ENGINE.update(pair_id, venue, bid, ask, exchange_ts, received[0])
+    name = VENUES[venue]
+    feed = FEEDS[name]
+    if feed.gap_open:
+        feed.close_gap()
+    if QUOTES is not None:
+        QUOTES.record((received[0] or time.time(), pair_id, venue, bid, ask))
+    LATENCY.message(name, pair_id, received, decoded_ns, time.perf_counter_ns(), exchange_ts)
+    ARB_WAKEUP.set()
 
 
-async def subscribe_kraken(pairs_config):
+def handle_message(adapter, message, received=None):
     """
-    Single WebSocket connection to Kraken, subscribing to the 'ticker' channel
-    for all specified pairs (kr_symbol).
-    We'll store best bid/ask in latest_quotes["kraken"][kr_symbol].
+    Apply one raw frame from adapter's venue to the quote arrays, the books or
+    the venue's subscription state.
+    received is (wall time, perf_counter_ns) from the socket read; replays pass None.
     """
-    url = "wss://ws.kraken.com/"
-    channel_map = {}  # channel_id -> kr_symbol
+    if received is None:
+        received = (None, time.perf_counter_ns())
+    decoder = adapter.decoder
+    kind = decoder.classify(message)
+    if kind == TICKER:
+        tick = decoder.decode_ticker(message)
+        if tick is None:
+            FEEDS[adapter.name].decode_errors += 1
+            return
+        decoded_ns = time.perf_counter_ns()
+        pair_id = adapter.pair_id(tick)
+        if pair_id is not None and tick.bid and tick.ask:
+            apply_quote(adapter.index, pair_id, tick.bid, tick.ask, tick.timestamp, received, decoded_ns)
+            QUOTE_LOG.log("[%s WS] Updated %s: Bid=%s, Ask=%s", adapter.label, tick.symbol, tick.bid, tick.ask)
+
+    elif kind == BOOK:
+        if BOOKS is not None:
+            handle_book(adapter, message, received)
+
+    elif kind == CONTROL:
+        adapter.on_control(decoder.decode_control(message), SUBSCRIPTIONS[adapter.name])
+
+
+def handle_book(adapter, message, received):
+    """Apply an L2 snapshot or update and republish the book's top"""
+    update = adapter.decoder.decode_book(message)
+    if update is None:
+        FEEDS[adapter.name].decode_errors += 1
+        return
+    decoded_ns = time.perf_counter_ns()
+    pair_id = adapter.by_symbol.get(update.symbol)
+    if pair_id is None:
+        return
+    book = BOOKS.books[adapter.index][pair_id]
+    book.apply(update)
+    apply_quote(adapter.index, pair_id, book.best_bid(), book.best_ask(), update.timestamp, received, decoded_ns)
+
+
+# Raw frame handler per venue, for the live feeds and --replay
+HANDLERS = {name: functools.partial(handle_message, adapter) for name, adapter in ADAPTERS.items()}
+
+
+def handle_quote_record(exchange, pair_id, bid, ask, last, exchange_ts, received, decoded_ns):
+    """Apply one already-decoded quote from a --workers feed shard or the --board quote board"""
+    if not (bid > 0 and ask > 0):
+        return
+    if exchange_ts != exchange_ts:
+        exchange_ts = None  # NaN: the feed carries no timestamp
+    apply_quote(exchange, pair_id, bid, ask, exchange_ts, received, decoded_ns)
+    QUOTE_LOG.log("[%s] Updated %s: Bid=%s, Ask=%s", VENUES[exchange], REGISTRY[pair_id].standard_pair, bid, ask)
+
+
+def reconnect_backoff():
+    return Backoff(CONFIG.feeds.reconnect_min, CONFIG.feeds.reconnect_max)
+
+
+async def subscribe_feed(adapter, instruments, book_depth=0):
+    """
+    Single WebSocket connection to one venue, subscribing to its ticker channel
+    (or its L2 book channel with --depth) for every instrument it lists.
+    Best bid/ask land in the venue's column of ENGINE.bids/asks[pair_id].
+    Runs independently of the other venues and reconnects with jittered backoff.
+    """
+    symbols = adapter.symbols(instruments)
+    messages = adapter.subscribe_messages(symbols, book_depth)
+    channel = "book" if book_depth else "ticker"
+    name = f"[{adapter.label} WS]"
+    handler = HANDLERS[adapter.name]
+    feed = FEEDS[adapter.name]
+    subscriptions = SUBSCRIPTIONS[adapter.name]
+    backoff = reconnect_backoff()
 
     while True:
         try:
-            async with websockets.connect(url) as ws:
-                logger.info("[Kraken WS] Connected.")
-
-                # Subscribe to each kr_symbol
-                for p in pairs_config:
-                    kr_symbol = p["kr_symbol"]
-                    sub_msg = {
-                        "event": "subscribe",
-                        "pair": [kr_symbol],
-                        "subscription": {"name": "ticker"}
-                    }
-                    await ws.send(json.dumps(sub_msg))
-                    logger.info(f"[Kraken WS] Subscribing to: {kr_symbol}")
+            async with adapter.connect() as ws:
+                backoff.connected()
+                logger.info(f"{name} Connected.")
+                feed.on_connect(ws)
+                adapter.on_connect()
+                if BOOKS is not None:
+                    # Books rebuild from the snapshots sent after subscribing
+                    BOOKS.reset(adapter.index)
+
+                # Batched subscribes; acks are counted by the venue's SubscriptionTracker
+                subscriptions.start()
+                for subscribe_msg in messages:
+                    await ws.send(subscribe_msg)
+                logger.info(f"{name} Subscribing to {channel} for {len(symbols)} pairs")
 
                 # Listen indefinitely
                 while True:
-                    msg = await ws.recv()
-                    logger.debug(f"[Kraken WS] Raw message: {msg}")
-
-                    data = json.loads(msg)
-
-                    if isinstance(data, dict) and data.get("event") == "subscriptionStatus":
-                        # For example: {"channelID": 42, "event": "subscriptionStatus", "pair": "XBT/USD", "status": "subscribed", ...}
-                        if data.get("status") == "subscribed":
-                            channel_id = data.get("channelID")
-                            pair_name = data.get("pair")
-                            channel_map[channel_id] = pair_name
-                            logger.info(
-                                f"[Kraken WS] Subscribed (channel_id={channel_id}) to pair: {pair_name}"
-                            )
-
-                    elif isinstance(data, list) and len(data) > 1:
-                        channel_id = data[0]
-                        if channel_id in channel_map:
-                            kr_symbol = channel_map[channel_id]
-                            ticker_info = data[1]
-                            if (isinstance(ticker_info, dict) 
-                                and "b" in ticker_info 
-                                and "a" in ticker_info):
-                                bid_price = float(ticker_info["b"][0])
-                                ask_price = float(ticker_info["a"][0])
-                                latest_quotes["kraken"][kr_symbol]["bid"] = bid_price
-                                latest_quotes["kraken"][kr_symbol]["ask"] = ask_price
-                                logger.info(
-                                    f"[Kraken WS] Updated {kr_symbol}: Bid={bid_price}, Ask={ask_price}"
-                                )
+                    message = await ws.recv()
+                    received = (time.time(), time.perf_counter_ns())
+                    feed.messages += 1
+                    feed.last_message = time.monotonic()
+                    if CAPTURE:
+                        CAPTURE.record(adapter.name, message)
+                    # Log every incoming message at DEBUG level (formatted only when enabled)
+                    logger.debug("%s Raw message: %s", name, message)
+
+                    handler(message, received)
 
         except websockets.ConnectionClosed:
-            logger.warning("[Kraken WS] Connection closed; reconnecting...")
-            logger.warning(f"[Kraken WS] Connection close details: {traceback.format_exc()}")
-            await asyncio.sleep(5)
+            logger.warning(f"{name} Connection closed; reconnecting...")
+            logger.warning(f"{name} Connection close details: {traceback.format_exc()}")
         except Exception as e:
-            logger.error(f"[Kraken WS] Error: {e}; reconnecting...")
-            logger.error(f"[Kraken WS] Full traceback: {traceback.format_exc()}")
-            await asyncio.sleep(5)
+            logger.error(f"{name} Error: {e}; reconnecting...")
+            logger.error(f"{name} Full traceback: {traceback.format_exc()}")
+        # Retry right away only if this connection delivered quotes and stayed up
+        backoff.disconnected(delivered=not feed.gap_open)
+        feed.on_disconnect()
+        await asyncio.sleep(backoff.next_delay())
 
 
 ###############################################################################
@@ -183,6 +329,8 @@ def calc_net_spread(buy_price, sell_price, fee_buy, fee_sell):
       - cost = buy_price + (buy_price * fee_buy)
       - revenue = sell_price - (sell_price * fee_sell)
       - net_spread = revenue - cost
+
+    ArbitrageEngine.net_spreads applies the same formula to whole arrays.
     """
     cost = buy_price * (1 + fee_buy)
     revenue = sell_price * (1 - fee_sell)
@@ -194,91 +342,391 @@ def calc_net_spread(buy_price, sell_price, fee_buy, fee_sell):
 
 last_heartbeat_time = time.time()
 
-async def check_arbitrage_loop():
+def log_heartbeat_if_idle():
+    """Log a heartbeat every 30 seconds if no opportunities were found"""
+    global last_heartbeat_time
+    now = time.time()
+    if now - last_heartbeat_time >= 30:
+        logger.info("[Arb] Heartbeat: Checking for quotes/spreads...")
+        last_heartbeat_time = now
+
+
+def check_arbitrage_once():
     """
-    Periodically check for potential cross-exchange spreads.
-    Purely logs the opportunity; does not require or use private API calls.
+    Evaluate every watched pair once against the latest quotes.
+    Returns the number of opportunities logged.
+    """
+    log_heartbeat_if_idle()
+    found = evaluate_pairs(None)
+    if GRAPH is not None:
+        found += evaluate_cycles(None)
+    return found
+
+
+def evaluate_pairs(pair_ids):
+    """
+    Check the given pair ids (None = all watched pairs) for cross-exchange
+    spreads in one vectorized pass and log only the ones that qualify.
+    With --depth, top-of-book hits are re-checked against the L2 books.
+    Returns the number of opportunities logged.
     """
     global last_heartbeat_time
+    opportunities = ENGINE.evaluate(pair_ids)
+    if opportunities.stale.any():
+        for route in np.flatnonzero(opportunities.stale).tolist():
+            STALE_SIGNALS.inc(ENGINE.route_names[route], amount=int(opportunities.stale[route]))
+    if BOOKS is not None:
+        return evaluate_depth(opportunities)
+
+    # Each hit buys on one venue @ ask and sells on another @ bid
+    for pair_id, route, net_spread in zip(opportunities.pair_ids.tolist(), opportunities.routes.tolist(),
+                                          opportunities.net.tolist()):
+        buy, sell = ENGINE.routes[route]
+        instrument = REGISTRY[pair_id]
+        OPPORTUNITY_LOG.log(
+            "[Arb] %s: BUY@%s(%.8g) => SELL@%s(%.8g) Net Spread=%.8g %s (after fees)",
+            instrument.standard_pair, LABELS[buy], ENGINE.asks[pair_id, buy], LABELS[sell],
+            ENGINE.bids[pair_id, sell], net_spread, instrument.standard_pair.split("-")[-1]
+        )
+
+    found = len(opportunities.pair_ids)
+    if found:
+        for route, count in enumerate(np.bincount(opportunities.routes, minlength=len(ENGINE.routes)).tolist()):
+            if count:
+                OPPORTUNITIES.inc(ENGINE.route_names[route], amount=count)
+        last_heartbeat_time = time.time()  # reset so we don't log heartbeat immediately
+    return found
+
+
+def evaluate_depth(opportunities):
+    """
+    Walk the books of the top-of-book candidates for each pair's notional.
+    VWAPs are never better than the top of book, so pairs that failed the
+    vectorized check cannot qualify here and are not walked.
+    """
+    global last_heartbeat_time
+    found = 0
+    for pair_id, route in zip(opportunities.pair_ids.tolist(), opportunities.routes.tolist()):
+        buy, sell = ENGINE.routes[route]
+        fee_buy, fee_sell, min_spread, min_spread_pct, notional = ENGINE.trade_params(pair_id)
+        if notional <= 0:
+            continue
+        fill = executable_spread(BOOKS.books[buy][pair_id], BOOKS.books[sell][pair_id], notional, fee_buy, fee_sell)
+        if not fill.net > max(min_spread, min_spread_pct * fill.buy_vwap):
+            continue
+        instrument = REGISTRY[pair_id]
+        quote_ccy = instrument.standard_pair.split("-")[-1]
+        OPPORTUNITY_LOG.log(
+            "[Arb] %s: BUY@%s(VWAP %.8g) => SELL@%s(VWAP %.8g) Size=%.8g "
+            "Net Spread=%.8g %s per unit (after fees, %g %s notional)",
+            instrument.standard_pair, LABELS[buy], fill.buy_vwap, LABELS[sell], fill.sell_vwap,
+            fill.qty, fill.net, quote_ccy, notional, quote_ccy
+        )
+        OPPORTUNITIES.inc(ENGINE.route_names[route])
+        found += 1
+    if found:
+        last_heartbeat_time = time.time()
+    return found
+
+
+def evaluate_cycles(pair_ids):
+    """
+    Re-weight the currency graph edges of pair_ids (None = all watched pairs)
+    and log the cycles through them that return more than CYCLE_MIN_PROFIT.
+    Returns the number of cycles logged.
+    """
+    global last_heartbeat_time
+    if pair_ids is None:
+        pair_ids = np.flatnonzero(ENGINE.watched)
+    p = ENGINE.params[pair_ids]
+    GRAPH.set_quotes(pair_ids, ENGINE.bids[pair_ids], ENGINE.asks[pair_ids], p[:, BUY_MULT], p[:, SELL_MULT])
+    cycle_ids, returns = GRAPH.profitable(GRAPH.affected(pair_ids), CYCLE_MIN_PROFIT)
+    if not len(cycle_ids):
+        return 0
+    if ENGINE.max_age > 0:
+        fresh = time.monotonic() - GRAPH.oldest(cycle_ids, ENGINE.clock.as_of) <= ENGINE.max_age
+        stale = len(cycle_ids) - int(np.count_nonzero(fresh))
+        if stale:
+            STALE_SIGNALS.inc("cycle", amount=stale)
+            cycle_ids, returns = cycle_ids[fresh], returns[fresh]
+    for cycle_id, ret in zip(cycle_ids.tolist(), returns.tolist()):
+        OPPORTUNITY_LOG.log("[Arb] Cycle %s: %.4f%% return (after fees)", GRAPH.describe(cycle_id), ret * 100)
+    if len(cycle_ids):
+        OPPORTUNITIES.inc("cycle", amount=len(cycle_ids))
+        last_heartbeat_time = time.time()
+    return len(cycle_ids)
+
+
+def evaluate_dirty():
+    """Evaluate (once each) the watched pairs that ticked since the last call"""
+    ARB_WAKEUP.clear()
+    dirty = ENGINE.take_dirty()
+    found = evaluate_pairs(dirty) if len(dirty) else 0
+    if GRAPH is not None and len(dirty):
+        found += evaluate_cycles(dirty)
+    LATENCY.react()
+    return found
+
+
+async def arbitrage_event_loop():
+    """
+    Evaluate pairs as soon as their quotes change.
+    Ticks that land while an evaluation is pending are coalesced per pair.
+    Purely logs the opportunity; does not require or use private API calls.
+    """
     while True:
         try:
-            now = time.time()
-            # Log a heartbeat every 30 seconds if no opportunities were found
-            if now - last_heartbeat_time >= 30:
-                logger.info("[Arb] Heartbeat: Checking for quotes/spreads...")
-                last_heartbeat_time = now
-
-            for cfg in PAIRS_CONFIG:
-                cb_symbol = cfg["cb_symbol"]  # e.g. "BTC-USD"
-                kr_symbol = cfg["kr_symbol"]  # e.g. "XBT/USD"
-                min_spread = cfg["min_spread_usd"]
-                fee_buy = cfg["fee_buy"]
-                fee_sell = cfg["fee_sell"]
-
-                cb_bid = latest_quotes["coinbase"][cb_symbol]["bid"]
-                cb_ask = latest_quotes["coinbase"][cb_symbol]["ask"]
-                kr_bid = latest_quotes["kraken"][kr_symbol]["bid"]
-                kr_ask = latest_quotes["kraken"][kr_symbol]["ask"]
-
-                if not all([cb_bid, cb_ask, kr_bid, kr_ask]):
-                    logger.debug(
-                        f"[Arb] Missing quotes for {cb_symbol} & {kr_symbol}: "
-                        f"CB({cb_bid}/{cb_ask}), KR({kr_bid}/{kr_ask})"
-                    )
-                    continue
-
-                # Route A: Buy on Coinbase @ ask, Sell on Kraken @ bid
-                net_spread_A = calc_net_spread(cb_ask, kr_bid, fee_buy, fee_sell)
-                
-                # Route B: Buy on Kraken @ ask, Sell on Coinbase @ bid
-                net_spread_B = calc_net_spread(kr_ask, cb_bid, fee_buy, fee_sell)
-
-                # If net_spread_A > min_spread, log the opportunity
-                if net_spread_A > min_spread:
-                    logger.info(
-                        f"[Arb] {cb_symbol}: BUY@Coinbase({cb_ask:.2f}) => SELL@Kraken({kr_bid:.2f}) "
-                        f"Net Spread={net_spread_A:.2f} USD (after fees)"
-                    )
-                    last_heartbeat_time = time.time()  # reset so we don't log heartbeat immediately
-
-                # If net_spread_B > min_spread, log the opportunity
-                if net_spread_B > min_spread:
-                    logger.info(
-                        f"[Arb] {cb_symbol}: BUY@Kraken({kr_ask:.2f}) => SELL@Coinbase({cb_bid:.2f}) "
-                        f"Net Spread={net_spread_B:.2f} USD (after fees)"
-                    )
-                    last_heartbeat_time = time.time()  # reset so we don't log heartbeat immediately
+            await asyncio.wait_for(ARB_WAKEUP.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            evaluate_dirty()
+            log_heartbeat_if_idle()
+        except Exception as e:
+            logger.error(f"[Arb] Error in event loop: {e}")
 
+
+async def check_arbitrage_loop(interval=CHECK_INTERVAL_SECS):
+    """
+    Periodically check every pair for potential cross-exchange spreads.
+    Optional fallback for the event-driven evaluator.
+    """
+    while True:
+        try:
+            check_arbitrage_once()
         except Exception as e:
             logger.error(f"[Arb] Error in check loop: {e}")
 
-        await asyncio.sleep(CHECK_INTERVAL_SECS)
+        await asyncio.sleep(interval)
 
 
 ###############################################################################
 # 4) Main Entry Point
 ###############################################################################
 
-async def main():
+async def start_metrics(port):
+    """Serve /metrics and /status on this event loop"""
+    METRICS.add_feeds(FEEDS.values())
+    METRICS.add_quote_ages(REGISTRY.standard_pairs, VENUES, ENGINE.clock.as_of)
+    METRICS.add_clock_offsets(ENGINE.clock)
+    METRICS.add_queue("dirty_pairs", ENGINE.pending)
+    METRICS.add_latency(LATENCY)
+    if CAPTURE:
+        METRICS.add_queue("capture_buffer", lambda: CAPTURE.buffered)
+    if QUOTES is not None:
+        METRICS.add_queue("parquet_quotes", lambda: len(QUOTES))
+
+    def status():
+        return {
+            "mode": "depth" if BOOKS is not None else "ticker",
+            "watched_pairs": len(WATCHED_PAIRS),
+            "max_age_seconds": ENGINE.max_age,
+            "fresh_pairs": int(np.count_nonzero(ENGINE.clock.fresh(ENGINE.watched, ENGINE.max_age)))
+            if ENGINE.max_age > 0 else None,
+            "clock_offsets": ENGINE.clock.offsets(),
+            "feeds": {
+                name: {"connected": feed.connected, "messages_per_second": feed.rate}
+                for name, feed in FEEDS.items()
+            },
+            "subscriptions": {
+                subs.exchange: {"ready": subs.ready.is_set(), "pending": subs.pending,
+                                "ready_after_seconds": subs.ready_after}
+                for subs in SUBSCRIPTIONS.values()
+            },
+        }
+
+    server = MetricsServer(METRICS, CONFIG.metrics.host, port, status=status)
+    await server.start()
+    return server
+
+
+async def replay(path, speed):
+    """Feed a capture file through the same handlers the live sockets use"""
+    logger.info(f"[Replay] Replaying {path} at speed {speed or 'max'}")
+    checker = asyncio.create_task(arbitrage_event_loop())
+    try:
+        await replay_capture(path, HANDLERS, speed=speed)
+        evaluate_dirty()
+    finally:
+        checker.cancel()
+
+
+async def close_quote_sink(flusher):
+    """Stop the periodic flusher and write whatever quotes are still buffered"""
+    if flusher is not None:
+        flusher.cancel()
+        await QUOTES.close()
+
+
+async def main(args):
+    global CAPTURE, BOOKS, QUOTES, GRAPH
+    if CONFIG.logging.queue:
+        # Console and arbitrage.log writes move to a background thread
+        start_queue_logging()
+    install_dump_signal(LATENCY, args.latency_dump)
     logger.info("[INIT] Starting Dry-Run Arbitrage Bot (No API keys needed).")
-    logger.info(f"[CONFIG] Check interval: {CHECK_INTERVAL_SECS} seconds")
-    logger.info("[CONFIG] Watching pairs:")
+    if args.poll_interval > 0:
+        logger.info(f"[CONFIG] Event-driven checks with {args.poll_interval}s polling fallback")
+    else:
+        logger.info("[CONFIG] Event-driven checks (polling disabled)")
+    logger.info(f"[CONFIG] Watching {len(WATCHED_PAIRS)} pairs")
+    if args.max_age is not None:
+        ENGINE.max_age = args.max_age
+    if ENGINE.max_age > 0:
+        logger.info(f"[CONFIG] Ignoring spreads where either quote is older than {ENGINE.max_age:g}s")
+    logger.info(
+        f"[CONFIG] Defaults: min spread {DEFAULT_PAIR_PARAMS['min_spread_pct']*100}% of buy price, "
+        f"Fees: Buy {DEFAULT_PAIR_PARAMS['fee_buy']*100}%, Sell {DEFAULT_PAIR_PARAMS['fee_sell']*100}%"
+    )
     for pair in PAIRS_CONFIG:
         logger.info(f"  - {pair['cb_symbol']} (Coinbase) / {pair['kr_symbol']} (Kraken)")
         logger.info(f"    Min spread: ${pair['min_spread_usd']}")
         logger.info(f"    Fees: Buy {pair['fee_buy']*100}%, Sell {pair['fee_sell']*100}%")
 
-    # Kick off two tasks for WebSocket data from Coinbase & Kraken
-    tasks = [
-        subscribe_coinbase(PAIRS_CONFIG),
-        subscribe_kraken(PAIRS_CONFIG),
-        check_arbitrage_loop(),
-    ]
-    await asyncio.gather(*tasks)
+    for name, url in url_overrides(args).items():
+        ADAPTERS[name].url = url
+
+    if args.depth:
+        BOOKS = BookBoard(len(REGISTRY), [adapter.book_levels(args.book_depth) for adapter in ADAPTERS.values()])
+        logger.info(
+            f"[CONFIG] Depth-aware checks on L2 books (Kraken depth {args.book_depth}, "
+            f"Coinbase {CoinbaseAdapter.BOOK_CHANNEL})"
+        )
+
+    if args.cycles:
+        GRAPH = CurrencyGraph(
+            [p.standard_pair for p in REGISTRY], VENUES, args.cycle_legs, min_legs=CYCLE_MIN_LEGS
+        )
+        logger.info(
+            f"[CONFIG] Checking {len(GRAPH.cycles)} currency cycles of up to {args.cycle_legs} trades "
+            f"over {len(GRAPH.currencies)} currencies (min return {CYCLE_MIN_PROFIT*100}%)"
+        )
+
+    flusher = None
+    if args.store or CONFIG.storage.enabled:
+        QUOTES = ParquetSink(
+            args.store or CONFIG.storage.path, "quotes", REGISTRY, QUOTE_COLUMNS,
+            categories={"exchange": list(VENUES)},
+            flush_rows=CONFIG.storage.flush_rows, flush_seconds=CONFIG.storage.flush_seconds
+        )
+        flusher = asyncio.create_task(QUOTES.run())
+        logger.info(f"[CONFIG] Storing quotes as Parquet under {QUOTES.path}")
+
+    if args.replay:
+        try:
+            await replay(args.replay, args.replay_speed)
+        finally:
+            await close_quote_sink(flusher)
+        TICKS.summary()
+        LATENCY.log_summary()
+        if args.latency_dump:
+            LATENCY.dump(args.latency_dump)
+        return
+
+    if args.board:
+        try:
+            board = BoardReader(args.board, REGISTRY, handle_quote_record, feeds=FEEDS)
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"[Board] Cannot attach to quote board {args.board}: {str(e)}")
+            await close_quote_sink(flusher)
+            return
+
+    if args.capture:
+        CAPTURE = CaptureWriter(args.capture)
+
+    metrics_port = CONFIG.metrics.dryrun_port if args.metrics_port is None else args.metrics_port
+    metrics_server = None
+    if CONFIG.metrics.enabled and metrics_port:
+        try:
+            metrics_server = await start_metrics(metrics_port)
+        except OSError as e:
+            logger.error(f"[Metrics] Could not listen on port {metrics_port}: {e}")
+
+    if args.workers:
+        # Worker processes own the sockets and decoding; this loop only applies quotes
+        shards = ShardedFeeds(
+            CONFIG, [p.id for p in WATCHED_PAIRS], args.workers, handle_quote_record,
+            feeds=FEEDS, urls=url_overrides(args)
+        )
+        logger.info(f"[CONFIG] Feeds sharded across {len(shards.shards)} worker processes")
+        tasks = [shards.run(), arbitrage_event_loop()]
+    elif args.board:
+        # A quote_board.py publisher owns the sockets; quotes come from shared memory
+        logger.info(f"[CONFIG] Reading quotes from board {args.board} instead of the exchanges")
+        tasks = [board.run(), arbitrage_event_loop()]
+    else:
+        # One WebSocket task per venue
+        book_depth = args.book_depth if args.depth else 0
+        tasks = [subscribe_feed(adapter, WATCHED_PAIRS, book_depth) for adapter in ADAPTERS.values()]
+        tasks.append(arbitrage_event_loop())
+    if args.poll_interval > 0:
+        tasks.append(check_arbitrage_loop(args.poll_interval))
+    if args.latency_report > 0:
+        tasks.append(report_periodically(LATENCY, args.latency_report))
+    if CONFIG.logging.summary_interval > 0:
+        tasks.append(TICKS.run(CONFIG.logging.summary_interval))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if CAPTURE:
+            CAPTURE.close()
+        await close_quote_sink(flusher)
+        TICKS.summary()
+        if args.latency_dump:
+            LATENCY.dump(args.latency_dump)
+        if metrics_server:
+            await metrics_server.stop()
+
+
+def url_overrides(args):
+    """Venue -> websocket URL given on the command line"""
+    urls = {"kraken": args.kraken_url, "coinbase": args.coinbase_url}
+    return {venue: url for venue, url in urls.items() if url}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dry-run Kraken/Coinbase arbitrage bot")
+    parser.add_argument("--capture", metavar="FILE",
+                        help="append every raw websocket frame to a capture file")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a capture file instead of connecting to the exchanges")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="replay pace multiplier; 0 replays as fast as possible")
+    parser.add_argument("--poll-interval", type=float, default=0,
+                        help=f"also rescan every pair this often (e.g. {CHECK_INTERVAL_SECS}); 0 disables polling")
+    parser.add_argument("--store", metavar="DIR",
+                        help="persist every quote update as Parquet under DIR (default storage.path when storage.enabled)")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="split the watched pairs across N feed worker processes (ticker mode only)")
+    parser.add_argument("--board", nargs="?", const=DEFAULT_BOARD, metavar="NAME",
+                        help=f"read quotes from a quote_board.py publisher (default name {DEFAULT_BOARD}) instead of connecting")
+    parser.add_argument("--depth", action="store_true",
+                        help="use L2 books and a size-aware (VWAP) net spread instead of the ticker top of book")
+    parser.add_argument("--book-depth", type=int, default=KRAKEN_BOOK_DEPTH,
+                        choices=[10, 25, 100, 500, 1000], help="Kraken book depth to subscribe to")
+    parser.add_argument("--cycles", action="store_true",
+                        help="also look for multi-currency cycles (e.g. USD->BTC->ETH->USD) across both exchanges")
+    parser.add_argument("--cycle-legs", type=int, default=CYCLE_MAX_LEGS, choices=[3, 4],
+                        help="most trades per cycle with --cycles")
+    parser.add_argument("--latency-report", type=float, default=LATENCY_REPORT_SECS, metavar="SECS",
+                        help="log per-stage latency percentiles this often; 0 disables")
+    parser.add_argument("--latency-dump", metavar="FILE",
+                        help="write per-pair latency histograms as JSON on SIGUSR1 and at exit")
+    parser.add_argument("--max-age", type=float, metavar="SECS",
+                        help="override freshness.max_age: skip spreads with a leg older than this (0 = off)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve /metrics and /status on this port (default metrics.dryrun_port; 0 disables)")
+    parser.add_argument("--kraken-url", help="override feeds.kraken_ws_url (e.g. a local mock)")
+    parser.add_argument("--coinbase-url", help="override feeds.coinbase_ws_url (e.g. a local mock)")
+    args = parser.parse_args()
+    if args.workers and (args.depth or args.capture or args.replay):
+        parser.error("--workers forwards decoded ticker quotes only; it cannot be combined with --depth, --capture or --replay")
+    if args.board and (args.workers or args.depth or args.capture or args.replay):
+        parser.error("--board reads ticker quotes only; it cannot be combined with --workers, --depth, --capture or --replay")
+    return args
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(main(parse_args()))
     except KeyboardInterrupt:
         logger.info("[Main] Interrupted by user. Exiting gracefully.")
-
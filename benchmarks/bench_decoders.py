@@ -0,0 +1,99 @@
+"""Compare the fast-path decoders against the original json.loads handlers.
+
+Usage:
+    python benchmarks/bench_decoders.py [--frames FILE | --capture FILE] [--repeat N]
+
+--frames takes newline-delimited JSON with {"exchange": ..., "frame": ...}
+objects and defaults to benchmarks/data/sample_frames.jsonl. --capture takes
+a file recorded with --capture by either script.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from decoders import get_decoder, TICKER  # noqa: E402
+from feed_capture import iter_capture  # noqa: E402
+
+def legacy_kraken(message):
+    """The per-frame work kraken_message_handler did before the decoder layer"""
+    data = json.loads(message)
+    if isinstance(data, list) and len(data) > 1:
+        if isinstance(data[1], dict) and 'c' in data[1]:
+            return (data[3], float(data[1]['b'][0]), float(data[1]['a'][0]), float(data[1]['c'][0]))
+    return None
+
+def legacy_coinbase(message):
+    data = json.loads(message)
+    if data.get('type') == 'ticker':
+        return (data['product_id'], float(data['best_bid']), float(data['best_ask']), float(data['price']))
+    return None
+
+LEGACY = {'kraken': legacy_kraken, 'coinbase': legacy_coinbase}
+
+def fast_path(decoder):
+    classify = decoder.classify
+    decode = decoder.decode_ticker
+
+    def run(message):
+        if classify(message) != TICKER:
+            return None
+        tick = decode(message)
+        return (tick.symbol, tick.bid, tick.ask, tick.last)
+    return run
+
+def load_frames(path):
+    frames = {'kraken': [], 'coinbase': []}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                frames[record['exchange']].append(record['frame'])
+    return frames
+
+def load_capture(path, limit=200000):
+    frames = {'kraken': [], 'coinbase': []}
+    for i, (_, exchange, frame) in enumerate(iter_capture(path)):
+        if i >= limit:
+            break
+        frames.setdefault(exchange, []).append(frame)
+    return frames
+
+def time_path(func, frames, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            func(frame)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(frames)) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', default=os.path.join(ROOT, 'benchmarks', 'data', 'sample_frames.jsonl'))
+    parser.add_argument('--capture', help="capture file recorded with --capture")
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    frames = load_capture(args.capture) if args.capture else load_frames(args.frames)
+    print(f"{'exchange':10} {'frames':>7} {'legacy ns/frame':>16} {'fast ns/frame':>14} {'speedup':>8}")
+    for exchange, batch in frames.items():
+        if not batch or exchange not in LEGACY:
+            continue
+        legacy = LEGACY[exchange]
+        fast = fast_path(get_decoder(exchange))
+        # Both paths must agree on every ticker before timing means anything
+        for frame in batch:
+            expected = legacy(frame)
+            if expected is not None and fast(frame) != expected:
+                raise SystemExit(f"Decoder mismatch on {exchange} frame: {frame[:80]}")
+        repeat = max(1, args.repeat // len(batch))
+        legacy_ns = time_path(legacy, batch, repeat)
+        fast_ns = time_path(fast, batch, repeat)
+        print(f"{exchange:10} {len(batch):>7} {legacy_ns:>16.0f} {fast_ns:>14.0f} {legacy_ns / fast_ns:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
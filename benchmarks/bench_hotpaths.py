@@ -0,0 +1,562 @@
+"""Throughput, latency and allocation benchmarks for the tick hot paths.
+
+Covers the monitor's tick-to-display path (frame ingest, update_variations,
+draw_variations against a headless curses stand-in, with and without the
+rolling-statistics columns, get_price_trend, format_price, the rolling
+statistics push, the --headless stream encoders and the ingest queue puts) and the dry-run bot's
+tick-to-signal path (frame handling, the --workers coordinator's
+shard_quote, tick_to_signal, check_arbitrage_once, calc_net_spread), plus
+the --depth mode's L2 book path (book frame handling and book-to-signal
+with VWAP walks), and the --cycles currency graph over the pairs in
+config.json (single-pair graph update and tick-to-signal with cycles).
+
+    python benchmarks/bench_hotpaths.py                      # synthetic, 70/500/5000 pairs
+    python benchmarks/bench_hotpaths.py --capture feed.cap   # also replay a captured workload
+    python benchmarks/bench_hotpaths.py --compare benchmarks/results/<old>.json
+
+Results are written as JSON to benchmarks/results/<commit>.json by default.
+"""
+from contextlib import contextmanager
+import argparse
+import asyncio
+import functools
+import importlib.util
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+# Claim the root logger before config.py's basicConfig can open a log file in
+# the tree; records still get formatted and written, just to the null device
+logging.basicConfig(level=logging.WARNING, handlers=[logging.FileHandler(os.devnull)])
+
+import headless  # noqa: E402
+from config import Config, PairsConfig  # noqa: E402
+from decoders import TICKER  # noqa: E402
+from exchanges import build_adapters  # noqa: E402
+from feed_capture import iter_capture  # noqa: E402
+from mock_exchange import CoinbaseMock, KrakenMock, MockSettings  # noqa: E402
+from ring_queue import RingQueue  # noqa: E402
+from shards import EXCHANGES, QUOTE  # noqa: E402
+from spread_stream import FORMATS, SpreadStream  # noqa: E402
+
+PAIR_COUNTS = [70, 500, 5000]
+
+###############################################################################
+# Workloads
+###############################################################################
+
+def synthetic_config(n_pairs: int) -> Config:
+    pairs = {f"S{i}-USD": (f"S{i}/USD", f"S{i}-USD") for i in range(n_pairs)}
+    return Config(pairs=PairsConfig(usd_pairs=pairs))
+
+def synthetic_frames(config: Config, n_frames: int, seed: int = 7):
+    """Control frames followed by n_frames ticker frames split across both exchanges"""
+    settings = MockSettings()
+    kraken = KrakenMock(settings, seed)
+    coinbase = CoinbaseMock(settings, seed)
+    all_pairs = config.pairs.get_all_pairs()
+    kr_symbols = [p[0] for p in all_pairs.values()]
+    cb_symbols = [p[1] for p in all_pairs.values()]
+    frames = [('kraken', f) for f in kraken.on_request(
+        {'event': 'subscribe', 'pair': kr_symbols, 'subscription': {'name': 'ticker'}}, [])]
+    # Prime both legs of every pair so spreads exist from the first measured tick
+    frames += [('kraken', kraken.ticker_frame(s)) for s in kr_symbols]
+    frames += [('coinbase', coinbase.ticker_frame(s)) for s in cb_symbols]
+    warmup = len(frames)
+    rng = random.Random(seed)
+    for _ in range(n_frames):
+        i = rng.randrange(len(kr_symbols))
+        if rng.random() < 0.5:
+            frames.append(('kraken', kraken.ticker_frame(kr_symbols[i])))
+        else:
+            frames.append(('coinbase', coinbase.ticker_frame(cb_symbols[i])))
+    return frames, warmup
+
+def synthetic_book_frames(config: Config, n_frames: int, seed: int = 11, depth: int = 25):
+    """Book subscription acks and snapshots followed by n_frames L2 updates"""
+    settings = MockSettings()
+    kraken = KrakenMock(settings, seed)
+    coinbase = CoinbaseMock(settings, seed)
+    all_pairs = config.pairs.get_all_pairs()
+    kr_symbols = [p[0] for p in all_pairs.values()]
+    cb_symbols = [p[1] for p in all_pairs.values()]
+    frames = [('kraken', f) for f in kraken.on_request(
+        {'event': 'subscribe', 'pair': kr_symbols, 'subscription': {'name': 'book', 'depth': depth}}, [])]
+    frames += [('coinbase', f) for f in coinbase.on_request(
+        {'type': 'subscribe', 'product_ids': cb_symbols, 'channels': ['level2_batch']}, [])]
+    warmup = len(frames)
+    rng = random.Random(seed)
+    channel = f"book-{depth}"
+    for _ in range(n_frames):
+        i = rng.randrange(len(kr_symbols))
+        if rng.random() < 0.5:
+            frames.append(('kraken', kraken.book_frame(kr_symbols[i], channel)))
+        else:
+            frames.append(('coinbase', coinbase.book_frame(cb_symbols[i], 'level2_batch')))
+    return frames, warmup
+
+def captured_frames(path: str, limit: int):
+    frames = []
+    for _, exchange, frame in iter_capture(path):
+        frames.append((exchange, frame))
+        if len(frames) >= limit:
+            break
+    return frames, 0
+
+###############################################################################
+# Measurement
+###############################################################################
+
+def summarize(name, workload, n_pairs, samples_ns, elapsed, alloc):
+    samples = np.asarray(samples_ns, dtype=np.float64)
+    return {
+        'benchmark': name,
+        'workload': workload,
+        'pairs': n_pairs,
+        'ops': int(len(samples)),
+        'throughput_per_sec': len(samples) / elapsed if elapsed > 0 else 0.0,
+        'p50_ns': float(np.percentile(samples, 50)),
+        'p99_ns': float(np.percentile(samples, 99)),
+        'max_ns': float(samples.max()),
+        'alloc_peak_bytes_per_op': alloc[0],
+        'net_blocks_per_op': alloc[1],
+    }
+
+def measure(ops):
+    """Time each zero-argument callable in ops; returns (samples_ns, total_secs)"""
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for op in ops:
+        t0 = clock()
+        op()
+        samples.append(clock() - t0)
+    return samples, time.perf_counter() - start
+
+async def measure_async(ops):
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for op in ops:
+        t0 = clock()
+        await op()
+        samples.append(clock() - t0)
+    return samples, time.perf_counter() - start
+
+def measure_allocations(ops):
+    """Median transient bytes allocated per op and net blocks retained per op"""
+    peaks = []
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    try:
+        for op in ops:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            op()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+        blocks_after = sys.getallocatedblocks()
+    finally:
+        tracemalloc.stop()
+    return _alloc_stats(peaks, blocks_after - blocks_before)
+
+async def measure_allocations_async(ops):
+    peaks = []
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    try:
+        for op in ops:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await op()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+        blocks_after = sys.getallocatedblocks()
+    finally:
+        tracemalloc.stop()
+    return _alloc_stats(peaks, blocks_after - blocks_before)
+
+def _alloc_stats(peaks, net_blocks):
+    if not peaks:
+        return (0, 0.0)
+    return (int(np.median(peaks)), net_blocks / len(peaks))
+
+###############################################################################
+# Monitor (tick-to-display)
+###############################################################################
+
+def make_monitor(config: Config):
+    import exchange_monitor
+    stdscr = headless.install()
+    return exchange_monitor.ExchangeConsoleMonitor(stdscr, config)
+
+async def bench_monitor(config, frames, warmup, workload, n_pairs, alloc_ops):
+    results = []
+    monitor = make_monitor(config)
+    handlers = monitor.handlers
+    for exchange, frame in frames[:warmup]:
+        await handlers[exchange](frame)
+    ticks = [(handlers[e], f) for e, f in frames[warmup:] if e in handlers]
+
+    ops = [lambda h=h, f=f: h(f) for h, f in ticks]
+    samples, elapsed = await measure_async(ops)
+    alloc = await measure_allocations_async(ops[:alloc_ops])
+    results.append(summarize('monitor.ingest_frame', workload, n_pairs, samples, elapsed, alloc))
+
+    n = len(monitor.instruments)
+    rng = random.Random(1)
+    pair_ids = [rng.randrange(n) for _ in range(len(ticks))]
+    from exchange_monitor import KRAKEN
+    ops = [lambda p=p: monitor.update_variations(p, KRAKEN) for p in pair_ids]
+    samples, elapsed = await measure_async(ops)
+    alloc = await measure_allocations_async(ops[:alloc_ops])
+    results.append(summarize('monitor.update_variations', workload, n_pairs, samples, elapsed, alloc))
+
+    # One frame per batch of ticks, like the render loop at high message rates
+    ui = monitor.ui
+    batch = max(1, len(ticks) // 200)
+    frame_ops = []
+    for _ in range(0, len(ticks), batch):
+        dirty = [rng.randrange(n) for _ in range(batch)]
+
+        def draw(dirty=dirty):
+            ui.dirty_slots.update(dirty)
+            ui.draw_variations(monitor.spreads)
+        frame_ops.append(draw)
+    samples, elapsed = measure(frame_ops)
+    alloc = measure_allocations(frame_ops[:max(1, alloc_ops // 20)])
+    results.append(summarize('ui.draw_variations', workload, n_pairs, samples, elapsed, alloc))
+
+    # The same frames with the rolling-statistics columns on screen
+    ui.show_stats = True
+    ui.reconfigure()
+    samples, elapsed = measure(frame_ops)
+    alloc = measure_allocations(frame_ops[:max(1, alloc_ops // 20)])
+    results.append(summarize('ui.draw_variations_stats', workload, n_pairs, samples, elapsed, alloc))
+    ui.show_stats = False
+
+    prices = [float(monitor.spreads.kraken_price[p]) for p in pair_ids]
+    keys = [f"kraken_{monitor.instruments[p].standard_pair}" for p in pair_ids]
+    ops = [lambda k=k, p=p: ui.get_price_trend(k, p) for k, p in zip(keys, prices)]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('ui.get_price_trend', workload, n_pairs, samples, elapsed, alloc))
+
+    ops = [lambda p=p: ui.format_price(p) for p in prices]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('ui.format_price', workload, n_pairs, samples, elapsed, alloc))
+
+    stats = monitor.stats
+    variations = [float(monitor.spreads.variation[p]) for p in pair_ids]
+    ops = [lambda p=p, v=v, t=t: stats.push(p, v, t * 0.001)
+           for t, (p, v) in enumerate(zip(pair_ids, variations))]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('stats.push', workload, n_pairs, samples, elapsed, alloc))
+
+    # Headless mode: encode one unconflated update, flushed to the null device
+    with open(os.devnull, 'wb') as sink:
+        for fmt in FORMATS:
+            stream = SpreadStream(sink, fmt).bind(monitor.spreads)
+            ops = [lambda p=p: stream.mark_dirty(p) for p in pair_ids]
+            samples, elapsed = measure(ops)
+            alloc = measure_allocations(ops[:alloc_ops])
+            stream.flush()
+            results.append(summarize(f'stream.{fmt}', workload, n_pairs, samples, elapsed, alloc))
+
+    # Receiver side of the ingest queues: one put, plus the conflation key where the policy needs it
+    frame_list = [(e, f) for e, f in frames[warmup:] if e in handlers]
+    for policy in ('drop-oldest', 'conflate'):
+        queues = {e: RingQueue(e, config.queues.size, policy) for e in handlers}
+        keys = {name: adapter.decoder.conflation_key for name, adapter in monitor.adapters.items()}
+        if policy == 'conflate':
+            ops = [lambda q=queues[e], k=keys[e], f=f: q.put_nowait(f, k(f)) for e, f in frame_list]
+        else:
+            ops = [lambda q=queues[e], f=f: q.put_nowait(f) for e, f in frame_list]
+        samples, elapsed = measure(ops)
+        alloc = measure_allocations(ops[:alloc_ops])
+        results.append(summarize(f'queue.{policy}', workload, n_pairs, samples, elapsed, alloc))
+    return results
+
+###############################################################################
+# Dry-run bot (tick-to-signal)
+###############################################################################
+
+def load_dryrun():
+    spec = importlib.util.spec_from_file_location('arbitrage_dryrun', os.path.join(ROOT, 'arbitrage-dryrun.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def reset_dryrun(arb, config: Config):
+    """Point the dry-run module's globals at a registry built from config"""
+    from feed_session import SubscriptionTracker
+    from instruments import InstrumentRegistry
+    from latency import LatencyRecorder
+    arb.REGISTRY = InstrumentRegistry.from_config(config)
+    arb.ENGINE = arb.build_engine(arb.REGISTRY, [], watch_all=True)
+    arb.LATENCY = LatencyRecorder(EXCHANGES, arb.REGISTRY.standard_pairs, react="signal")
+    arb.WATCHED_PAIRS = list(arb.REGISTRY)
+    arb.ADAPTERS = build_adapters(arb.REGISTRY, config.feeds)
+    arb.HANDLERS = {name: functools.partial(arb.handle_message, a) for name, a in arb.ADAPTERS.items()}
+    arb.SUBSCRIPTIONS = {name: SubscriptionTracker(name, a.symbols()) for name, a in arb.ADAPTERS.items()}
+
+def shard_records(registry, frames):
+    """Decode ticker frames the way a feed shard worker does and unpack its pipe records"""
+    adapters = build_adapters(registry)
+    batch = bytearray()
+    for exchange, frame in frames:
+        adapter = adapters.get(exchange)
+        if adapter is None or adapter.decoder.classify(frame) != TICKER:
+            continue
+        tick = adapter.decoder.decode_ticker(frame)
+        if tick is None:
+            continue
+        pair_id = adapter.by_symbol.get(tick.symbol)
+        if pair_id is None:
+            continue
+        now_ns = time.perf_counter_ns()
+        batch += QUOTE.pack(adapter.index, pair_id, tick.bid or math.nan, tick.ask or math.nan,
+                            tick.last or math.nan, tick.timestamp or math.nan, time.time(), now_ns, now_ns)
+    return [(e, p, b, a, last, ts, (wall, recv_ns), decoded_ns)
+            for e, p, b, a, last, ts, wall, recv_ns, decoded_ns in QUOTE.iter_unpack(batch)]
+
+def bench_dryrun(arb, config, frames, warmup, workload, n_pairs, alloc_ops):
+    results = []
+    reset_dryrun(arb, config)
+    handlers = arb.HANDLERS
+    for exchange, frame in frames[:warmup]:
+        handlers[exchange](frame)
+    ticks = [(handlers[e], f) for e, f in frames[warmup:] if e in handlers]
+
+    ops = [lambda h=h, f=f: h(f) for h, f in ticks]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('dryrun.handle_frame', workload, n_pairs, samples, elapsed, alloc))
+
+    # --workers coordinator: the frames arrive already decoded as packed shard records
+    records = shard_records(arb.REGISTRY, frames[warmup:])
+    ops = [lambda r=r: arb.handle_quote_record(*r) for r in records]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('dryrun.shard_quote', workload, n_pairs, samples, elapsed, alloc))
+
+    # Event-driven path: each frame is handled and its pair evaluated straight away
+    def tick_to_signal(handler, frame):
+        handler(frame)
+        arb.evaluate_dirty()
+    ops = [lambda h=h, f=f: tick_to_signal(h, f) for h, f in ticks]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('dryrun.tick_to_signal', workload, n_pairs, samples, elapsed, alloc))
+
+    passes = max(5, min(500, 200000 // max(n_pairs, 1)))
+    ops = [arb.check_arbitrage_once] * passes
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:max(1, passes // 10)])
+    results.append(summarize('dryrun.check_arbitrage_once', workload, n_pairs, samples, elapsed, alloc))
+
+    rng = random.Random(3)
+    quotes = [(rng.uniform(1, 1e5), rng.uniform(1, 1e5)) for _ in range(len(ticks))]
+    ops = [lambda b=b, s=s: arb.calc_net_spread(b, s, 0.005, 0.005) for b, s in quotes]
+    samples, elapsed = measure(ops)
+    alloc = measure_allocations(ops[:alloc_ops])
+    results.append(summarize('dryrun.calc_net_spread', workload, n_pairs, samples, elapsed, alloc))
+    return results
+
+def bench_cycles(arb, config, frames, warmup, workload, n_pairs, alloc_ops):
+    """The --cycles path: currency graph re-weighting and the cycles through each ticked pair"""
+    from currency_graph import CurrencyGraph
+    results = []
+    reset_dryrun(arb, config)
+    arb.GRAPH = CurrencyGraph(arb.REGISTRY.standard_pairs, EXCHANGES, arb.CYCLE_MAX_LEGS,
+                              min_legs=arb.CYCLE_MIN_LEGS)
+    handlers = arb.HANDLERS
+    try:
+        for exchange, frame in frames[:warmup]:
+            handlers[exchange](frame)
+        arb.evaluate_dirty()
+        ticks = [(handlers[e], f) for e, f in frames[warmup:] if e in handlers]
+
+        engine, graph = arb.ENGINE, arb.GRAPH
+        rng = random.Random(5)
+        pair_ids = [np.array([rng.randrange(len(arb.REGISTRY))]) for _ in range(len(ticks))]
+
+        def update(idx):
+            p = engine.params[idx]
+            graph.set_quotes(idx, engine.bids[idx], engine.asks[idx], p[:, arb.BUY_MULT], p[:, arb.SELL_MULT])
+            graph.profitable(graph.affected(idx), arb.CYCLE_MIN_PROFIT)
+        ops = [lambda i=i: update(i) for i in pair_ids]
+        samples, elapsed = measure(ops)
+        alloc = measure_allocations(ops[:alloc_ops])
+        results.append(summarize('graph.update_pair', workload, n_pairs, samples, elapsed, alloc))
+
+        def tick_to_signal(handler, frame):
+            handler(frame)
+            arb.evaluate_dirty()
+        ops = [lambda h=h, f=f: tick_to_signal(h, f) for h, f in ticks]
+        samples, elapsed = measure(ops)
+        alloc = measure_allocations(ops[:alloc_ops])
+        results.append(summarize('dryrun.cycles_tick_to_signal', workload, n_pairs, samples, elapsed, alloc))
+    finally:
+        arb.GRAPH = None
+    return results
+
+def bench_books(arb, config, frames, warmup, workload, n_pairs, alloc_ops):
+    """The --depth path: L2 frames into the books, then VWAP checks on candidates"""
+    from order_book import BookBoard
+    results = []
+    reset_dryrun(arb, config)
+    arb.BOOKS = BookBoard(len(arb.REGISTRY), [a.book_levels(arb.KRAKEN_BOOK_DEPTH) for a in arb.ADAPTERS.values()])
+    try:
+        handlers = arb.HANDLERS
+        for exchange, frame in frames[:warmup]:
+            handlers[exchange](frame)
+        arb.evaluate_dirty()
+        ticks = [(handlers[e], f) for e, f in frames[warmup:] if e in handlers]
+
+        ops = [lambda h=h, f=f: h(f) for h, f in ticks]
+        samples, elapsed = measure(ops)
+        alloc = measure_allocations(ops[:alloc_ops])
+        results.append(summarize('dryrun.book_frame', workload, n_pairs, samples, elapsed, alloc))
+
+        def book_to_signal(handler, frame):
+            handler(frame)
+            arb.evaluate_dirty()
+        ops = [lambda h=h, f=f: book_to_signal(h, f) for h, f in ticks]
+        samples, elapsed = measure(ops)
+        alloc = measure_allocations(ops[:alloc_ops])
+        results.append(summarize('dryrun.book_to_signal', workload, n_pairs, samples, elapsed, alloc))
+    finally:
+        arb.BOOKS = None
+    return results
+
+###############################################################################
+# Reporting
+###############################################################################
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def print_table(results):
+    print(f"{'benchmark':30} {'workload':10} {'pairs':>6} {'ops/sec':>12} {'p50 us':>9} {'p99 us':>9} {'alloc B':>8}")
+    for r in results:
+        print(f"{r['benchmark']:30} {r['workload']:10} {r['pairs']:>6} {r['throughput_per_sec']:>12.0f} "
+              f"{r['p50_ns'] / 1000:>9.2f} {r['p99_ns'] / 1000:>9.2f} {r['alloc_peak_bytes_per_op']:>8}")
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {
+            (r['benchmark'], r['workload'], r['pairs']): r for r in json.load(f)['results']
+        }
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'benchmark':30} {'workload':10} {'pairs':>6} {'throughput':>11} {'p99':>8}")
+    for r in results:
+        old = baseline.get((r['benchmark'], r['workload'], r['pairs']))
+        if not old or not old['throughput_per_sec'] or not old['p99_ns']:
+            continue
+        print(f"{r['benchmark']:30} {r['workload']:10} {r['pairs']:>6} "
+              f"{r['throughput_per_sec'] / old['throughput_per_sec']:>10.2f}x "
+              f"{r['p99_ns'] / old['p99_ns']:>7.2f}x")
+
+@contextmanager
+def scratch_dir():
+    """Run from a temp dir so the scripts' log files and config lookups stay out of the tree"""
+    cwd = os.getcwd()
+    path = tempfile.mkdtemp(prefix='bench-')
+    shutil.copy(os.path.join(ROOT, 'config.json'), path)
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, nargs='+', default=PAIR_COUNTS)
+    parser.add_argument('--ticks', type=int, default=20000, help="ticks per synthetic workload")
+    parser.add_argument('--capture', help="capture file to use as an additional workload")
+    parser.add_argument('--alloc-ops', type=int, default=2000, help="ops traced for allocation stats")
+    parser.add_argument('--only', choices=['monitor', 'dryrun'], help="run one side only")
+    parser.add_argument('--log-level', default='WARNING',
+                        help="log level for the scripts while benchmarking (INFO includes per-tick logs)")
+    parser.add_argument('--output', help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="results file to compare against")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"{git_commit()}.json")
+    output = os.path.abspath(output)
+    results = []
+    with scratch_dir():
+        arb = load_dryrun() if args.only != 'monitor' else None
+        logging.getLogger().setLevel(args.log_level)
+
+        workloads = []
+        book_workloads = []
+        for n in args.pairs:
+            config = synthetic_config(n)
+            frames, warmup = synthetic_frames(config, args.ticks)
+            workloads.append(('synthetic', n, config, frames, warmup))
+            if args.only != 'monitor':
+                frames, warmup = synthetic_book_frames(config, args.ticks)
+                book_workloads.append(('l2', n, config, frames, warmup))
+        if args.capture:
+            config = Config.load()
+            frames, warmup = captured_frames(args.capture, args.ticks)
+            workloads.append(('captured', len(config.pairs.get_all_pairs()), config, frames, warmup))
+
+        for workload, n, config, frames, warmup in workloads:
+            if args.only != 'dryrun':
+                results += asyncio.run(bench_monitor(config, frames, warmup, workload, n, args.alloc_ops))
+            if args.only != 'monitor':
+                results += bench_dryrun(arb, config, frames, warmup, workload, n, args.alloc_ops)
+        for workload, n, config, frames, warmup in book_workloads:
+            results += bench_books(arb, config, frames, warmup, workload, n, args.alloc_ops)
+        if args.only != 'monitor':
+            # Synthetic pairs are all quoted in USD and form no cycles; use the real pair list
+            config = Config.load()
+            frames, warmup = synthetic_frames(config, args.ticks)
+            results += bench_cycles(arb, config, frames, warmup, 'config', len(config.pairs.get_all_pairs()),
+                                    args.alloc_ops)
+
+    print_table(results)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.time(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'ticks': args.ticks,
+            },
+            'results': results
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+if __name__ == '__main__':
+    main()
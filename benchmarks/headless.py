@@ -0,0 +1,66 @@
+"""Headless stand-in for curses so ConsoleUI can be driven without a terminal."""
+import curses
+
+class HeadlessWindow:
+    """Implements the window methods ConsoleUI uses and counts what gets painted"""
+
+    def __init__(self, height=60, width=200):
+        self.height = height
+        self.width = width
+        self.addstr_calls = 0
+        self.chars_written = 0
+        self.refreshes = 0
+
+    def getmaxyx(self):
+        return (self.height, self.width)
+
+    def addstr(self, y, x, text, attr=0):
+        self.addstr_calls += 1
+        self.chars_written += len(text)
+
+    def getstr(self, *args):
+        return b''
+
+    def getch(self):
+        return -1
+
+    def refresh(self):
+        self.refreshes += 1
+
+    def noutrefresh(self):
+        self.refreshes += 1
+
+    def clear(self):
+        pass
+
+    def erase(self):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def move(self, y, x):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def timeout(self, delay):
+        pass
+
+    def scrollok(self, flag):
+        pass
+
+    def keypad(self, flag):
+        pass
+
+def install(height=60, width=200) -> HeadlessWindow:
+    """Patch the curses module in place and return a root window"""
+    for name in ('start_color', 'use_default_colors', 'init_pair', 'doupdate',
+                 'echo', 'noecho', 'curs_set'):
+        setattr(curses, name, lambda *args, **kwargs: None)
+    curses.color_pair = lambda n: 0
+    curses.newwin = lambda h, w, y=0, x=0: HeadlessWindow(h, w)
+    if not hasattr(curses, 'A_BOLD'):
+        curses.A_BOLD = 0
+    return HeadlessWindow(height, width)
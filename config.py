@@ -12,6 +12,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Venue order of the [kraken, coinbase] lists in the pairs section
+TUPLE_VENUES = ('kraken', 'coinbase')
+
+def pair_symbols(entry) -> Dict[str, str]:
+    """{venue: symbol} for one pairs entry: a [kraken, coinbase] list or a {venue: symbol} object"""
+    if isinstance(entry, dict):
+        return {venue: symbol for venue, symbol in entry.items() if symbol}
+    return {venue: symbol for venue, symbol in zip(TUPLE_VENUES, entry) if symbol}
+
 @dataclass
 class PairsConfig:
     usd_pairs: Dict[str, tuple] = None
@@ -61,25 +70,27 @@ class PairsConfig:
         all_pairs.update(self.stablecoin_pairs)
         return all_pairs
     
+    def get_venue_pairs(self, venue: str) -> List[str]:
+        """Get every pair symbol listed for one venue"""
+        symbols = (pair_symbols(pair).get(venue) for pair in self.get_all_pairs().values())
+        return [symbol for symbol in symbols if symbol]
+
     def get_kraken_pairs(self) -> List[str]:
         """Get all Kraken format pairs"""
-        return [pair[0] for pair in self.get_all_pairs().values()]
+        return self.get_venue_pairs('kraken')
     
     def get_coinbase_pairs(self) -> List[str]:
         """Get all Coinbase format pairs"""
-        return [pair[1] for pair in self.get_all_pairs().values()]
+        return self.get_venue_pairs('coinbase')
     
     def get_standard_pair(self, kraken_pair: str = None, coinbase_pair: str = None) -> str:
         """Convert exchange-specific pair to standard pair name"""
         pairs = self.get_all_pairs()
-        if kraken_pair:
-            for std_pair, (k_pair, _) in pairs.items():
-                if k_pair == kraken_pair:
-                    return std_pair
-        if coinbase_pair:
-            for std_pair, (_, cb_pair) in pairs.items():
-                if cb_pair == coinbase_pair:
-                    return std_pair
+        for venue, symbol in (('kraken', kraken_pair), ('coinbase', coinbase_pair)):
+            if symbol:
+                for std_pair, entry in pairs.items():
+                    if pair_symbols(entry).get(venue) == symbol:
+                        return std_pair
         return None
 
 @dataclass
@@ -89,8 +100,12 @@ class DisplayConfig:
     var_width: int = 10
     time_width: int = 10
     price_decimals: Dict[str, int] = None
+    show_stats: bool = False         # rolling-statistics columns at startup (the z key toggles them)
+    stats_columns: List[str] = None  # which, from spread_stats.COLUMNS
     
     def __post_init__(self):
+        if self.stats_columns is None:
+            self.stats_columns = ["z", "mean", "std", "rate"]
         if self.price_decimals is None:
             self.price_decimals = {
                 "default": 2,
@@ -117,16 +132,76 @@ class UpdateConfig:
     refresh_rate: float = 1.0
     batch_size: int = 100
     max_pairs: int = 50
-    price_history_length: int = 2
+    price_history_length: int = 300  # updates per pair in the rolling-statistics window
     partial_refresh: bool = True
     clear_screen_interval: int = 60
 
+@dataclass
+class FeedConfig:
+    kraken_ws_url: str = "wss://ws.kraken.com"
+    coinbase_ws_url: str = "wss://ws-feed.exchange.coinbase.com"
+    subscribe_batch: int = 100       # pairs per subscribe message
+    reconnect_min: float = 0.5       # backoff after the first retry, doubling per failure
+    reconnect_max: float = 30.0      # backoff cap
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = True
+    host: str = "0.0.0.0"
+    monitor_port: int = 9101
+    dryrun_port: int = 9102
+
+@dataclass
+class StorageConfig:
+    enabled: bool = False
+    path: str = "data"
+    flush_rows: int = 100000
+    flush_seconds: float = 60.0
+
+@dataclass
+class QueueConfig:
+    size: int = 4096                 # frames buffered per exchange between receiver and consumer
+    policy: str = "drop-oldest"      # drop-oldest, conflate or block when the buffer is full
+
+@dataclass
+class LoggingConfig:
+    queue: bool = True               # file and console writes on a background thread
+    quote_sample: int = 1000         # log one in N quote updates (0 = none)
+    quote_rate: float = 1.0          # at most this many quote lines per second
+    opportunity_sample: int = 1      # log one in N arbitrage opportunities
+    opportunity_rate: float = 20.0   # at most this many opportunity lines per second (0 = no limit)
+    summary_interval: float = 60.0   # seconds between aggregated tick summaries (0 = off)
+
+@dataclass
+class FreshnessConfig:
+    max_age: float = 10.0            # seconds; pairs whose older leg is older are not signalled or are shown stale (0 = off)
+    skew_window: int = 1000          # deliveries per exchange clock offset estimation window
+
+@dataclass
+class StatsConfig:
+    halflife: float = 20.0           # updates; half-life of each pair's variation EWMA
+    min_samples: int = 20            # window values needed before z-scores count
+    alert_z: float = 4.0             # log a spread anomaly when |z-score| reaches this (0 = off)
+
+@dataclass
+class ReloadConfig:
+    watch: bool = True               # reload config.json when it changes on disk (SIGHUP always reloads)
+    interval: float = 2.0            # seconds between checks of the file
+
 @dataclass
 class Config:
     pairs: PairsConfig = None
     display: DisplayConfig = None
     colors: ColorConfig = None
     update: UpdateConfig = None
+    feeds: FeedConfig = None
+    metrics: MetricsConfig = None
+    storage: StorageConfig = None
+    queues: QueueConfig = None
+    logging: LoggingConfig = None
+    freshness: FreshnessConfig = None
+    reload: ReloadConfig = None
+    stats: StatsConfig = None
     
     def __post_init__(self):
         if self.pairs is None:
@@ -137,21 +212,54 @@ class Config:
             self.colors = ColorConfig()
         if self.update is None:
             self.update = UpdateConfig()
+        if self.feeds is None:
+            self.feeds = FeedConfig()
+        if self.metrics is None:
+            self.metrics = MetricsConfig()
+        if self.storage is None:
+            self.storage = StorageConfig()
+        if self.queues is None:
+            self.queues = QueueConfig()
+        if self.logging is None:
+            self.logging = LoggingConfig()
+        if self.freshness is None:
+            self.freshness = FreshnessConfig()
+        if self.reload is None:
+            self.reload = ReloadConfig()
+        if self.stats is None:
+            self.stats = StatsConfig()
     
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Config':
+        return cls(
+            pairs=PairsConfig(**data.get('pairs', {})),
+            display=DisplayConfig(**data.get('display', {})),
+            colors=ColorConfig(**data.get('colors', {})),
+            update=UpdateConfig(**data.get('update', {})),
+            feeds=FeedConfig(**data.get('feeds', {})),
+            metrics=MetricsConfig(**data.get('metrics', {})),
+            storage=StorageConfig(**data.get('storage', {})),
+            queues=QueueConfig(**data.get('queues', {})),
+            logging=LoggingConfig(**data.get('logging', {})),
+            freshness=FreshnessConfig(**data.get('freshness', {})),
+            reload=ReloadConfig(**data.get('reload', {})),
+            stats=StatsConfig(**data.get('stats', {}))
+        )
+
+    @classmethod
+    def read(cls, filename: str = 'config.json') -> 'Config':
+        """Parse a config file, raising on any error (load falls back to defaults instead)"""
+        with open(filename, 'r') as f:
+            return cls.from_dict(json.load(f))
+
     @classmethod
     def load(cls, filename: str = 'config.json') -> 'Config':
         logger.info(f"Loading configuration from {filename}")
         try:
             if os.path.exists(filename):
-                with open(filename, 'r') as f:
-                    data = json.load(f)
-                    logger.info("Successfully loaded configuration file")
-                    return cls(
-                        pairs=PairsConfig(**data.get('pairs', {})),
-                        display=DisplayConfig(**data.get('display', {})),
-                        colors=ColorConfig(**data.get('colors', {})),
-                        update=UpdateConfig(**data.get('update', {}))
-                    )
+                config = cls.read(filename)
+                logger.info("Successfully loaded configuration file")
+                return config
         except Exception as e:
             logger.error(f"Error loading config: {str(e)}")
             
@@ -175,6 +283,38 @@ class Config:
                 'update': {
                     k: v for k, v in self.update.__dict__.items()
                     if not k.startswith('_')
+                },
+                'feeds': {
+                    k: v for k, v in self.feeds.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'metrics': {
+                    k: v for k, v in self.metrics.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'storage': {
+                    k: v for k, v in self.storage.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'queues': {
+                    k: v for k, v in self.queues.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'logging': {
+                    k: v for k, v in self.logging.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'freshness': {
+                    k: v for k, v in self.freshness.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'reload': {
+                    k: v for k, v in self.reload.__dict__.items()
+                    if not k.startswith('_')
+                },
+                'stats': {
+                    k: v for k, v in self.stats.__dict__.items()
+                    if not k.startswith('_')
                 }
             }
             with open(filename, 'w') as f:
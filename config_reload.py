@@ -0,0 +1,99 @@
+"""Hot reload of config.json.
+
+ConfigWatcher checks the file's size, modification time and inode every
+interval seconds and reloads it when any of them changes. Polling needs no
+extra dependency and sees both in-place writes and editors that save by
+renaming a new file over the old one, as long as the watched path is not
+itself a bind-mounted file: such a mount pins the original inode, so the
+container mounts the config's directory instead. SIGHUP forces a reload. A
+file that does not parse is logged and skipped, so a half-saved edit never
+replaces the running configuration.
+
+The owner decides what a new Config means: changed_sections says which
+sections differ, and the monitor applies pairs, display and update live.
+"""
+from dataclasses import fields
+from typing import Awaitable, Callable, List
+import asyncio
+import logging
+import os
+import signal
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Sections the monitor applies without a restart
+LIVE_SECTIONS = ('pairs', 'display', 'update')
+
+def changed_sections(old: Config, new: Config) -> List[str]:
+    """Names of the top-level sections that differ"""
+    return [f.name for f in fields(Config) if getattr(old, f.name) != getattr(new, f.name)]
+
+class ConfigWatcher:
+    """Calls on_change(config) after filename changes on disk or SIGHUP arrives"""
+
+    def __init__(self, filename: str, on_change: Callable[[Config], Awaitable[None]],
+                 interval: float = 2.0, watch: bool = True):
+        self.filename = filename
+        self.on_change = on_change
+        self.interval = interval
+        self.watch = watch
+        self.reloads = 0
+        self.errors = 0
+        self._signature = self._stat()
+        self._requested = asyncio.Event()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def request(self):
+        """Reload on the next check even if the file looks unchanged"""
+        self._requested.set()
+
+    def install_signal(self) -> bool:
+        """Reload on SIGHUP; False where unsupported"""
+        if not hasattr(signal, 'SIGHUP'):
+            return False
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.request)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._requested.wait(), self.interval if self.watch else None)
+            except asyncio.TimeoutError:
+                pass
+            forced = self._requested.is_set()
+            self._requested.clear()
+            signature = self._stat()
+            if signature is None or (signature == self._signature and not forced):
+                continue
+            self._signature = signature
+            await self.reload()
+
+    async def reload(self) -> bool:
+        try:
+            config = Config.read(self.filename)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[Config] Keeping the running configuration, {self.filename} did not load: {str(e)}")
+            return False
+        self.reloads += 1
+        try:
+            await self.on_change(config)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[Config] Error applying {self.filename}: {str(e)}")
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {'reloads': self.reloads, 'errors': self.errors, 'watching': self.watch}
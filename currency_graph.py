@@ -0,0 +1,190 @@
+"""Currency graph over every configured pair on both exchanges.
+
+Nodes are (exchange, currency). Each pair quoted on an exchange gives two
+edges there: selling the base at the bid (base -> quote) and buying it at
+the ask (quote -> base). Their weights are -log(rate after the taker fee),
+so a cycle whose weights sum below zero returns more than it started with.
+Optional zero-weight transfer edges join a currency's nodes on the two
+exchanges. That assumes inventory is held on both sides, the same
+assumption the two-venue routes make, and lets cycles cross venues.
+
+Every simple cycle of min_legs to max_legs trades is enumerated once at startup
+and indexed by the pairs it trades. A quote change re-weights that pair's
+edges and re-sums only the cycles through them: a gather and a row sum over
+a fixed index, instead of a Bellman-Ford pass over the whole graph. Cycles
+longer than max_legs are never found; in practice they are too slow to
+execute anyway.
+"""
+from typing import List, Sequence
+import math
+import numpy as np
+
+SELL, BUY = range(2)
+
+class CurrencyGraph:
+    """Edge weights plus the precomputed cycle index"""
+
+    def __init__(self, pairs: Sequence[str], exchanges: Sequence[str], max_legs: int = 3,
+                 transfers: bool = True, min_legs: int = 2):
+        self.pairs = list(pairs)
+        self.exchanges = tuple(exchanges)
+        self.max_legs = max_legs
+        self.min_legs = max(2, min_legs)
+        self._names = {}
+        n_ex = len(self.exchanges)
+        self.currencies = sorted({c for pair in self.pairs for c in pair.split('-')})
+        index = {c: i for i, c in enumerate(self.currencies)}
+        n_cur = len(self.currencies)
+
+        # Trade edge of (pair, exchange, side) is (pair * n_ex + exchange) * 2 + side
+        src, dst, edge_pair, edge_venue = [], [], [], []
+        for pair_id, pair in enumerate(self.pairs):
+            base, quote = (index[c] for c in pair.split('-'))
+            for venue in range(n_ex):
+                offset = venue * n_cur
+                src += [offset + base, offset + quote]
+                dst += [offset + quote, offset + base]
+                edge_pair += [pair_id, pair_id]
+                edge_venue += [venue, venue]
+        self.n_trade_edges = len(src)
+        if transfers:
+            for currency in range(n_cur):
+                for a in range(n_ex):
+                    for b in range(n_ex):
+                        if a != b:
+                            src.append(a * n_cur + currency)
+                            dst.append(b * n_cur + currency)
+                            edge_pair.append(-1)
+                            edge_venue.append(-1)
+        self.n_edges = len(src)
+        self.src = np.array(src, dtype=np.int64)
+        self.dst = np.array(dst, dtype=np.int64)
+        # Transfer edges and the padding edge (index n_edges) have pair -1
+        self.edge_pair = np.array(edge_pair + [-1], dtype=np.int64)
+        self.edge_venue = np.array(edge_venue + [-1], dtype=np.int64)
+        self.n_nodes = n_ex * n_cur
+
+        # Missing quotes weigh +inf, so no cycle through them ever qualifies
+        self.weights = np.full(self.n_edges + 1, np.inf)
+        self.weights[self.n_trade_edges:] = 0.0
+
+        cycles = self._enumerate()
+        width = max((len(c) for c in cycles), default=1)
+        self.cycles = np.full((len(cycles), width), self.n_edges, dtype=np.int64)
+        for i, cycle in enumerate(cycles):
+            self.cycles[i, :len(cycle)] = cycle
+        self.legs = (self.edge_pair[self.cycles] >= 0).sum(axis=1)
+
+        # pair id -> ids of the cycles that trade it, on any exchange
+        by_pair: List[set] = [set() for _ in self.pairs]
+        for i, cycle in enumerate(cycles):
+            for edge in cycle:
+                if edge < self.n_trade_edges:
+                    by_pair[edge_pair[edge]].add(i)
+        self.pair_cycles = [np.array(sorted(ids), dtype=np.int64) for ids in by_pair]
+
+    def _enumerate(self) -> List[List[int]]:
+        """Simple cycles with min_legs..max_legs trades, each listed once from its lowest node.
+
+        A cycle never trades the same pair twice on one exchange and never
+        makes two transfers in a row.
+        """
+        out_edges = [[] for _ in range(self.n_nodes)]
+        for edge in range(self.n_edges):
+            out_edges[self.src[edge]].append(edge)
+        edge_pair = self.edge_pair.tolist()
+        edge_venue = self.edge_venue.tolist()
+        dst = self.dst.tolist()
+        cycles = []
+
+        def extend(start, node, path, visited, used, legs, after_transfer):
+            for edge in out_edges[node]:
+                transfer = edge >= self.n_trade_edges
+                if transfer and after_transfer:
+                    continue
+                if not transfer:
+                    if legs == self.max_legs:
+                        continue
+                    key = (edge_pair[edge], edge_venue[edge])
+                    if key in used:
+                        continue
+                nxt = dst[edge]
+                trades = legs + (0 if transfer else 1)
+                if nxt == start:
+                    if trades >= self.min_legs:
+                        cycles.append(path + [edge])
+                    continue
+                if nxt < start or nxt in visited:
+                    continue
+                visited.add(nxt)
+                if not transfer:
+                    used.add(key)
+                extend(start, nxt, path + [edge], visited, used, trades, transfer)
+                if not transfer:
+                    used.discard(key)
+                visited.discard(nxt)
+
+        for start in range(self.n_nodes):
+            extend(start, start, [], {start}, set(), 0, False)
+        return cycles
+
+    def trade_edges(self, pair_ids: np.ndarray) -> np.ndarray:
+        """(len(pair_ids), exchanges, 2) edge ids, SELL then BUY"""
+        n_ex = len(self.exchanges)
+        base = (np.asarray(pair_ids)[:, None] * n_ex + np.arange(n_ex)) * 2
+        return base[:, :, None] + np.arange(2)
+
+    def set_quotes(self, pair_ids: np.ndarray, bids: np.ndarray, asks: np.ndarray,
+                   buy_mult: np.ndarray, sell_mult: np.ndarray):
+        """Re-weight the edges of pair_ids; bids and asks are (len(pair_ids), exchanges)"""
+        edges = self.trade_edges(pair_ids)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sell = -np.log(bids * sell_mult[:, None])
+            buy = np.log(asks * buy_mult[:, None])
+        self.weights[edges[:, :, SELL]] = np.where(bids > 0, sell, np.inf)
+        self.weights[edges[:, :, BUY]] = np.where(asks > 0, buy, np.inf)
+
+    def affected(self, pair_ids) -> np.ndarray:
+        """Ids of the cycles that trade any of pair_ids"""
+        pair_ids = np.asarray(pair_ids).tolist()
+        if not pair_ids:
+            return np.empty(0, dtype=np.int64)
+        if len(pair_ids) == 1:
+            return self.pair_cycles[pair_ids[0]]
+        return np.unique(np.concatenate([self.pair_cycles[p] for p in pair_ids]))
+
+    def profitable(self, cycle_ids: np.ndarray, min_profit: float = 0.0):
+        """(cycle ids, returns) of the cycles in cycle_ids that return more than min_profit"""
+        if not len(cycle_ids):
+            return cycle_ids, np.empty(0)
+        total = self.weights[self.cycles[cycle_ids]].sum(axis=1)
+        hit = total < -math.log1p(min_profit)
+        return cycle_ids[hit], np.expm1(-total[hit])
+
+    def oldest(self, cycle_ids: np.ndarray, as_of: np.ndarray) -> np.ndarray:
+        """Earliest as_of[pair, exchange] among each cycle's trades"""
+        edges = self.cycles[cycle_ids]
+        pairs = self.edge_pair[edges]
+        venues = self.edge_venue[edges]
+        times = np.where(pairs >= 0, as_of[pairs.clip(0), venues.clip(0)], np.inf)
+        return times.min(axis=1)
+
+    def describe(self, cycle_id: int) -> str:
+        """e.g. 'USD -coinbase-> BTC -coinbase-> ETH -kraken-> USD'"""
+        name = self._names.get(cycle_id)
+        if name is None:
+            name = self._names[cycle_id] = self._describe(cycle_id)
+        return name
+
+    def _describe(self, cycle_id: int) -> str:
+        n_cur = len(self.currencies)
+        edges = [e for e in self.cycles[cycle_id].tolist() if e < self.n_edges]
+        # Start from the first trade so the path reads from a currency actually spent
+        first = next(i for i, e in enumerate(edges) if e < self.n_trade_edges)
+        edges = edges[first:] + edges[:first]
+        parts = [self.currencies[int(self.src[edges[0]]) % n_cur]]
+        for edge in edges:
+            if edge < self.n_trade_edges:
+                venue = self.exchanges[int(self.edge_venue[edge])]
+                parts.append(f"-{venue}-> {self.currencies[int(self.dst[edge]) % n_cur]}")
+        return " ".join(parts)
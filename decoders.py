@@ -0,0 +1,271 @@
+"""Fast-path decoding of Kraken and Coinbase websocket frames.
+
+Each frame is first classified by looking at a few characters of the raw
+text. Heartbeats are dropped without parsing, control frames (subscription
+acks, status events) still go through the JSON parser, and ticker frames are
+decoded by schema-specific extractors that only read the fields we use.
+L2 book frames are parsed in full, since every level in them is applied.
+"""
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+import json
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Frame classes returned by FrameDecoder.classify
+HEARTBEAT = 0
+CONTROL = 1
+TICKER = 2
+OTHER = 3
+BOOK = 4
+
+class Tick(NamedTuple):
+    exchange: str
+    symbol: str
+    channel_id: Optional[int]
+    bid: Optional[float]
+    ask: Optional[float]
+    last: Optional[float]
+    timestamp: Optional[float]
+
+class BookUpdate(NamedTuple):
+    exchange: str
+    symbol: str
+    snapshot: bool           # True replaces the whole book
+    bids: list               # (price, size) floats; size 0 removes the level
+    asks: list
+    timestamp: Optional[float]
+
+def _levels(rows):
+    return [(float(row[0]), float(row[1])) for row in rows]
+
+def _quoted_field(raw: str, marker: str, start: int = 0):
+    """Return (value, end) for the string following marker, or (None, start).
+
+    marker must end at the value's opening quote. Exchanges emit fields in a
+    stable order, so callers pass the previous end to avoid rescanning, and
+    retry from the beginning if the field is not found after it.
+    """
+    pos = raw.find(marker, start)
+    if pos < 0 and start:
+        pos = raw.find(marker)
+    if pos < 0:
+        return None, start
+    pos += len(marker)
+    end = raw.find('"', pos)
+    if end < 0:
+        return None, start
+    return raw[pos:end], end
+
+_ts_cache = ('', 0.0)
+
+def parse_iso_timestamp(value: str) -> Optional[float]:
+    """Convert an exchange ISO-8601 UTC timestamp to epoch seconds"""
+    global _ts_cache
+    if not value or len(value) < 19:
+        return None
+    # Ticks arrive many per second, so reuse the parsed whole-second part
+    second = value[:19]
+    if _ts_cache[0] == second:
+        base = _ts_cache[1]
+    else:
+        try:
+            base = datetime.fromisoformat(second).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return None
+        _ts_cache = (second, base)
+    fraction = value[19:].rstrip('Z')
+    if fraction.startswith('.'):
+        try:
+            return base + float(fraction)
+        except ValueError:
+            return base
+    return base
+
+class FrameDecoder:
+    """Base class for per-exchange decoders"""
+    exchange = None
+
+    def classify(self, raw) -> int:
+        raise NotImplementedError
+
+    def decode_ticker(self, raw) -> Optional[Tick]:
+        raise NotImplementedError
+
+    def decode_book(self, raw) -> Optional[BookUpdate]:
+        raise NotImplementedError
+
+    def decode_control(self, raw):
+        """Fully parse a control frame"""
+        return loads(raw)
+
+    def conflation_key(self, raw):
+        """Instrument a ticker frame updates, read without decoding it; None for any other frame"""
+        return None
+
+class KrakenDecoder(FrameDecoder):
+    """Kraken v1 public feed: events are objects, channel data are arrays"""
+    exchange = 'kraken'
+
+    def classify(self, raw) -> int:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        if raw.startswith('{'):
+            if raw.startswith('{"event":"heartbeat"'):
+                return HEARTBEAT
+            return CONTROL
+        # Channel frames end with ,"<channelName>","<pair>"]
+        tail = raw[-48:]
+        if '"ticker"' in tail:
+            return TICKER
+        if '"book-' in tail:
+            return BOOK
+        return OTHER
+
+    def conflation_key(self, raw):
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        if self.classify(raw) != TICKER:
+            return None
+        # The channel id, which stands for one pair until the next reconnect
+        return raw[1:raw.find(',')]
+
+    def decode_ticker(self, raw) -> Optional[Tick]:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        try:
+            channel_id = int(raw[1:raw.index(',')])
+            pair_start = raw.rindex('"', 0, len(raw) - 2)
+            symbol = raw[pair_start + 1:len(raw) - 2]
+            ask, pos = _quoted_field(raw, '"a":["')
+            bid, pos = _quoted_field(raw, '"b":["', pos)
+            last, pos = _quoted_field(raw, '"c":["', pos)
+            return Tick(
+                self.exchange,
+                symbol,
+                channel_id,
+                float(bid) if bid else None,
+                float(ask) if ask else None,
+                float(last) if last else None,
+                None  # the v1 ticker carries no exchange timestamp
+            )
+        except ValueError:
+            return self._decode_slow(raw)
+
+    def _decode_slow(self, raw) -> Optional[Tick]:
+        """Fallback for frames the string scanner does not understand"""
+        try:
+            data = loads(raw)
+            info = data[1]
+            return Tick(
+                self.exchange,
+                data[-1],
+                data[0],
+                float(info['b'][0]) if 'b' in info else None,
+                float(info['a'][0]) if 'a' in info else None,
+                float(info['c'][0]) if 'c' in info else None,
+                None
+            )
+        except (ValueError, TypeError, IndexError, KeyError):
+            return None
+
+    def decode_book(self, raw) -> Optional[BookUpdate]:
+        """Snapshots carry "as"/"bs"; updates carry "a" and/or "b", possibly in two objects"""
+        try:
+            data = loads(raw)
+            bids, asks, snapshot = [], [], False
+            last_row = None
+            for part in data[1:-2]:
+                if 'as' in part or 'bs' in part:
+                    snapshot = True
+                    asks.extend(_levels(part.get('as', ())))
+                    bids.extend(_levels(part.get('bs', ())))
+                else:
+                    for key, levels in (('a', asks), ('b', bids)):
+                        rows = part.get(key)
+                        if rows:
+                            levels.extend(_levels(rows))
+                            last_row = rows[-1]
+            # Update levels carry the time they changed; snapshot levels may be old
+            timestamp = float(last_row[2]) if last_row is not None else None
+            return BookUpdate(self.exchange, data[-1], snapshot, bids, asks, timestamp)
+        except (ValueError, TypeError, IndexError, AttributeError):
+            return None
+
+class CoinbaseDecoder(FrameDecoder):
+    """Coinbase Exchange feed: every frame is an object starting with its type"""
+    exchange = 'coinbase'
+
+    def classify(self, raw) -> int:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        head = raw[:24]
+        if head.startswith('{"type":"ticker"'):
+            return TICKER
+        if head.startswith('{"type":"l2update"') or head.startswith('{"type":"snapshot"'):
+            return BOOK
+        if head.startswith('{"type":"heartbeat"'):
+            return HEARTBEAT
+        if head.startswith('{"type":'):
+            return CONTROL
+        # Field order is not guaranteed by the protocol; check the whole frame
+        if '"type":"ticker"' in raw:
+            return TICKER
+        return CONTROL
+
+    def conflation_key(self, raw):
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        if self.classify(raw) != TICKER:
+            return None
+        return _quoted_field(raw, '"product_id":"')[0]
+
+    def decode_ticker(self, raw) -> Optional[Tick]:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        symbol, pos = _quoted_field(raw, '"product_id":"')
+        if symbol is None:
+            return None
+        try:
+            last, pos = _quoted_field(raw, '"price":"', pos)
+            bid, pos = _quoted_field(raw, '"best_bid":"', pos)
+            ask, pos = _quoted_field(raw, '"best_ask":"', pos)
+            timestamp, pos = _quoted_field(raw, '"time":"', pos)
+            return Tick(
+                self.exchange,
+                symbol,
+                None,
+                float(bid) if bid else None,
+                float(ask) if ask else None,
+                float(last) if last else None,
+                parse_iso_timestamp(timestamp)
+            )
+        except ValueError:
+            return None
+
+    def decode_book(self, raw) -> Optional[BookUpdate]:
+        """level2 snapshot (bids/asks) or l2update (side, price, size changes)"""
+        try:
+            data = loads(raw)
+            if data['type'] == 'snapshot':
+                return BookUpdate(self.exchange, data['product_id'], True,
+                                  _levels(data['bids']), _levels(data['asks']), None)
+            bids, asks = [], []
+            for side, price, size in data['changes']:
+                (bids if side == 'buy' else asks).append((float(price), float(size)))
+            return BookUpdate(self.exchange, data['product_id'], False, bids, asks,
+                              parse_iso_timestamp(data.get('time')))
+        except (ValueError, TypeError, KeyError):
+            return None
+
+DECODERS = {
+    'kraken': KrakenDecoder,
+    'coinbase': CoinbaseDecoder,
+}
+
+def get_decoder(exchange: str) -> FrameDecoder:
+    return DECODERS[exchange]()
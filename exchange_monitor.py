@@ -1,15 +1,34 @@
+import argparse
 import asyncio
+import functools
 import os
-import websockets
-import json
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
 import curses
+import sys
 from curses import wrapper
 import time
 from collections import deque
-from config import Config
+from config import Config, PairsConfig
+from config_reload import LIVE_SECTIONS, ConfigWatcher, changed_sections
+from decoders import TICKER, CONTROL
+from exchanges import VENUES, ExchangeAdapter, build_adapters, listed_mask
+from feed_capture import CaptureWriter, replay_capture
+from feed_session import Backoff, SubscriptionTracker
+from instruments import InstrumentRegistry
+from latency import LatencyRecorder, report_periodically, install_dump_signal
+from log_pipeline import TickLog, start_queue_logging
+from metrics import FeedStats, MetricsRegistry, MetricsServer
+from parquet_sink import ParquetSink, SPREAD_COLUMNS
+from quote_clock import QuoteClock
+from quote_board import BoardReader, DEFAULT_NAME as DEFAULT_BOARD
+from ring_queue import POLICIES, RingQueue
+from shards import ShardedFeeds
+from spread_stats import COLUMNS as STATS_COLUMNS, SpreadStats
+from spread_stream import FORMATS, SpreadStream
+from spread_table import SpreadTable
 
 # Setup logging
 logging.basicConfig(
@@ -19,10 +38,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Frames a consumer applies from its ingest queue before yielding to the other tasks
+DRAIN_BATCH = 256
+
+# The venues shown side by side in the spread table, and their columns of the prices matrix.
+# Only these are connected and decoded; the matrix keeps a column for every venue.
+DISPLAYED_VENUES = ('kraken', 'coinbase')
+KRAKEN, COINBASE = (VENUES.index(venue) for venue in DISPLAYED_VENUES)
+
+# Header of each optional rolling-statistics column
+STATS_TITLES = {'z': 'z', 'mean': 'Mean%', 'std': 'Std%', 'min': 'Min%', 'max': 'Max%',
+                'ewma': 'EWMA%', 'rate': 'Ticks/s'}
+
 class ConsoleUI:
-    def __init__(self, stdscr, config: Config):
+    def __init__(self, stdscr, config: Config, stats: SpreadStats = None):
         self.stdscr = stdscr
         self.config = config
+        self.stats = stats
+        self.show_stats = config.display.show_stats and stats is not None
         self.variations_window = None
         self.status_window = None
         self.help_window = None
@@ -33,6 +66,13 @@ class ConsoleUI:
         self.filter_text = ''
         self.messages = deque(maxlen=5)
         self.header_drawn = False
+        self.trends = {}
+        
+        # Frame state: what each screen row currently shows and what changed since
+        self.screen_rows = []
+        self.dirty_slots = set()
+        self.full_redraw = True
+        self.last_frame = 0.0
         
         # Enable non-blocking input
         self.stdscr.nodelay(1)
@@ -79,7 +119,7 @@ class ConsoleUI:
             help_text = [
                 "Controls:",
                 "q: Quit | s: Sort by variation | p: Sort by pair | r: Reverse sort | f: Filter pairs",
-                "↑/↓: Scroll | Space: Pause/Resume"
+                "↑/↓: Scroll | Space: Pause/Resume | l: Log latency summary | z: Rolling stats columns"
             ]
             for i, text in enumerate(help_text):
                 self.help_window.addstr(i, 1, text)
@@ -151,18 +191,110 @@ class ConsoleUI:
         else:
             return f"{diff:.2f}"
 
-    def draw_variations(self, variations_df):
-        if variations_df.empty:
+    def mark_dirty(self, slot=None):
+        """Note that a slot changed (or everything, if slot is None) since the last frame"""
+        if slot is None:
+            self.full_redraw = True
+        else:
+            self.dirty_slots.add(slot)
+
+    def reconfigure(self):
+        """Start over with a cleared screen on the next frame (display or update settings changed)"""
+        self.last_full_refresh = 0.0
+        self.mark_dirty()
+
+    def frame_pending(self) -> bool:
+        # With a max-age gate, rows going stale need a frame even when nothing ticked
+        return (bool(self.dirty_slots) or self.full_redraw
+                or (self.config.freshness.max_age > 0 and time.monotonic() - self.last_frame >= 1.0))
+
+    def record_trend(self, pair, price):
+        """Store the latest trend arrow for a pair; the renderer reads it later"""
+        self.trends[pair] = self.get_price_trend(pair, price)
+
+    def stats_columns(self):
+        return [name for name in self.config.display.stats_columns if name in STATS_COLUMNS]
+
+    def format_stats(self, stats) -> str:
+        """The enabled rolling-statistics columns of one row"""
+        width = self.config.display.var_width
+        cells = []
+        for name in self.stats_columns():
+            value = getattr(stats, name)
+            if value != value:
+                cells.append(f"{'-':>{width}}")
+            elif name == 'z':
+                cells.append(f"{value:>{width}.2f}")
+            elif name == 'rate':
+                cells.append(f"{value:>{width}.1f}")
+            else:
+                cells.append(f"{value:>{width}.3f}")
+        return " ".join(cells)
+
+    def format_row(self, row, age=None, stats=None):
+        """Build the display line and color attribute for one spread row; age is set for stale
+        rows, stats (a SpreadStats row) when the statistics columns are shown"""
+        k_trend = self.trends.get(f"kraken_{row.standard_pair}", " ")
+        c_trend = self.trends.get(f"coinbase_{row.standard_pair}", " ")
+        
+        # Format prices
+        k_fmt = self.format_price(row.kraken_price)
+        c_fmt = self.format_price(row.coinbase_price)
+        
+        # Determine arbitrage direction and size
+        price_diff = abs(row.kraken_price - row.coinbase_price)
+        if row.kraken_price > row.coinbase_price:
+            arb = f"Buy CB → Sell KR ({self.format_difference(price_diff)})"
+        else:
+            arb = f"Buy KR → Sell CB ({self.format_difference(price_diff)})"
+        
+        if age is None:
+            time_str = datetime.fromtimestamp(row.timestamp).strftime('%H:%M:%S')
+        else:
+            time_str = f"{age:.0f}s old"
+        
+        line = (
+            f"{row.standard_pair:{self.config.display.pair_width}} "
+            f"{k_trend}{k_fmt} "
+            f"{arb:<25} "
+            f"{c_trend}{c_fmt} "
+            f"{row.variation_percentage:>{self.config.display.var_width}.3f}% "
+            f"{time_str:>{self.config.display.time_width}}"
+        )
+        if stats is not None:
+            line += " " + self.format_stats(stats)
+        alert_z = self.config.stats.alert_z
+        
+        # Determine color based on variation percentage
+        if age is not None:
+            color = curses.A_DIM  # one leg too old for the spread to be real
+        elif stats is not None and alert_z > 0 and abs(stats.z) >= alert_z:
+            color = curses.color_pair(1) | curses.A_BOLD  # Red: the spread just jumped out of its range
+        elif row.variation_percentage > 0.5:
+            color = curses.color_pair(2) | curses.A_BOLD  # Green + Bold
+        elif row.variation_percentage > 0.1:
+            color = curses.color_pair(2)  # Green
+        else:
+            color = curses.color_pair(3)  # White
+        return line, color
+
+    def draw_variations(self, table: SpreadTable):
+        """Draw one frame, repainting only screen rows whose content changed"""
+        if len(table) == 0:
             return
             
         try:
             now = time.time()
+            self.last_frame = time.monotonic()
+            max_age = self.config.freshness.max_age
+            stale_before = now - max_age if max_age > 0 else None
             need_full_refresh = (now - self.last_full_refresh) > self.config.update.clear_screen_interval
             
             if need_full_refresh:
                 self.variations_window.clear()
                 self.last_full_refresh = now
                 self.header_drawn = False
+                self.screen_rows = []
 
             # Create header
             if not self.header_drawn or need_full_refresh:
@@ -174,85 +306,127 @@ class ConsoleUI:
                     f"{'Var%':{self.config.display.var_width}} "
                     f"{'Time':{self.config.display.time_width}}"
                 )
+                if self.show_stats:
+                    header += "".join(f" {STATS_TITLES[name]:>{self.config.display.var_width}}"
+                                      for name in self.stats_columns())
                 self.variations_window.addstr(0, 1, header, curses.A_BOLD)
                 self.variations_window.addstr(1, 1, "-" * len(header))
                 self.header_drawn = True
 
-            # Sort and filter data
-            df = variations_df.copy()
-            df = df.sort_values(self.sort_by, ascending=self.sort_ascending)
-            if self.filter_text:
-                df = df[df['standard_pair'].str.contains(self.filter_text, case=False)]
-
             # Draw rows
             max_rows = min(self.config.update.max_pairs, 
                          self.variations_window.getmaxyx()[0] - 3)
+            view = table.view(max_rows, self.sort_by, self.sort_ascending, self.filter_text)
+            repaint_all = self.full_redraw or not self.config.update.partial_refresh
+            previous = self.screen_rows
+            current = []
             
-            for i, row in enumerate(df.head(max_rows).itertuples(), start=2):
-                k_trend = self.get_price_trend(f"kraken_{row.standard_pair}", row.kraken_price)
-                c_trend = self.get_price_trend(f"coinbase_{row.standard_pair}", row.coinbase_price)
-                
-                # Format prices
-                k_fmt = self.format_price(row.kraken_price)
-                c_fmt = self.format_price(row.coinbase_price)
-                
-                # Determine arbitrage direction and size
-                price_diff = abs(row.kraken_price - row.coinbase_price)
-                if row.kraken_price > row.coinbase_price:
-                    arb = f"Buy CB → Sell KR ({self.format_difference(price_diff)})"
-                else:
-                    arb = f"Buy KR → Sell CB ({self.format_difference(price_diff)})"
-                
-                time_str = pd.to_datetime(row.timestamp).strftime('%H:%M:%S')
-                
-                line = (
-                    f"{row.standard_pair:{self.config.display.pair_width}} "
-                    f"{k_trend}{k_fmt} "
-                    f"{arb:<25} "
-                    f"{c_trend}{c_fmt} "
-                    f"{row.variation_percentage:>{self.config.display.var_width}.3f}% "
-                    f"{time_str:>{self.config.display.time_width}}"
-                )
-                
+            for i, slot in enumerate(view.slots.tolist()):
+                cached = previous[i] if i < len(previous) else None
+                # Timestamp is the older leg's, so this is the max-age gate
+                stale = stale_before is not None and table.timestamp[slot] < stale_before
+                if (cached is not None and not repaint_all and cached[0] == slot
+                        and slot not in self.dirty_slots and not stale and not cached[3]):
+                    current.append(cached)
+                    continue
+                    
+                row = table.row(slot)
+                # Slots are pair ids, so the statistics row is the slot's
+                stats = self.stats.row(slot) if self.show_stats else None
+                line, color = self.format_row(row, now - row.timestamp if stale else None, stats)
+                current.append((slot, line, color, stale))
+                if not repaint_all and cached is not None and cached[1:3] == (line, color):
+                    continue
                 try:
-                    # Determine color based on variation percentage
-                    if row.variation_percentage > 0.5:
-                        color = curses.color_pair(2) | curses.A_BOLD  # Green + Bold
-                    elif row.variation_percentage > 0.1:
-                        color = curses.color_pair(2)  # Green
-                    else:
-                        color = curses.color_pair(3)  # White
-                        
-                    self.variations_window.addstr(i, 1, line, color)
+                    self.variations_window.addstr(i + 2, 1, line, color)
+                    self.variations_window.clrtoeol()
+                except curses.error:
+                    break
+
+            # Blank rows that dropped out of view (e.g. after filtering)
+            for i in range(len(current), len(previous)):
+                try:
+                    self.variations_window.move(i + 2, 0)
+                    self.variations_window.clrtoeol()
                 except curses.error:
                     break
                     
-            self.variations_window.refresh()
+            self.screen_rows = current
+            self.dirty_slots.clear()
+            self.full_redraw = False
+            self.variations_window.noutrefresh()
+            curses.doupdate()
         except Exception as e:
             logger.error(f"Display error: {str(e)}")
             self.draw_status(f"Display error: {str(e)}")
 
 class ExchangeConsoleMonitor:
-    def __init__(self, stdscr, config: Config):
-        self.kraken_ws_url = "wss://ws.kraken.com"
-        self.coinbase_ws_url = "wss://ws-feed.exchange.coinbase.com"
-        self.prices = {'kraken': {}, 'coinbase': {}}
+    def __init__(self, stdscr, config: Config, stream: SpreadStream = None):
+        """stream replaces the curses UI (stdscr is then unused) for headless runs"""
         self.config = config
+        self.instruments = InstrumentRegistry.from_config(config)
+        # Connection, subscription, decoding and symbol mapping per venue
+        self.adapters = build_adapters(self.instruments, config.feeds, venues=DISPLAYED_VENUES)
+        # Last trade price per pair and venue (columns in VENUES order), NaN until quoted
+        self.prices = np.full((len(self.instruments), len(VENUES)), np.nan)
         
-        # Initialize DataFrame
-        self.variations_df = pd.DataFrame({
-            'standard_pair': pd.Series(dtype='str'),
-            'kraken_price': pd.Series(dtype='float64'),
-            'coinbase_price': pd.Series(dtype='float64'),
-            'variation_percentage': pd.Series(dtype='float64'),
-            'timestamp': pd.Series(dtype='datetime64[ns]')
-        })
+        # One fixed slot per instrument id, updated in place
+        self.spreads = SpreadTable(self.instruments.standard_pairs)
+        # Rolling variation statistics per pair, in ring buffers of price_history_length updates
+        self.stats = SpreadStats(len(self.instruments), config.update.price_history_length,
+                                 config.stats.halflife, config.stats.min_samples)
         
-        self.ui = ConsoleUI(stdscr, config)
+        self.stream = stream
+        self.ui = ConsoleUI(stdscr, config, self.stats) if stream is None else stream.bind(self.spreads)
         self.running = True
         self.paused = False
+        self.capture = None
+        self.sink = None
+        
+        # Per-stage latency histograms (exchange -> receive -> decode -> store -> render)
+        self.latency = LatencyRecorder(VENUES, self.instruments.standard_pairs, react='render')
+        self.latency_dump = None
+
+        # Counters for the metrics endpoint; time.monotonic() of each venue's last quote per pair
+        self.feeds = {venue: FeedStats(venue) for venue in self.adapters}
+        self.clock = QuoteClock(len(self.instruments), VENUES, config.freshness.skew_window,
+                                listed_mask(self.instruments))
+        self.metrics = None
+
+        # A feed sending garbage logs a line a second, not one per frame; counts go in the summary
+        self.ticks = TickLog(logger)
+        self.decode_errors = self.ticks.category('decode_error', 1, 1.0)
+        # Updates whose variation is alert_z standard deviations off its window mean
+        self.alert_z = config.stats.alert_z
+        self.anomalies = self.ticks.category('spread_anomaly', 1, 1.0)
+
+        # Receivers only stamp and queue frames; one consumer task per exchange decodes and applies them
+        self.queues = {
+            exchange: RingQueue(exchange, config.queues.size, config.queues.policy)
+            for exchange in self.adapters
+        }
+
+        # Subscription acks per exchange since its last (re)connect
+        self.subscriptions = {
+            name: SubscriptionTracker(name, adapter.symbols()) for name, adapter in self.adapters.items()
+        }
+        # Raw frame handler per venue, for the ingest queues and --replay
+        self.handlers = {name: functools.partial(self.on_message, adapter) for name, adapter in self.adapters.items()}
+
+        # Open websocket per venue, for incremental (un)subscribes after a config reload;
+        # live_feeds is set when this process runs its own feeds (not shards, board or replay)
+        self.connections = {}
+        self.live_feeds = False
+        self.watcher = None
+
+    @property
+    def variations_df(self) -> pd.DataFrame:
+        """Snapshot of the spread table as a DataFrame (not used on the hot path)"""
+        return self.spreads.to_frame()
         
     async def handle_user_input(self):
+        if self.stream is not None:
+            return
         while self.running:
             try:
                 key = self.ui.stdscr.getch()
@@ -261,12 +435,15 @@ class ExchangeConsoleMonitor:
                 elif key == ord('s'):
                     self.ui.sort_by = 'variation_percentage'
                     self.ui.draw_status("Sorting by variation")
+                    self.ui.mark_dirty()
                 elif key == ord('p'):
                     self.ui.sort_by = 'standard_pair'
                     self.ui.draw_status("Sorting by pair")
+                    self.ui.mark_dirty()
                 elif key == ord('r'):
                     self.ui.sort_ascending = not self.ui.sort_ascending
                     self.ui.draw_status(f"Sort order: {'ascending' if self.ui.sort_ascending else 'descending'}")
+                    self.ui.mark_dirty()
                 elif key == ord('f'):
                     curses.echo()
                     self.ui.status_window.clear()
@@ -277,9 +454,18 @@ class ExchangeConsoleMonitor:
                     if filter_str:
                         self.ui.filter_text = filter_str
                         self.ui.draw_status(f"Filtering by: {filter_str}")
+                        self.ui.mark_dirty()
                     else:
                         self.ui.filter_text = ''
                         self.ui.draw_status("Filter cleared")
+                        self.ui.mark_dirty()
+                elif key == ord('l'):
+                    self.dump_latency()
+                    self.ui.draw_status("Latency summary written to the log")
+                elif key == ord('z'):
+                    self.ui.show_stats = not self.ui.show_stats
+                    self.ui.draw_status(f"Rolling stats columns {'on' if self.ui.show_stats else 'off'}")
+                    self.ui.reconfigure()
                 elif key == ord(' '):
                     self.paused = not self.paused
                     self.ui.draw_status(f"{'Paused' if self.paused else 'Resumed'} price updates")
@@ -287,141 +473,568 @@ class ExchangeConsoleMonitor:
                 logger.error(f"Input error: {str(e)}")
             await asyncio.sleep(0.1)
 
-    async def kraken_message_handler(self, websocket):
+    async def render_loop(self):
+        """Redraw at most refresh_rate times per second (or write the stream once per
+        conflation window), independent of tick rate"""
+        while self.running:
+            if self.stream is not None:
+                interval = self.stream.interval
+            else:
+                # Read every frame: a config reload may change it
+                interval = 1.0 / max(self.config.update.refresh_rate, 0.1)
+            frame_start = time.monotonic()
+            ui = self.ui
+            if not self.paused and ui.frame_pending():
+                ui.draw_variations(self.spreads)
+                self.latency.react()
+            if self.stream is not None and self.stream.closed:
+                self.running = False
+                break
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - frame_start)))
+        if self.stream is not None:
+            self.stream.draw_variations(self.spreads)
+
+    async def on_message(self, adapter: ExchangeAdapter, message, received=None):
+        """Process one raw frame from adapter's venue; received is (wall time, perf_counter_ns) from the socket read"""
+        if received is None:
+            received = (None, time.perf_counter_ns())
+        decoder = adapter.decoder
+        kind = decoder.classify(message)
+        if kind == TICKER:
+            tick = decoder.decode_ticker(message)
+            if tick is None or tick.last is None:
+                self.feeds[adapter.name].decode_errors += 1
+                self.decode_errors.log(f"Error processing {adapter.label} message: undecodable ticker frame",
+                                       level=logging.ERROR)
+                return
+            decoded_ns = time.perf_counter_ns()
+            pair_id = adapter.pair_id(tick)
+            if pair_id is not None:
+                feed = self.feeds[adapter.name]
+                if feed.gap_open:
+                    feed.close_gap()
+                self.prices[pair_id, adapter.index] = tick.last
+                # Without an exchange timestamp (Kraken v1) the receive time is the quote's time
+                self.clock.stamp(pair_id, adapter.index, tick.timestamp, received[0])
+                await self.update_variations(pair_id, adapter.index)
+                self.latency.message(adapter.name, pair_id, received, decoded_ns, time.perf_counter_ns(),
+                                     tick.timestamp)
+        elif kind == CONTROL:
+            subs = self.subscriptions[adapter.name]
+            if adapter.on_control(decoder.decode_control(message), subs):
+                self.ui.draw_status(
+                    f"{adapter.label}: {len(subs.acked)}/{len(subs.symbols)} pairs subscribed "
+                    f"in {subs.ready_after * 1000:.0f}ms"
+                )
+
+    async def receive(self, adapter: ExchangeAdapter, websocket):
+        """Stamp and queue every frame of one connection; the venue's drain_queue task applies them"""
+        feed = self.feeds[adapter.name]
+        queue = self.queues[adapter.name]
+        key = adapter.decoder.conflation_key if queue.conflating else None
         try:
             async for message in websocket:
+                received = (time.time(), time.perf_counter_ns())
+                feed.messages += 1
+                feed.last_message = time.monotonic()
+                if self.capture:
+                    self.capture.record(adapter.name, message)
                 if not self.running:
                     break
                 if self.paused:
                     continue
-                    
-                data = json.loads(message)
-                if isinstance(data, list) and len(data) > 1:
-                    if isinstance(data[1], dict) and 'c' in data[1]:
-                        try:
-                            kraken_pair = data[3]
-                            price = float(data[1]['c'][0])
-                            standard_pair = self.config.pairs.get_standard_pair(kraken_pair=kraken_pair)
-                            if standard_pair:
-                                self.prices['kraken'][standard_pair] = price
-                                await self.update_variations(standard_pair)
-                        except (IndexError, KeyError, ValueError) as e:
-                            logger.error(f"Error processing Kraken message: {str(e)}")
+                item = (message, received)
+                if not queue.put_nowait(item, key(message) if key else None):
+                    await queue.put(item)
         except Exception as e:
-            logger.error(f"Kraken websocket error: {str(e)}")
-            self.ui.draw_status("Lost connection to Kraken - reconnecting...")
+            logger.error(f"{adapter.label} websocket error: {str(e)}")
+            self.ui.draw_status(f"Lost connection to {adapter.label} - reconnecting...")
+
+    async def drain_queue(self, exchange: str, handler):
+        """Consumer side of one exchange's ingest queue"""
+        queue = self.queues[exchange]
+        while self.running:
+            for message, received in await queue.get(DRAIN_BATCH):
+                await handler(message, received)
+            # Give the receivers and the render loop a turn between batches
+            await asyncio.sleep(0)
 
-    async def coinbase_message_handler(self, websocket):
+    def log_queue_stats(self):
+        for queue in self.queues.values():
+            if queue.enqueued:
+                stats = queue.stats()
+                logger.info(
+                    f"Ingest queue {queue.name} ({stats['policy']}, {stats['capacity']}): "
+                    f"{stats['enqueued']} queued, high water {stats['high_water']}, "
+                    f"{stats['dropped']} dropped, {stats['conflated']} conflated, {stats['blocked']} blocked puts"
+                )
+
+    async def on_quote_record(self, exchange, pair_id, bid, ask, last, exchange_ts, received, decoded_ns):
+        """Apply one already-decoded quote from a --workers feed shard or the --board quote board"""
+        if not last > 0:
+            return
+        name = VENUES[exchange]
+        feed = self.feeds.get(name)
+        if feed is None:
+            return  # a --board publisher also carries venues the table does not show
+        if feed.gap_open:
+            feed.close_gap()
+        if exchange_ts != exchange_ts:
+            exchange_ts = None  # NaN: the feed carries no timestamp
+        self.prices[pair_id, exchange] = last
+        self.clock.stamp(pair_id, exchange, exchange_ts, received[0])
+        await self.update_variations(pair_id, exchange)
+        self.latency.message(name, pair_id, received, decoded_ns, time.perf_counter_ns(), exchange_ts)
+
+    async def monitor_sharded(self, workers: int):
+        """Like monitor_prices, with the feeds split across worker processes"""
+        shards = ShardedFeeds(
+            self.config, range(len(self.instruments)), workers, self.on_quote_record, feeds=self.feeds,
+            venues=DISPLAYED_VENUES
+        )
+        self.ui.draw_status(f"Feeds sharded across {len(shards.shards)} worker processes")
+        feed = asyncio.create_task(shards.run())
         try:
-            async for message in websocket:
-                if not self.running:
-                    break
-                if self.paused:
-                    continue
-                    
-                data = json.loads(message)
-                if data.get('type') == 'ticker':
-                    try:
-                        coinbase_pair = data['product_id']
-                        price = float(data['price'])
-                        standard_pair = self.config.pairs.get_standard_pair(coinbase_pair=coinbase_pair)
-                        if standard_pair:
-                            self.prices['coinbase'][standard_pair] = price
-                            await self.update_variations(standard_pair)
-                    except (KeyError, ValueError) as e:
-                        logger.error(f"Error processing Coinbase message: {str(e)}")
-        except Exception as e:
-            logger.error(f"Coinbase websocket error: {str(e)}")
-            self.ui.draw_status("Lost connection to Coinbase - reconnecting...")
+            await asyncio.gather(self.handle_user_input(), self.render_loop())
+        finally:
+            feed.cancel()
+            await asyncio.gather(feed, return_exceptions=True)
+
+    async def monitor_board(self, board: BoardReader):
+        """Like monitor_prices, with quotes read from a quote_board.py publisher"""
+        self.ui.draw_status(f"Reading quotes from board {board.name}")
+        feed = asyncio.create_task(board.run())
+        try:
+            await asyncio.gather(self.handle_user_input(), self.render_loop())
+        finally:
+            feed.cancel()
+            await asyncio.gather(feed, return_exceptions=True)
 
-    async def update_variations(self, standard_pair: str):
+    async def update_variations(self, pair_id: int, venue: int = None):
+        """Refresh a pair's Kraken/Coinbase row; venue is the VENUES index that just ticked"""
+        standard_pair = self.instruments[pair_id].standard_pair
         try:
-            kraken_price = self.prices['kraken'].get(standard_pair)
-            coinbase_price = self.prices['coinbase'].get(standard_pair)
+            kraken_price = self.prices.item(pair_id, KRAKEN)
+            coinbase_price = self.prices.item(pair_id, COINBASE)
             
-            if kraken_price and coinbase_price and kraken_price > 0:
-                variation = abs((kraken_price - coinbase_price) / kraken_price * 100)
-                
-                # Create new row
-                new_data = pd.DataFrame({
-                    'standard_pair': [standard_pair],
-                    'kraken_price': [float(kraken_price)],
-                    'coinbase_price': [float(coinbase_price)],
-                    'variation_percentage': [float(variation)],
-                    'timestamp': [pd.Timestamp.now()]
-                })
-                
-                # Update existing DataFrame
-                self.variations_df = self.variations_df[
-                    self.variations_df['standard_pair'] != standard_pair
-                ]
-                
-                self.variations_df = pd.concat(
-                    [self.variations_df, new_data],
-                    ignore_index=True
-                ).sort_values('variation_percentage', ascending=False)
+            if kraken_price > 0 and coinbase_price > 0:
+                now = time.time()
+                # Rows carry the wall time of their older leg, not of this update
+                as_of = now - (time.monotonic() - self.clock.oldest(pair_id))
+                variation = self.spreads.update(pair_id, kraken_price, coinbase_price, as_of)
+                if self.sink is not None:
+                    self.sink.record((now, pair_id, kraken_price, coinbase_price, variation))
+                z = self.stats.push(pair_id, variation, now)
+                if self.alert_z and abs(z) >= self.alert_z:
+                    self.anomalies.log(
+                        "[Anomaly] %s variation %.4f%% is %.1f standard deviations off its rolling mean",
+                        standard_pair, variation, z, level=logging.WARNING
+                    )
                 
                 # Store prices for trend calculation
-                self.ui.get_price_trend(f"kraken_{standard_pair}", kraken_price)
-                self.ui.get_price_trend(f"coinbase_{standard_pair}", coinbase_price)
+                if venue in (None, KRAKEN):
+                    self.ui.record_trend(f"kraken_{standard_pair}", kraken_price)
+                if venue in (None, COINBASE):
+                    self.ui.record_trend(f"coinbase_{standard_pair}", coinbase_price)
                 
-                # Update the display
-                if not self.paused:
-                    self.ui.draw_variations(self.variations_df)
+                # The render loop picks this up on its next frame
+                self.ui.mark_dirty(pair_id)
                 
         except Exception as e:
             logger.error(f"Error updating variations for {standard_pair}: {str(e)}")
             self.ui.draw_status(f"Update error: {str(e)}")
 
-    async def monitor_prices(self):
+    def dump_latency(self):
+        """Log the latency summary and, with --latency-dump, write the per-pair JSON"""
+        self.latency.log_summary()
+        if self.latency_dump:
+            self.latency.dump(self.latency_dump)
+
+    async def start_metrics(self, port: int):
+        """Serve /metrics and /status from this event loop"""
+        metrics = self.metrics = MetricsRegistry('monitor')
+        metrics.add_feeds(self.feeds.values())
+        # Callables: a config reload can add pairs and replace the arrays
+        metrics.add_quote_ages(lambda: self.instruments.standard_pairs, VENUES, lambda: self.clock.as_of)
+        metrics.add_clock_offsets(self.clock)
+        metrics.add_ring_queues(self.queues.values())
+        metrics.add_queue('render_dirty_rows', lambda: len(self.ui.dirty_slots))
+        if self.capture:
+            metrics.add_queue('capture_buffer', lambda: self.capture.buffered)
+        if self.sink is not None:
+            metrics.add_queue('parquet_spreads', lambda: len(self.sink))
+        metrics.add_latency(self.latency)
+
+        # Pairs currently showing a spread in the top colour band
+        threshold = self.config.colors.variation_colors['medium'][0]
+        wide = metrics.gauge('wide_spreads', f"Fresh pairs with |variation| above {threshold:g}%")
+        stale = metrics.gauge('stale_spreads', "Pairs whose older leg is older than freshness.max_age")
+        anomalies = metrics.counter('spread_anomalies_total',
+                                    f"Updates with |variation z-score| of at least {self.alert_z:g}")
+        spreads = self.spreads
+
+        def fresh_mask():
+            max_age = self.config.freshness.max_age
+            if max_age <= 0:
+                return spreads.valid
+            return spreads.valid & (spreads.timestamp >= time.time() - max_age)
+
+        def collect():
+            fresh = fresh_mask()
+            wide.set(value=float(np.count_nonzero(spreads.variation[fresh] > threshold)))
+            stale.set(value=float(np.count_nonzero(spreads.valid) - np.count_nonzero(fresh)))
+            anomalies.set(value=float(self.anomalies.seen))
+        metrics.add_collector(collect)
+
+        def anomalous(top: int = 10):
+            """Pairs whose latest update was an anomaly, largest |z| first, with their statistics"""
+            if not self.alert_z:
+                return []
+            z = np.frombuffer(self.stats.z)
+            ids = np.flatnonzero(np.abs(z) >= self.alert_z)
+            ids = ids[np.argsort(-np.abs(z[ids]))][:top]
+            snapshot = self.stats.snapshot(ids)
+            return [
+                {'pair': self.instruments[pair_id].standard_pair, 'variation': float(spreads.variation[pair_id]),
+                 **{name: float(column[i]) for name, column in snapshot.items()}}
+                for i, pair_id in enumerate(ids.tolist())
+            ]
+
+        def status():
+            return {
+                'mode': 'live',
+                'paused': self.paused,
+                'pairs': sum(1 for instrument in self.instruments if instrument.symbols),
+                'quoted_pairs': int(np.count_nonzero(spreads.valid)),
+                'fresh_pairs': int(np.count_nonzero(fresh_mask())),
+                'max_age_seconds': self.config.freshness.max_age,
+                'clock_offsets': self.clock.offsets(),
+                'queues': {name: queue.stats() for name, queue in self.queues.items()},
+                'subscriptions': {
+                    name: {'ready': subs.ready.is_set(), 'pending': subs.pending,
+                           'ready_after_seconds': subs.ready_after}
+                    for name, subs in self.subscriptions.items()
+                },
+                'config': self.watcher.stats() if self.watcher else None,
+                'anomalies': anomalous(),
+            }
+
+        server = MetricsServer(metrics, self.config.metrics.host, port, status=status)
+        await server.start()
+        return server
+
+    async def latency_report_loop(self, interval: float):
+        if interval > 0:
+            await report_periodically(self.latency, interval)
+
+    async def replay(self, path: str, speed: float = 1.0):
+        """Drive the display from a capture file instead of live websockets"""
+        self.ui.draw_status(f"Replaying {path}")
+        stats = await replay_capture(
+            path,
+            self.handlers,
+            speed=speed,
+            should_stop=lambda: not self.running
+        )
+        self.ui.draw_status(
+            f"Replay done: {stats['frames']} frames, {stats['frames_per_sec']:.0f}/s - press q to quit"
+        )
+        if self.stream is not None:
+            # Nobody to press q; the render loop writes what is left and exits
+            self.running = False
+        return stats
+
+    async def run_replay(self, path: str, speed: float = 1.0):
+        await asyncio.gather(
+            self.replay(path, speed),
+            self.handle_user_input(),
+            self.render_loop()
+        )
+
+    async def run_feed(self, adapter: ExchangeAdapter):
+        """Connect, subscribe and read one exchange; it reconnects on its own, so
+        an outage on one venue never interrupts the others"""
+        name = adapter.label
+        feed = self.feeds[adapter.name]
+        backoff = Backoff(self.config.feeds.reconnect_min, self.config.feeds.reconnect_max)
         while self.running:
             try:
-                async with websockets.connect(self.kraken_ws_url) as kraken_ws, \
-                           websockets.connect(self.coinbase_ws_url) as coinbase_ws:
-                    
-                    # Subscribe to Kraken feed
-                    kraken_pairs = self.config.pairs.get_kraken_pairs()
-                    await kraken_ws.send(json.dumps({
-                        "event": "subscribe",
-                        "pair": kraken_pairs,
-                        "subscription": {"name": "ticker"}
-                    }))
-                    
-                    # Subscribe to Coinbase feed
-                    coinbase_pairs = self.config.pairs.get_coinbase_pairs()
-                    await coinbase_ws.send(json.dumps({
-                        "type": "subscribe",
-                        "product_ids": coinbase_pairs,
-                        "channels": ["ticker"]
-                    }))
-                    
-                    self.ui.draw_status("Connected to exchanges")
-                    logger.info("Connected to exchanges")
-                    
-                    await asyncio.gather(
-                        self.kraken_message_handler(kraken_ws),
-                        self.coinbase_message_handler(coinbase_ws),
-                        self.handle_user_input()
-                    )
+                async with adapter.connect() as ws:
+                    backoff.connected()
+                    adapter.on_connect()
+                    # Frames still queued from the previous connection are stale
+                    self.queues[adapter.name].clear()
+                    self.subscriptions[adapter.name].start()
+                    # Registered before subscribing: a reload from here on sends its changes on ws
+                    self.connections[adapter.name] = ws
+                    messages = adapter.subscribe_messages(adapter.symbols())
+                    for message in messages:
+                        await ws.send(message)
+                    feed.on_connect(ws)
+                    self.ui.draw_status(f"Connected to {name}")
+                    logger.info(f"Connected to {name}, {len(messages)} subscribe message(s) sent")
+                    await self.receive(adapter, ws)
             except Exception as e:
-                logger.error(f"Connection error: {str(e)}")
-                if self.running:
-                    await asyncio.sleep(5)
-                    self.ui.draw_status("Attempting to reconnect...")
+                logger.error(f"{name} connection error: {str(e)}")
+            finally:
+                self.connections.pop(adapter.name, None)
+            # A connection that delivered quotes and stayed up earns an immediate retry
+            backoff.disconnected(delivered=not feed.gap_open)
+            feed.on_disconnect()
+            if self.running:
+                delay = backoff.next_delay()
+                if delay:
+                    self.ui.draw_status(f"Reconnecting to {name} in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def apply_config(self, config: Config):
+        """Apply a reloaded config.json: pairs are resubscribed incrementally and
+        display/update settings apply from the next frame; the rest needs a restart"""
+        changed = changed_sections(self.config, config)
+        if not changed:
+            logger.info("[Config] Reloaded, nothing changed")
+            return
+        applied = []
+        if 'pairs' in changed:
+            if self.live_feeds:
+                await self.reload_pairs(config.pairs)
+                applied.append('pairs')
+            else:
+                # Shards and the quote board split or lay out the pairs at startup
+                logger.warning("[Config] Pair changes need a restart with --workers, --board or --replay")
+        if 'display' in changed or 'update' in changed:
+            if config.update.price_history_length != self.config.update.price_history_length:
+                logger.warning("[Config] update.price_history_length (the statistics window) takes effect after a restart")
+            if self.stream is None and config.display.show_stats != self.config.display.show_stats:
+                self.ui.show_stats = config.display.show_stats
+            self.config.display = config.display
+            self.config.update = config.update
+            if self.stream is None:
+                self.ui.reconfigure()
+            applied += [section for section in ('display', 'update') if section in changed]
+        pending = [section for section in changed if section not in LIVE_SECTIONS]
+        if pending:
+            logger.warning(f"[Config] Changes to {', '.join(pending)} take effect after a restart")
+        if applied:
+            self.ui.draw_status(f"Config reloaded: {', '.join(applied)} applied")
+
+    async def reload_pairs(self, pairs: PairsConfig):
+        """Follow a changed pairs section on the open connections: unsubscribe what was
+        dropped, subscribe what is new, and keep every other pair's state"""
+        changes = self.instruments.update(pairs)
+        self.config.pairs = pairs
+        if not changes:
+            return
+        # Everything up to the first send runs without yielding, so no frame
+        # is handled against indexes and arrays from different configs
+        for adapter in self.adapters.values():
+            adapter.rebind(changes)
+        n = len(self.instruments)
+        if changes.added:
+            names = [self.instruments[pair_id].standard_pair for pair_id in changes.added]
+            self.prices = np.concatenate([self.prices, np.full((n - len(self.prices), len(VENUES)), np.nan)])
+            for standard_pair in names:
+                self.spreads.add(standard_pair)
+            self.latency.add_labels(names)
+            if self.stream is not None:
+                self.stream.add_pairs(self.spreads)
+            if self.sink is not None:
+                self.sink.add_pairs(self.instruments)
+        self.stats.resize(n)
+        listed = listed_mask(self.instruments)
+        self.clock.resize(n, listed)
+        for venue, pair_ids in changes.legs.items():
+            if venue not in self.adapters:
+                continue
+            leg = self.adapters[venue].index
+            self.prices[pair_ids, leg] = np.nan
+            self.clock.clear(pair_ids, leg, listed[pair_ids, leg])
+            if leg in (KRAKEN, COINBASE):
+                # The row comes back once both legs are quoted again, with fresh statistics
+                for pair_id in pair_ids:
+                    self.spreads.remove(pair_id)
+                    self.stats.reset(pair_id)
+        if self.stream is None:
+            self.ui.mark_dirty()
 
-async def main(stdscr):
+        for name, adapter in self.adapters.items():
+            subscribe = changes.subscribe.get(name, [])
+            unsubscribe = changes.unsubscribe.get(name, [])
+            if not (subscribe or unsubscribe):
+                continue
+            self.subscriptions[name].update(subscribe, unsubscribe)
+            logger.info(f"[Config] {adapter.label}: subscribing {len(subscribe)}, unsubscribing {len(unsubscribe)} pairs")
+            ws = self.connections.get(name)
+            if ws is None:
+                continue  # the next connection subscribes from the registry
+            messages = (adapter.subscribe_messages(unsubscribe, event="unsubscribe")
+                        + adapter.subscribe_messages(subscribe))
+            try:
+                for message in messages:
+                    await ws.send(message)
+            except Exception as e:
+                # The reconnect that follows subscribes the whole new list
+                logger.error(f"[Config] {adapter.label} resubscribe failed: {str(e)}")
+        logger.info(
+            f"[Config] Pairs reloaded: {len(changes.added)} added, {len(changes.removed)} removed, "
+            f"{sum(1 for i in self.instruments if i.symbols)} watched"
+        )
+
+    async def monitor_prices(self):
+        self.live_feeds = True
+        feeds = [asyncio.create_task(self.run_feed(adapter)) for adapter in self.adapters.values()]
+        feeds += [asyncio.create_task(self.drain_queue(name, handler)) for name, handler in self.handlers.items()]
+        try:
+            await asyncio.gather(self.handle_user_input(), self.render_loop())
+        finally:
+            for task in feeds:
+                task.cancel()
+            await asyncio.gather(*feeds, return_exceptions=True)
+
+def apply_overrides(config: Config, args) -> Config:
+    """Command-line settings win over config.json, at startup and on every reload"""
+    if args.queue_size:
+        config.queues.size = args.queue_size
+    if args.queue_policy:
+        config.queues.policy = args.queue_policy
+    if args.max_age is not None:
+        config.freshness.max_age = args.max_age
+    if args.kraken_url:
+        config.feeds.kraken_ws_url = args.kraken_url
+    if args.coinbase_url:
+        config.feeds.coinbase_ws_url = args.coinbase_url
+    return config
+
+async def main(stdscr, args):
     try:
         # Load configuration
-        config = Config.load()
+        config = apply_overrides(Config.load(args.config), args)
+        if config.logging.queue:
+            # exchange_monitor.log writes move to a background thread
+            start_queue_logging()
         logger.info("Configuration loaded successfully")
         
         # Initialize and run monitor
-        monitor = ExchangeConsoleMonitor(stdscr, config)
-        await monitor.monitor_prices()
+        stream = None
+        if args.headless:
+            if args.output == '-':
+                out = sys.stdout.buffer
+            else:
+                out = open(args.output, 'ab')
+            stream = SpreadStream(out, args.headless, args.conflate)
+        monitor = ExchangeConsoleMonitor(stdscr, config, stream)
+        monitor.latency_dump = args.latency_dump
+        install_dump_signal(monitor.latency, args.latency_dump)
+        reporter = asyncio.create_task(monitor.latency_report_loop(args.latency_report))
+        summaries = None
+        if config.logging.summary_interval > 0:
+            summaries = asyncio.create_task(monitor.ticks.run(config.logging.summary_interval))
+        # config.json edits (or SIGHUP) apply to the running monitor
+        monitor.watcher = ConfigWatcher(
+            args.config, lambda new: monitor.apply_config(apply_overrides(new, args)),
+            config.reload.interval, config.reload.watch
+        )
+        monitor.watcher.install_signal()
+        reloader = asyncio.create_task(monitor.watcher.run())
+        metrics_server = None
+        flusher = None
+        if args.store or config.storage.enabled:
+            monitor.sink = ParquetSink(
+                args.store or config.storage.path, 'spreads', monitor.instruments, SPREAD_COLUMNS,
+                flush_rows=config.storage.flush_rows, flush_seconds=config.storage.flush_seconds
+            )
+            flusher = asyncio.create_task(monitor.sink.run())
+        try:
+            if args.replay:
+                await monitor.run_replay(args.replay, args.replay_speed)
+                return
+            if args.capture:
+                monitor.capture = CaptureWriter(args.capture)
+            port = config.metrics.monitor_port if args.metrics_port is None else args.metrics_port
+            if config.metrics.enabled and port:
+                try:
+                    metrics_server = await monitor.start_metrics(port)
+                except OSError as e:
+                    logger.error(f"Could not start metrics endpoint on port {port}: {str(e)}")
+            if args.workers:
+                await monitor.monitor_sharded(args.workers)
+            elif args.board:
+                try:
+                    board = BoardReader(args.board, monitor.instruments, monitor.on_quote_record,
+                                        feeds=monitor.feeds)
+                except (FileNotFoundError, ValueError) as e:
+                    logger.error(f"Cannot attach to quote board {args.board}: {str(e)}")
+                    raise SystemExit(f"Cannot attach to quote board {args.board}: {e}")
+                await monitor.monitor_board(board)
+            else:
+                await monitor.monitor_prices()
+        finally:
+            reporter.cancel()
+            reloader.cancel()
+            if summaries is not None:
+                summaries.cancel()
+            monitor.ticks.summary()
+            if flusher is not None:
+                flusher.cancel()
+                await monitor.sink.close()
+            if metrics_server:
+                await metrics_server.stop()
+            if monitor.capture:
+                monitor.capture.close()
+            if stream is not None:
+                stream.close()
+                if stream.out is not sys.stdout.buffer:
+                    stream.out.close()
+                logger.info(f"Spread stream: {stream.records} records written")
+            monitor.dump_latency()
+            monitor.log_queue_stats()
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Kraken/Coinbase spread monitor")
+    parser.add_argument('--config', default='config.json', metavar='FILE',
+                        help="configuration file, reloaded when it changes (default config.json)")
+    parser.add_argument('--capture', metavar='FILE',
+                        help="append every raw websocket frame to a capture file")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="replay a capture file instead of connecting to the exchanges")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="replay pace multiplier; 0 replays as fast as possible")
+    parser.add_argument('--latency-report', type=float, default=60, metavar='SECS',
+                        help="log per-stage latency percentiles this often; 0 disables")
+    parser.add_argument('--latency-dump', metavar='FILE',
+                        help="write per-pair latency histograms as JSON on SIGUSR1, the l key and at exit")
+    parser.add_argument('--max-age', type=float, metavar='SECS',
+                        help="override freshness.max_age: dim rows with a leg older than this (0 = off)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve /metrics and /status on this port (default metrics.monitor_port; 0 disables)")
+    parser.add_argument('--workers', type=int, default=0, metavar='N',
+                        help="split the pairs across N feed worker processes")
+    parser.add_argument('--board', nargs='?', const=DEFAULT_BOARD, metavar='NAME',
+                        help=f"read quotes from a quote_board.py publisher (default name {DEFAULT_BOARD}) instead of connecting")
+    parser.add_argument('--store', metavar='DIR',
+                        help="persist spread updates as Parquet under DIR (default storage.path when storage.enabled)")
+    parser.add_argument('--headless', choices=FORMATS,
+                        help="no curses UI: stream spread updates as NDJSON or binary records instead")
+    parser.add_argument('--output', default='-', metavar='FILE',
+                        help="headless output file, appended to ('-' for stdout)")
+    parser.add_argument('--conflate', type=float, default=0.0, metavar='SECS',
+                        help="headless: write each pair at most once per window; 0 writes every update")
+    parser.add_argument('--queue-size', type=int, metavar='N',
+                        help="frames buffered per exchange between receiver and consumer (default queues.size)")
+    parser.add_argument('--queue-policy', choices=POLICIES,
+                        help="what a full ingest queue does (default queues.policy)")
+    parser.add_argument('--kraken-url', help="override feeds.kraken_ws_url (e.g. a local mock)")
+    parser.add_argument('--coinbase-url', help="override feeds.coinbase_ws_url (e.g. a local mock)")
+    args = parser.parse_args()
+    if args.workers and (args.capture or args.replay):
+        parser.error("--workers cannot be combined with --capture or --replay")
+    if args.board and (args.workers or args.capture or args.replay):
+        parser.error("--board cannot be combined with --workers, --capture or --replay")
+    return args
+
 async def cleanup():
     """Cleanup function to reset terminal state"""
     try:
@@ -432,21 +1045,26 @@ async def cleanup():
         logger.error(f"Cleanup error: {e}")
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
         # Check if config exists, if not create default
-        if not os.path.exists('config.json'):
+        if not os.path.exists(args.config):
             config = Config()
-            config.save()
+            config.save(args.config)
             logger.info("Created default configuration file")
         
         # Run the application
-        wrapper(lambda stdscr: asyncio.run(main(stdscr)))
+        if args.headless:
+            asyncio.run(main(None, args))
+        else:
+            wrapper(lambda stdscr: asyncio.run(main(stdscr, args)))
     except KeyboardInterrupt:
         logger.info("Application stopped by user")
-        print("\nShutting down...")
+        print("\nShutting down...", file=sys.stderr)
     except Exception as e:
         logger.error(f"Application error: {e}")
-        print(f"\nError: {e}")
+        print(f"\nError: {e}", file=sys.stderr)
     finally:
         # Reset terminal state
-        asyncio.run(cleanup())#
+        if not args.headless:
+            asyncio.run(cleanup())#
@@ -0,0 +1,178 @@
+"""Exchange adapters: everything venue-specific about a feed in one place.
+
+An adapter knows its venue's websocket URL, how to subscribe to a list of
+symbols, which decoder reads its frames, how a decoded quote maps back to
+an InstrumentRegistry id, and what its control frames mean. The feed loops
+of the dry-run, the monitor and the shard workers are written once against
+this interface, so a venue is added by registering an adapter here (and a
+decoder in decoders.py, and a <venue>_ws_url in FeedConfig), not by copying
+a loop.
+
+VENUES fixes the order of every per-venue array: the columns of
+ArbitrageEngine's bids and asks, the legs of its QuoteClock, and the
+exchange code in shard and board records and in the Parquet quote sink.
+"""
+from typing import Dict, Iterable, List, Optional
+import logging
+import numpy as np
+import websockets
+
+from config import FeedConfig
+from decoders import FrameDecoder, get_decoder
+from feed_session import SubscriptionTracker, coinbase_subscribe_messages, kraken_subscribe_messages
+from instruments import InstrumentRegistry, PairChanges
+
+logger = logging.getLogger(__name__)
+
+class ExchangeAdapter:
+    """One venue's connection, subscriptions, decoder and symbol map.
+
+    Adapters hold per-connection state (Kraken's channel ids), so every feed
+    loop builds its own.
+    """
+    name = None
+    label = None
+
+    def __init__(self, registry: InstrumentRegistry, feeds: FeedConfig = None, url: str = None):
+        feeds = feeds or FeedConfig()
+        self.registry = registry
+        self.index = VENUES.index(self.name)
+        self.url = url or getattr(feeds, f"{self.name}_ws_url")
+        self.batch_size = feeds.subscribe_batch
+        self.decoder: FrameDecoder = get_decoder(self.name)
+        self.by_symbol = registry.venue(self.name)
+
+    def symbols(self, instruments=None) -> List[str]:
+        """This venue's symbols for instruments (default: every listed pair)"""
+        return self.registry.symbols(self.name, instruments)
+
+    def subscribe_messages(self, symbols: Iterable[str], book_depth: int = 0,
+                           event: str = "subscribe") -> List[str]:
+        """Batched subscribe (or, with event="unsubscribe", unsubscribe) frames:
+        tickers, or L2 books when book_depth > 0"""
+        raise NotImplementedError
+
+    def book_levels(self, book_depth: int) -> int:
+        """Levels an OrderBook of this venue should keep (0 = every level the venue sends)"""
+        return 0
+
+    def connect(self):
+        return websockets.connect(self.url)
+
+    def on_connect(self):
+        """Forget per-connection state; call before subscribing"""
+
+    def rebind(self, changes: PairChanges):
+        """Pick up the registry's new indexes after InstrumentRegistry.update"""
+        self.by_symbol = self.registry.venue(self.name)
+
+    def on_control(self, data, subscriptions: Optional[SubscriptionTracker] = None) -> bool:
+        """Apply a decoded control frame; True when it made subscriptions ready"""
+        return False
+
+    def pair_id(self, tick) -> Optional[int]:
+        """Registry id of a decoded Tick, None if it is not ours (book updates map through by_symbol)"""
+        return self.by_symbol.get(tick.symbol)
+
+class KrakenAdapter(ExchangeAdapter):
+    """Kraken v1: per-pair acks that assign a channel id, which ticker frames then carry"""
+    name = 'kraken'
+    label = 'Kraken'
+
+    def __init__(self, registry: InstrumentRegistry, feeds: FeedConfig = None, url: str = None):
+        super().__init__(registry, feeds, url)
+        self.by_channel: Dict[int, int] = {}
+
+    def subscribe_messages(self, symbols: Iterable[str], book_depth: int = 0,
+                           event: str = "subscribe") -> List[str]:
+        subscription = {"name": "book", "depth": book_depth} if book_depth else {"name": "ticker"}
+        return kraken_subscribe_messages(symbols, subscription, self.batch_size, event)
+
+    def book_levels(self, book_depth: int) -> int:
+        # Levels that fall out of the subscribed depth are never deleted explicitly
+        return book_depth
+
+    def on_connect(self):
+        # Channel ids are handed out again on every connection
+        self.by_channel.clear()
+
+    def rebind(self, changes: PairChanges):
+        super().rebind(changes)
+        # Channels of relisted pairs would still route to the old id; their symbols map them from now on
+        moved = set(changes.legs.get(self.name, ()))
+        if moved:
+            self.by_channel = {channel: pair_id for channel, pair_id in self.by_channel.items()
+                               if pair_id not in moved}
+
+    def on_control(self, data, subscriptions: Optional[SubscriptionTracker] = None) -> bool:
+        if not isinstance(data, dict) or data.get('event') != 'subscriptionStatus':
+            return False
+        # For example: {"channelID": 42, "event": "subscriptionStatus", "pair": "XBT/USD", "status": "subscribed", ...}
+        pair = data.get('pair')
+        if data.get('status') == 'subscribed':
+            pair_id = self.by_symbol.get(pair)
+            if pair_id is not None:
+                self.by_channel[data.get('channelID')] = pair_id
+            logger.debug(f"[Kraken] Subscribed (channel_id={data.get('channelID')}) to pair: {pair}")
+            return subscriptions.record((pair,)) if subscriptions else False
+        if data.get('status') == 'unsubscribed':
+            self.by_channel.pop(data.get('channelID'), None)
+            return False
+        if data.get('status') == 'error':
+            logger.error(f"[kraken] Subscription to {pair} refused: {data.get('errorMessage')}")
+            return subscriptions.record((), {pair: data.get('errorMessage')}) if subscriptions else False
+        return False
+
+    def pair_id(self, tick) -> Optional[int]:
+        pair_id = self.by_channel.get(tick.channel_id)
+        if pair_id is None:
+            pair_id = self.by_symbol.get(tick.symbol)
+        return pair_id
+
+class CoinbaseAdapter(ExchangeAdapter):
+    """Coinbase Exchange: frames name their product id; acks list every subscription so far"""
+    name = 'coinbase'
+    label = 'Coinbase'
+
+    # The unbatched "level2" channel needs an authenticated connection;
+    # "level2_batch" carries the same updates in 50ms batches without one
+    BOOK_CHANNEL = "level2_batch"
+
+    def subscribe_messages(self, symbols: Iterable[str], book_depth: int = 0,
+                           event: str = "subscribe") -> List[str]:
+        channel = self.BOOK_CHANNEL if book_depth else "ticker"
+        return coinbase_subscribe_messages(symbols, channel, self.batch_size, event)
+
+    def on_control(self, data, subscriptions: Optional[SubscriptionTracker] = None) -> bool:
+        if not isinstance(data, dict):
+            return False
+        kind = data.get('type')
+        if kind == 'subscriptions':
+            acked = []
+            for channel in data.get('channels', []):
+                if isinstance(channel, dict):
+                    acked.extend(channel.get('product_ids', ()))
+            return subscriptions.record(acked) if subscriptions else False
+        if kind == 'error':
+            logger.error(f"[coinbase] Subscription error: {data.get('message')} {data.get('reason', '')}")
+        return False
+
+ADAPTERS = {
+    'coinbase': CoinbaseAdapter,
+    'kraken': KrakenAdapter,
+}
+
+# Venue order of every per-venue array and record
+VENUES = tuple(ADAPTERS)
+
+def build_adapters(registry: InstrumentRegistry, feeds: FeedConfig = None,
+                   urls: Optional[Dict[str, str]] = None,
+                   venues: Optional[Iterable[str]] = None) -> Dict[str, ExchangeAdapter]:
+    """One adapter per venue (default every one) in VENUES order; urls overrides feeds.<venue>_ws_url"""
+    urls = urls or {}
+    wanted = set(VENUES if venues is None else venues)
+    return {name: cls(registry, feeds, urls.get(name)) for name, cls in ADAPTERS.items() if name in wanted}
+
+def listed_mask(registry: InstrumentRegistry, venues=VENUES) -> np.ndarray:
+    """(pairs, venues) bool: True where the venue lists the pair"""
+    return np.array([[venue in i.symbols for venue in venues] for i in registry], dtype=bool).reshape(-1, len(venues))
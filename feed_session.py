@@ -0,0 +1,140 @@
+"""Connection lifecycle shared by the exchange feed loops.
+
+Each exchange runs its own connect/subscribe/read loop, so one venue failing
+never tears down the other. Right after connecting, the subscriptions go out
+as a few batched messages instead of one message per pair. A
+SubscriptionTracker counts the acks the exchange's adapter (exchanges.py)
+reads from control frames and sets its ready event once every symbol has
+been confirmed or refused.
+
+Reconnect delays come from Backoff: the first retry after a connection that
+delivered quotes and stayed up longer than the backoff cap is immediate, and
+repeated failures back off exponentially with jitter, up to a cap. A venue
+that accepts the connection and drops it right away is never hammered. Time
+to first quote and the data gap of every reconnect are recorded on FeedStats
+(metrics.py).
+"""
+from typing import Iterable, List
+import asyncio
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+def _batches(items: List[str], size: int) -> List[List[str]]:
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def kraken_subscribe_messages(symbols: Iterable[str], subscription: dict, batch_size: int = 100,
+                              event: str = "subscribe") -> List[str]:
+    return [
+        json.dumps({"event": event, "pair": batch, "subscription": subscription})
+        for batch in _batches(list(symbols), batch_size)
+    ]
+
+def coinbase_subscribe_messages(product_ids: Iterable[str], channel: str = "ticker",
+                                batch_size: int = 100, event: str = "subscribe") -> List[str]:
+    return [
+        json.dumps({"type": event, "channels": [{"name": channel, "product_ids": batch}]})
+        for batch in _batches(list(product_ids), batch_size)
+    ]
+
+class Backoff:
+    """Jittered exponential reconnect delays: 0, then ~initial, 2x initial, ... up to maximum.
+
+    The delays start over only after a connection that stayed up for stable
+    seconds (default: maximum), so a flapping connection keeps backing off.
+    """
+
+    def __init__(self, initial: float = 0.5, maximum: float = 30.0, factor: float = 2.0,
+                 stable: float = None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.stable = maximum if stable is None else stable
+        self.attempt = 0
+        self.connected_at = None
+
+    def next_delay(self) -> float:
+        attempt = self.attempt
+        self.attempt += 1
+        if attempt == 0:
+            return 0.0
+        ceiling = min(self.maximum, self.initial * self.factor ** (attempt - 1))
+        # Half fixed, half random: clients dropped together do not all retry together
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def reset(self):
+        self.attempt = 0
+
+    def connected(self):
+        """Call once the connection is open"""
+        self.connected_at = time.monotonic()
+
+    def disconnected(self, delivered: bool = True):
+        """Call after the connection dropped; resets if it delivered and stayed up long enough"""
+        if delivered and self.connected_at is not None and time.monotonic() - self.connected_at >= self.stable:
+            self.reset()
+        self.connected_at = None
+
+class SubscriptionTracker:
+    """Acks for one exchange's subscriptions since the last (re)subscribe"""
+
+    def __init__(self, exchange: str, symbols: Iterable[str]):
+        self.exchange = exchange
+        self.symbols = set(symbols)
+        self.acked = set()
+        self.failed = {}
+        self.ready = asyncio.Event()
+        self.started = None
+        self.ready_after = None
+
+    @property
+    def pending(self) -> int:
+        return len(self.symbols) - len(self.acked) - len(self.failed)
+
+    def start(self):
+        """Call just before sending the subscribe messages"""
+        self.acked.clear()
+        self.failed.clear()
+        self.ready.clear()
+        self.started = time.monotonic()
+        self.ready_after = None
+
+    def _settle(self) -> bool:
+        if self.pending <= 0 and not self.ready.is_set():
+            self.ready_after = time.monotonic() - self.started if self.started else 0.0
+            self.ready.set()
+            refused = f", {len(self.failed)} refused" if self.failed else ""
+            logger.info(
+                f"[{self.exchange}] {len(self.acked)}/{len(self.symbols)} subscriptions "
+                f"confirmed in {self.ready_after * 1000:.0f}ms{refused}"
+            )
+            return True
+        return False
+
+    def record(self, acked=(), failed=None) -> bool:
+        """Count acked and refused symbols (from an adapter's on_control); True when this made the subscriptions ready"""
+        self.acked.update(acked)
+        self.acked &= self.symbols
+        if failed:
+            self.failed.update(failed)
+        return self._settle()
+
+    def update(self, subscribe=(), unsubscribe=()):
+        """Follow a config reload: wait for acks of subscribe, stop counting unsubscribe"""
+        self.symbols.difference_update(unsubscribe)
+        self.acked &= self.symbols
+        for symbol in unsubscribe:
+            self.failed.pop(symbol, None)
+        added = set(subscribe) - self.symbols
+        self.symbols.update(added)
+        if added:
+            # Ready again once the new symbols are confirmed, timed from now
+            self.ready.clear()
+            self.started = time.monotonic()
+            self.ready_after = None
+        else:
+            self._settle()
@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from config import Config, PairsConfig, pair_symbols
+
+# PairsConfig field -> quote group name
+PAIR_GROUPS = {
+    'usd_pairs': 'usd',
+    'eur_pairs': 'eur',
+    'gbp_pairs': 'gbp',
+    'btc_pairs': 'btc',
+    'eth_pairs': 'eth',
+    'stablecoin_pairs': 'stablecoin',
+}
+
+@dataclass(frozen=True)
+class Instrument:
+    id: int
+    standard_pair: str
+    symbols: Dict[str, str] = field(compare=False)   # venue -> that venue's symbol
+    group: str = 'other'
+
+    @property
+    def kraken_symbol(self) -> Optional[str]:
+        return self.symbols.get('kraken')
+
+    @property
+    def coinbase_symbol(self) -> Optional[str]:
+        return self.symbols.get('coinbase')
+
+@dataclass
+class PairChanges:
+    """What InstrumentRegistry.update changed, per venue where it matters"""
+    added: List[int] = field(default_factory=list)       # new ids, appended
+    removed: List[int] = field(default_factory=list)     # ids no longer configured; they keep their id, listed nowhere
+    subscribe: Dict[str, List[str]] = field(default_factory=dict)     # venue -> newly listed symbols
+    unsubscribe: Dict[str, List[str]] = field(default_factory=dict)   # venue -> symbols no longer listed
+    legs: Dict[str, List[int]] = field(default_factory=dict)   # venue -> ids whose symbol there was added, dropped or replaced
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.legs)
+
+class InstrumentRegistry:
+    """Configured pairs with dense integer ids and O(1) exchange symbol lookups.
+
+    Built once at startup; message handlers resolve symbols through the
+    plain dict indexes below instead of walking PairsConfig. A pair need not
+    be listed on every venue.
+    """
+
+    def __init__(self, pairs: PairsConfig):
+        self.instruments: List[Instrument] = []
+        self.by_pair: Dict[str, int] = {}
+        # venue -> {symbol: id}
+        self.by_symbol: Dict[str, Dict[str, int]] = {}
+
+        for group_field, group in PAIR_GROUPS.items():
+            for standard_pair, entry in getattr(pairs, group_field).items():
+                # A pair listed in several groups keeps its first id
+                if standard_pair in self.by_pair:
+                    continue
+                self.add(standard_pair, pair_symbols(entry), group)
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'InstrumentRegistry':
+        return cls(config.pairs)
+
+    def __len__(self):
+        return len(self.instruments)
+
+    def __iter__(self):
+        return iter(self.instruments)
+
+    def __getitem__(self, pair_id: int) -> Instrument:
+        return self.instruments[pair_id]
+
+    def add(self, standard_pair: str, symbols: Dict[str, str], group: str = 'other') -> Instrument:
+        instrument = Instrument(len(self.instruments), standard_pair, dict(symbols), group)
+        self.instruments.append(instrument)
+        self.by_pair[standard_pair] = instrument.id
+        for venue, symbol in instrument.symbols.items():
+            self.by_symbol.setdefault(venue, {})[symbol] = instrument.id
+        return instrument
+
+    def update(self, pairs: PairsConfig) -> PairChanges:
+        """Follow a reloaded pairs section without renumbering anything.
+
+        New pairs get the next ids; dropped pairs keep theirs but list no
+        symbols, so per-pair arrays stay aligned and a pair that comes back
+        gets its old id. The new indexes are built aside and swapped in with
+        one assignment, so a handler sees either the old or the new ones.
+        """
+        wanted = {}
+        for group_field, group in PAIR_GROUPS.items():
+            for standard_pair, entry in getattr(pairs, group_field).items():
+                wanted.setdefault(standard_pair, (pair_symbols(entry), group))
+
+        changes = PairChanges()
+        instruments = list(self.instruments)
+        by_pair = dict(self.by_pair)
+        for instrument in self.instruments:
+            symbols, group = wanted.get(instrument.standard_pair, ({}, instrument.group))
+            if symbols != instrument.symbols or group != instrument.group:
+                instruments[instrument.id] = Instrument(instrument.id, instrument.standard_pair, symbols, group)
+                if instrument.symbols and not symbols:
+                    changes.removed.append(instrument.id)
+        for standard_pair, (symbols, group) in wanted.items():
+            if standard_pair not in by_pair:
+                instrument = Instrument(len(instruments), standard_pair, symbols, group)
+                instruments.append(instrument)
+                by_pair[standard_pair] = instrument.id
+                changes.added.append(instrument.id)
+
+        by_symbol: Dict[str, Dict[str, int]] = {venue: {} for venue in self.by_symbol}
+        for instrument in instruments:
+            for venue, symbol in instrument.symbols.items():
+                by_symbol.setdefault(venue, {})[symbol] = instrument.id
+        for venue, new in by_symbol.items():
+            old = self.by_symbol.get(venue, {})
+            subscribe = [symbol for symbol in new if symbol not in old]
+            unsubscribe = [symbol for symbol in old if symbol not in new]
+            # A leg changes when its symbol appears, goes away or now means another pair
+            legs = {pair_id for symbol, pair_id in new.items() if old.get(symbol) != pair_id}
+            legs.update(pair_id for symbol, pair_id in old.items() if new.get(symbol) != pair_id)
+            if subscribe:
+                changes.subscribe[venue] = subscribe
+            if unsubscribe:
+                changes.unsubscribe[venue] = unsubscribe
+            if legs:
+                changes.legs[venue] = sorted(legs)
+
+        self.instruments, self.by_pair, self.by_symbol = instruments, by_pair, by_symbol
+        return changes
+
+    def venue(self, venue: str) -> Dict[str, int]:
+        """{symbol: id} for one venue (empty if no pair lists it)"""
+        return self.by_symbol.setdefault(venue, {})
+
+    @property
+    def standard_pairs(self) -> List[str]:
+        return [i.standard_pair for i in self.instruments]
+
+    def symbols(self, venue: str, instruments=None) -> List[str]:
+        """Symbols of instruments (default: all) that are listed on venue"""
+        symbols = (i.symbols.get(venue) for i in (self.instruments if instruments is None else instruments))
+        return [symbol for symbol in symbols if symbol]
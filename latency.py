@@ -0,0 +1,299 @@
+"""Per-stage latency histograms for the tick pipeline.
+
+Each message is stamped when it arrives (wall clock, to compare with the
+exchange's own timestamp, and perf_counter_ns for everything after), once
+decoded, once the quote store is updated, and when the signal or frame it
+caused is produced. Every stage delta lands in a fixed-bucket histogram
+per exchange and pair, so recording costs a bisect and one increment.
+
+Stages:
+    feed    exchange timestamp -> socket receive (includes clock skew)
+    decode  socket receive -> frame decoded
+    store   frame decoded -> quote store updated
+    react   quote store updated -> signal evaluated / frame rendered
+    total   socket receive -> signal evaluated / frame rendered
+
+The histograms are cumulative since start (or the last reset). The periodic
+report diffs them against a copy taken at the previous report, so each
+summary it logs covers just its own interval.
+"""
+from array import array
+from bisect import bisect_left
+import asyncio
+import json
+import logging
+import signal
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEED, DECODE, STORE, REACT, TOTAL = range(5)
+
+# Bucket upper bounds in microseconds: 8 per decade (~33% wide) from 1us to 100s.
+# The extra last bucket collects anything slower.
+BUCKET_BOUNDS_US = [10 ** (i / 8) for i in range(65)]
+N_BUCKETS = len(BUCKET_BOUNDS_US) + 1
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LatencyRecorder:
+    """Histograms indexed by [stage, exchange, pair, bucket].
+
+    Counts live in one flat array('L') so recording stays in plain Python
+    (NumPy scalar indexing costs more than the rest of the work); summaries
+    read it through a zero-copy NumPy view. The react stage is named after
+    what the caller produces ('signal' or 'render'); messages that do not
+    map to a pair are kept in an extra row.
+    """
+
+    def __init__(self, exchanges, labels, react: str = 'react'):
+        self.stages = ('feed', 'decode', 'store', react, 'total')
+        self.exchanges = tuple(exchanges)
+        self.exchange_index = {name: i for i, name in enumerate(self.exchanges)}
+        self.labels = list(labels)
+        self._layout()
+        self._counts = array('L', bytes(array('L').itemsize * int(np.prod(self.shape))))
+        self.maxima = [[0.0] * len(self.exchanges) for _ in self.stages]
+        # pair id -> (exchange, receive ns, store ns) of the oldest tick not yet reacted to
+        self.pending = {}
+        self.started = time.time()
+        # Counts at the previous window_summary(), which reports the difference
+        self._window_base = None
+        self._window_started = self.started
+
+    def _layout(self):
+        self.unmapped = len(self.labels)
+        self.shape = (len(self.stages), len(self.exchanges), len(self.labels) + 1, N_BUCKETS)
+        # Flat offset of [stage, exchange, 0, 0]
+        self._row = [[(s * len(self.exchanges) + e) * self.shape[2] * N_BUCKETS
+                      for e in range(len(self.exchanges))] for s in range(len(self.stages))]
+
+    def add_labels(self, labels):
+        """Append pairs (added on a config reload), keeping every count so far"""
+        old = self.counts
+        n = len(self.labels)
+        self.labels.extend(labels)
+        self._layout()
+        self._counts = array(self._counts.typecode, self._widen(old, n).tobytes())
+        if self._window_base is not None:
+            self._window_base = self._widen(self._window_base, n)
+        if n in self.pending:
+            self.pending[self.unmapped] = self.pending.pop(n)
+
+    def _widen(self, old: np.ndarray, n: int) -> np.ndarray:
+        """old (laid out for n labels) copied into the current shape"""
+        counts = np.zeros(self.shape, dtype=old.dtype)
+        counts[:, :, :n] = old[:, :, :n]
+        counts[:, :, -1] = old[:, :, -1]
+        return counts
+
+    @property
+    def counts(self) -> np.ndarray:
+        """[stage, exchange, pair, bucket] view of the live counters"""
+        return np.frombuffer(self._counts, dtype=np.dtype(f"u{self._counts.itemsize}")).reshape(self.shape)
+
+    def record(self, stage: int, exchange: int, pair_id: int, micros: float):
+        self._counts[self._row[stage][exchange] + pair_id * N_BUCKETS
+                     + bisect_left(BUCKET_BOUNDS_US, micros)] += 1
+        if micros > self.maxima[stage][exchange]:
+            self.maxima[stage][exchange] = micros
+
+    def message(self, exchange: str, pair_id, received, decoded_ns: int, stored_ns: int,
+                exchange_ts: float = None):
+        """Record feed/decode/store for one message and leave its pair pending.
+
+        received is (wall seconds or None, perf_counter_ns) taken right after
+        the socket read; the feed stage needs both a wall time and exchange_ts.
+        """
+        ex = self.exchange_index[exchange]
+        if pair_id is None:
+            pair_id = self.unmapped
+        recv_wall, recv_ns = received
+        # record() inlined: this runs for every message
+        counts, rows, maxima = self._counts, self._row, self.maxima
+        offset = pair_id * N_BUCKETS
+        if exchange_ts is not None and recv_wall is not None:
+            self.record(FEED, ex, pair_id, max(0.0, (recv_wall - exchange_ts) * 1e6))
+        micros = (decoded_ns - recv_ns) / 1000
+        counts[rows[DECODE][ex] + offset + bisect_left(BUCKET_BOUNDS_US, micros)] += 1
+        if micros > maxima[DECODE][ex]:
+            maxima[DECODE][ex] = micros
+        micros = (stored_ns - decoded_ns) / 1000
+        counts[rows[STORE][ex] + offset + bisect_left(BUCKET_BOUNDS_US, micros)] += 1
+        if micros > maxima[STORE][ex]:
+            maxima[STORE][ex] = micros
+        if pair_id not in self.pending:
+            self.pending[pair_id] = (ex, recv_ns, stored_ns)
+
+    def react(self, now_ns: int = None):
+        """Close every pending pair: its signal was evaluated or its row drawn at now_ns"""
+        if not self.pending:
+            return
+        if now_ns is None:
+            now_ns = time.perf_counter_ns()
+        for pair_id, (ex, recv_ns, stored_ns) in self.pending.items():
+            self.record(REACT, ex, pair_id, (now_ns - stored_ns) / 1000)
+            self.record(TOTAL, ex, pair_id, (now_ns - recv_ns) / 1000)
+        self.pending.clear()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.maxima = [[0.0] * len(self.exchanges) for _ in self.stages]
+        self.pending.clear()
+        self.started = time.time()
+        self._window_base = None
+        self._window_started = self.started
+
+    @staticmethod
+    def percentiles(counts, maximum: float = None, qs=PERCENTILES):
+        """Bucket upper bounds at each percentile of a 1-d bucket count array"""
+        total = int(counts.sum())
+        if not total:
+            return [None] * len(qs)
+        cumulative = np.cumsum(counts)
+        values = []
+        for q in qs:
+            bucket = int(np.searchsorted(cumulative, total * q / 100))
+            if bucket >= len(BUCKET_BOUNDS_US):
+                values.append(maximum)
+            else:
+                bound = BUCKET_BOUNDS_US[bucket]
+                values.append(min(bound, maximum) if maximum else bound)
+        return values
+
+    def _stats(self, counts, maximum=None) -> dict:
+        stats = {'count': int(counts.sum())}
+        for q, value in zip(PERCENTILES, self.percentiles(counts, maximum)):
+            stats[f"p{q:g}_us"] = value
+        if maximum is not None:
+            stats['max_us'] = maximum
+        return stats
+
+    def summary(self, by_pair: bool = False, top: int = 5) -> dict:
+        """Per stage and exchange percentiles since start, plus the slowest pairs by total p99"""
+        return self._summary(self.counts, self.maxima, self.started, by_pair, top)
+
+    def window_summary(self, top: int = 5) -> dict:
+        """Like summary(), but only what was recorded since the previous call (or start).
+
+        Exact maxima are only kept since start, so each max_us here is the
+        upper bound of the slowest bucket that saw traffic in the window.
+        """
+        now = time.time()
+        counts = self.counts.copy()
+        base, since = self._window_base, self._window_started
+        self._window_base, self._window_started = counts, now
+        if base is not None:
+            counts = counts - base
+        maxima = [[_top_bound(counts[s, e].sum(axis=0), self.maxima[s][e])
+                   for e in range(len(self.exchanges))] for s in range(len(self.stages))]
+        return self._summary(counts, maxima, since, False, top, now)
+
+    def _summary(self, counts, maxima, since: float, by_pair: bool, top: int, until: float = None) -> dict:
+        result = {'since': since, 'until': until or time.time(), 'stages': {}, 'slowest_pairs': {}}
+        for s, stage in enumerate(self.stages):
+            result['stages'][stage] = {
+                exchange: self._stats(counts[s, e].sum(axis=0), maxima[s][e])
+                for e, exchange in enumerate(self.exchanges)
+            }
+        for e, exchange in enumerate(self.exchanges):
+            ranked = []
+            for pair_id in np.flatnonzero(counts[TOTAL, e].sum(axis=1)).tolist():
+                p99 = self.percentiles(counts[TOTAL, e, pair_id], qs=(99,))[0]
+                ranked.append((p99, self._label(pair_id)))
+            ranked.sort(reverse=True)
+            result['slowest_pairs'][exchange] = [
+                {'pair': label, 'p99_us': p99} for p99, label in ranked[:top]
+            ]
+        if by_pair:
+            pairs = {}
+            for s, stage in enumerate(self.stages):
+                for e, exchange in enumerate(self.exchanges):
+                    rows = counts[s, e]
+                    for pair_id in np.flatnonzero(rows.sum(axis=1)).tolist():
+                        pairs.setdefault(self._label(pair_id), {}).setdefault(stage, {})[exchange] = \
+                            self._stats(rows[pair_id])
+            result['pairs'] = pairs
+        return result
+
+    def _label(self, pair_id: int) -> str:
+        return self.labels[pair_id] if pair_id < len(self.labels) else '(unmapped)'
+
+    def format_summary(self, window: bool = False) -> list:
+        """Log lines: one per stage and exchange that saw traffic, then the slowest pairs.
+
+        window=True covers the time since the previous window summary
+        instead of everything since start.
+        """
+        summary = self.window_summary() if window else self.summary()
+        span = summary['until'] - summary['since']
+        lines = [f"[Latency] last {span:.0f}s" if window else f"[Latency] since start ({span:.0f}s)"]
+        for stage, by_exchange in summary['stages'].items():
+            for exchange, stats in by_exchange.items():
+                if not stats['count']:
+                    continue
+                lines.append(
+                    f"[Latency] {stage:<7} {exchange:<9} n={stats['count']:<8} "
+                    f"p50={_fmt_us(stats['p50_us'])} p90={_fmt_us(stats['p90_us'])} "
+                    f"p99={_fmt_us(stats['p99_us'])} max={_fmt_us(stats['max_us'])}"
+                )
+        for exchange, pairs in summary['slowest_pairs'].items():
+            if pairs:
+                slowest = ", ".join(f"{p['pair']} {_fmt_us(p['p99_us'])}" for p in pairs)
+                lines.append(f"[Latency] slowest total p99 on {exchange}: {slowest}")
+        return lines
+
+    def log_summary(self, window: bool = False):
+        for line in self.format_summary(window):
+            logger.info(line)
+
+    def dump(self, path: str):
+        """Write the full summary, including every pair, as JSON"""
+        with open(path, 'w') as f:
+            json.dump(self.summary(by_pair=True), f, indent=2)
+        logger.info(f"[Latency] Histogram summary written to {path}")
+
+def _top_bound(counts, maximum: float = None):
+    """Upper bound of the slowest bucket in a 1-d bucket count array, capped at maximum"""
+    nonzero = np.flatnonzero(counts)
+    if not len(nonzero):
+        return None
+    bucket = int(nonzero[-1])
+    if bucket >= len(BUCKET_BOUNDS_US):
+        return maximum
+    bound = BUCKET_BOUNDS_US[bucket]
+    return min(bound, maximum) if maximum else bound
+
+def _fmt_us(value) -> str:
+    if value is None:
+        return '-'
+    if value >= 1e6:
+        return f"{value / 1e6:.2f}s"
+    if value >= 1e3:
+        return f"{value / 1e3:.1f}ms"
+    return f"{value:.0f}us" if value >= 10 else f"{value:.1f}us"
+
+async def report_periodically(recorder: LatencyRecorder, interval: float):
+    """Log a summary of the last interval seconds every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            recorder.log_summary(window=True)
+        except Exception as e:
+            logger.error(f"[Latency] Summary error: {str(e)}")
+
+def install_dump_signal(recorder: LatencyRecorder, path: str = None) -> bool:
+    """Log (and write to path, if given) a summary on SIGUSR1; False where unsupported"""
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+
+    def dump():
+        recorder.log_summary()
+        if path:
+            recorder.dump(path)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, dump)
+    except (NotImplementedError, RuntimeError):
+        return False
+    return True
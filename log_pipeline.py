@@ -0,0 +1,122 @@
+"""Logging that stays off the tick path.
+
+start_queue_logging() moves the root logger's handlers (console, log file)
+behind a QueueHandler: the event loop only enqueues records, and a
+QueueListener thread does the formatting and the file and console writes.
+
+TickLog is for per-tick events (quote updates, opportunities). Each
+category logs one event in sample_every, at most rate lines per second,
+and counts everything it skips. Messages use logging's lazy %-style
+arguments, so skipped events are never formatted, and summary() reports
+what was seen, logged and suppressed since the last summary.
+"""
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+import asyncio
+import atexit
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+def start_queue_logging() -> QueueListener:
+    """Route every root handler through a background thread; idempotent"""
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return None
+    handlers = list(root.handlers)
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(records))
+    listener.start()
+    # Flushes whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+class TickCategory:
+    """Sampling and token-bucket rate limit for one kind of tick event"""
+    __slots__ = ('name', 'logger', 'sample_every', 'rate', 'tokens', 'refilled',
+                 'seen', 'logged', 'sampled_out', 'rate_limited', '_window')
+
+    def __init__(self, name: str, logger: logging.Logger, sample_every: int = 1, rate: float = 0.0):
+        self.name = name
+        self.logger = logger
+        self.sample_every = sample_every
+        self.rate = rate
+        self.tokens = max(rate, 1.0)
+        self.refilled = time.monotonic()
+        self.seen = 0
+        self.logged = 0
+        self.sampled_out = 0
+        self.rate_limited = 0
+        self._window = (0, 0, 0, 0)
+
+    def log(self, msg: str, *args, level: int = logging.INFO):
+        """Log msg % args if this event is sampled and within the rate limit"""
+        self.seen += 1
+        if self.sample_every <= 0 or self.seen % self.sample_every:
+            self.sampled_out += 1
+            return
+        if self.rate > 0:
+            now = time.monotonic()
+            # Burst of up to one second's worth of lines
+            tokens = min(self.rate, self.tokens + (now - self.refilled) * self.rate)
+            self.refilled = now
+            if tokens < 1.0:
+                self.tokens = tokens
+                self.rate_limited += 1
+                return
+            self.tokens = tokens - 1.0
+        self.logged += 1
+        self.logger.log(level, msg, *args)
+
+    def take_window(self):
+        """(seen, logged, sampled out, rate limited) since the previous call"""
+        now = (self.seen, self.logged, self.sampled_out, self.rate_limited)
+        window = tuple(a - b for a, b in zip(now, self._window))
+        self._window = now
+        return window
+
+class TickLog:
+    """Named TickCategory instances plus their periodic summary"""
+
+    def __init__(self, logger: logging.Logger, prefix: str = "[Ticks]"):
+        self.logger = logger
+        self.prefix = prefix
+        self.categories: Dict[str, TickCategory] = {}
+        self._summarized = time.monotonic()
+
+    def category(self, name: str, sample_every: int = 1, rate: float = 0.0) -> TickCategory:
+        category = self.categories.get(name)
+        if category is None:
+            category = self.categories[name] = TickCategory(name, self.logger, sample_every, rate)
+        else:
+            category.sample_every = sample_every
+            category.rate = rate
+        return category
+
+    def summary(self):
+        """Log one line of per-category counts since the last summary"""
+        now = time.monotonic()
+        elapsed = now - self._summarized
+        self._summarized = now
+        parts = []
+        for category in self.categories.values():
+            seen, logged, sampled_out, rate_limited = category.take_window()
+            if not seen:
+                continue
+            part = f"{category.name} {seen} ({seen / elapsed:.1f}/s, {logged} logged"
+            if rate_limited:
+                part += f", {rate_limited} rate-limited"
+            parts.append(part + ")")
+        if parts:
+            self.logger.info(f"{self.prefix} last {elapsed:.0f}s: {'; '.join(parts)}")
+
+    async def run(self, interval: float):
+        """Log a summary every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.summary()
@@ -0,0 +1,401 @@
+"""Prometheus text and JSON status endpoint served from the process's own event loop.
+
+Hot paths only bump plain attributes (FeedStats) or Metric values. Anything
+derived (message rates, quote ages, queue depths, latency percentiles) is
+computed by collectors at scrape time, and rendering yields to the event
+loop every few hundred series so a scrape of thousands of per-pair series
+never holds up the feed handlers for long.
+
+    GET /metrics   Prometheus text exposition format
+    GET /status    the same values as JSON, plus uptime
+"""
+from collections import deque
+from itertools import compress
+import asyncio
+import logging
+import math
+import time
+import numpy as np
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Series rendered between yields to the event loop
+RENDER_CHUNK = 500
+
+class Metric:
+    """One metric family: label values tuple -> float"""
+
+    def __init__(self, name: str, kind: str, help: str, labelnames=()):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._rendered_labels = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+    def replace(self, values: dict):
+        """Swap in a whole new set of series (used by collectors)"""
+        self.values = values
+
+    def label_text(self, labels) -> str:
+        text = self._rendered_labels.get(labels)
+        if text is None:
+            if labels:
+                pairs = ",".join(
+                    f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, labels)
+                )
+                text = "{" + pairs + "}"
+            else:
+                text = ""
+            self._rendered_labels[labels] = text
+        return text
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class FeedStats:
+    """Per-exchange connection counters, bumped directly by the socket loops.
+
+    A data gap opens at startup and on every disconnect (from the last frame
+    received) and closes on the next applied quote: the first one gives
+    first_quote, the time from startup to the first quote, and each later one
+    is a reconnect gap.
+    """
+    __slots__ = ('exchange', 'messages', 'decode_errors', 'reconnects', 'connected',
+                 'last_message', 'websocket', 'rate', '_rate_messages', '_rate_time',
+                 'gap_open', 'gap_started', 'first_quote', 'gaps', 'last_gap', 'max_gap', 'total_gap')
+
+    def __init__(self, exchange: str):
+        self.exchange = exchange
+        self.messages = 0
+        self.decode_errors = 0
+        self.reconnects = 0
+        self.connected = False
+        self.last_message = None   # time.monotonic() of the last frame received
+        self.websocket = None
+        self.rate = 0.0
+        self._rate_messages = 0
+        self._rate_time = time.monotonic()
+        self.gap_open = True
+        self.gap_started = self._rate_time
+        self.first_quote = None
+        self.gaps = 0
+        self.last_gap = 0.0
+        self.max_gap = 0.0
+        self.total_gap = 0.0
+
+    def on_connect(self, websocket):
+        self.websocket = websocket
+        self.connected = True
+
+    def on_disconnect(self):
+        self.websocket = None
+        if self.connected:
+            self.reconnects += 1
+        self.connected = False
+        self.open_gap()
+
+    def open_gap(self):
+        """Quotes stopped; the gap is measured from the last frame received"""
+        if not self.gap_open:
+            self.gap_open = True
+            self.gap_started = self.last_message or time.monotonic()
+
+    def close_gap(self, now: float = None) -> float:
+        """Quotes are flowing again; returns the gap length in seconds"""
+        now = time.monotonic() if now is None else now
+        gap = now - self.gap_started
+        self.gap_open = False
+        if self.first_quote is None:
+            self.first_quote = gap
+            logger.info(f"[{self.exchange}] First quote {gap:.3f}s after startup")
+        else:
+            self.gaps += 1
+            self.last_gap = gap
+            self.total_gap += gap
+            if gap > self.max_gap:
+                self.max_gap = gap
+            logger.info(f"[{self.exchange}] Quotes resumed after a {gap:.3f}s gap")
+        return gap
+
+    def queue_depth(self) -> int:
+        """Frames the websocket has buffered that the handler has not read yet"""
+        messages = getattr(self.websocket, 'messages', None)
+        return len(messages) if messages is not None else 0
+
+    def sample_rate(self, now: float):
+        elapsed = now - self._rate_time
+        if elapsed >= 1.0:
+            self.rate = (self.messages - self._rate_messages) / elapsed
+            self._rate_messages = self.messages
+            self._rate_time = now
+
+class MetricsRegistry:
+    """Metric families plus the collectors that refresh derived values before a scrape"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.metrics = {}
+        self.collectors = []
+        self.feeds = []
+        self.started = time.time()
+        self.loop_lag = 0.0
+        self.loop_lag_samples = deque(maxlen=20)
+        self.scrapes = 0
+
+        self.gauge('uptime_seconds', "Seconds since the process started")
+        self.gauge('event_loop_lag_seconds', "Last measured event loop scheduling delay")
+        self.gauge('event_loop_lag_max_seconds', "Largest event loop delay over the last ~10 seconds")
+        self.add_collector(self._collect_process)
+
+    def _add(self, name, kind, help, labelnames) -> Metric:
+        full_name = f"{self.prefix}_{name}"
+        metric = self.metrics.get(full_name)
+        if metric is None:
+            metric = self.metrics[full_name] = Metric(full_name, kind, help, labelnames)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._add(name, 'counter', help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._add(name, 'gauge', help, labelnames)
+
+    def get(self, name: str) -> Metric:
+        return self.metrics[f"{self.prefix}_{name}"]
+
+    def add_collector(self, collector):
+        """collector() runs before every scrape and updates gauges"""
+        self.collectors.append(collector)
+
+    def add_feeds(self, feeds):
+        """Export FeedStats counters, rates, connection state and socket backlog per exchange"""
+        self.feeds.extend(feeds)
+        labels = ('exchange',)
+        messages = self.counter('messages_total', "Websocket frames received", labels)
+        errors = self.counter('decode_errors_total', "Frames that could not be decoded", labels)
+        reconnects = self.counter('reconnects_total', "Connections lost and retried", labels)
+        connected = self.gauge('connected', "1 while the exchange websocket is open", labels)
+        rate = self.gauge('messages_per_second', "Frames received per second over the last second", labels)
+        silence = self.gauge('last_message_age_seconds', "Seconds since the last frame", labels)
+        depth = self.gauge('queue_depth', "Items waiting to be processed", ('queue',))
+        first_quote = self.gauge('first_quote_seconds', "Seconds from startup to the first quote", labels)
+        gaps = self.counter('data_gaps_total', "Reconnects after which quotes resumed", labels)
+        gap_seconds = self.counter('data_gap_seconds_total', "Seconds without quotes across reconnects", labels)
+        last_gap = self.gauge('data_gap_last_seconds', "Quote gap of the latest reconnect", labels)
+        max_gap = self.gauge('data_gap_max_seconds', "Longest quote gap of any reconnect", labels)
+
+        def collect():
+            now = time.monotonic()
+            for feed in self.feeds:
+                key = (feed.exchange,)
+                messages.values[key] = feed.messages
+                errors.values[key] = feed.decode_errors
+                reconnects.values[key] = feed.reconnects
+                connected.values[key] = 1.0 if feed.connected else 0.0
+                rate.values[key] = feed.rate
+                silence.values[key] = now - feed.last_message if feed.last_message else math.nan
+                depth.values[(f"websocket_{feed.exchange}",)] = feed.queue_depth()
+                if feed.first_quote is not None:
+                    first_quote.values[key] = feed.first_quote
+                gaps.values[key] = feed.gaps
+                gap_seconds.values[key] = feed.total_gap
+                last_gap.values[key] = feed.last_gap
+                max_gap.values[key] = feed.max_gap
+        self.add_collector(collect)
+
+    def add_queue(self, name: str, length):
+        """Export len-style callable length() as queue_depth{queue=name}"""
+        depth = self.gauge('queue_depth', "Items waiting to be processed", ('queue',))
+
+        def collect():
+            depth.values[(name,)] = length()
+        self.add_collector(collect)
+
+    def add_ring_queues(self, queues):
+        """Export RingQueue depth, high-water mark and overflow counters per queue"""
+        depth = self.gauge('queue_depth', "Items waiting to be processed", ('queue',))
+        high_water = self.gauge('queue_high_water', "Most items ever waiting at once", ('queue',))
+        capacity = self.gauge('queue_capacity', "Items the queue holds before its overflow policy applies", ('queue',))
+        dropped = self.counter('queue_dropped_total', "Items evicted from a full queue", ('queue',))
+        conflated = self.counter('queue_conflated_total', "Items replaced by a newer one for the same key", ('queue',))
+        blocked = self.counter('queue_blocked_total', "Puts that had to wait for room", ('queue',))
+
+        def collect():
+            for queue in queues:
+                key = (queue.name,)
+                depth.values[key] = len(queue)
+                high_water.values[key] = queue.high_water
+                capacity.values[key] = queue.capacity
+                dropped.values[key] = queue.dropped
+                conflated.values[key] = queue.conflated
+                blocked.values[key] = queue.blocked
+        self.add_collector(collect)
+
+    def add_quote_ages(self, labels, exchanges, times):
+        """Export now - times[pair, exchange] (time.monotonic() the last quote is current as of) per pair.
+
+        labels and times may be callables returning the current list and
+        array, for tables that grow while running (config reload).
+        """
+        ages = self.gauge('quote_age_seconds', "Age of the pair's last quote", ('exchange', 'pair'))
+        keys = []
+
+        def collect():
+            current = labels() if callable(labels) else labels
+            if not keys or len(keys[0]) != len(current):
+                keys[:] = [[(exchange, label) for label in current] for exchange in exchanges]
+            age = time.monotonic() - (times() if callable(times) else times)
+            values = {}
+            for e, exchange_keys in enumerate(keys):
+                column = age[:, e]
+                quoted = np.isfinite(column)
+                values.update(zip(compress(exchange_keys, quoted.tolist()), column[quoted].tolist()))
+            ages.replace(values)
+        self.add_collector(collect)
+
+    def add_clock_offsets(self, clock):
+        """Export a QuoteClock's local minus exchange clock estimates"""
+        offsets = self.gauge('clock_offset_seconds',
+                             "Local minus exchange clock, plus the fastest recent transit", ('exchange',))
+
+        def collect():
+            offsets.replace({(exchange,): offset for exchange, offset in clock.offsets().items()})
+        self.add_collector(collect)
+
+    def add_latency(self, recorder, quantiles=(50, 99)):
+        """Export LatencyRecorder percentiles per stage and exchange (seconds)"""
+        latency = self.gauge('latency_seconds', "Pipeline stage latency percentile",
+                             ('stage', 'exchange', 'quantile'))
+
+        def collect():
+            counts = recorder.counts
+            values = {}
+            for s, stage in enumerate(recorder.stages):
+                for e, exchange in enumerate(recorder.exchanges):
+                    buckets = counts[s, e].sum(axis=0)
+                    percentiles = recorder.percentiles(buckets, recorder.maxima[s][e], quantiles)
+                    for q, value in zip(quantiles, percentiles):
+                        if value is not None:
+                            values[(stage, exchange, f"{q / 100:g}")] = value / 1e6
+            latency.replace(values)
+        self.add_collector(collect)
+
+    def _collect_process(self):
+        self.get('uptime_seconds').set(value=time.time() - self.started)
+        self.get('event_loop_lag_seconds').set(value=self.loop_lag)
+        self.get('event_loop_lag_max_seconds').set(
+            value=max(self.loop_lag_samples) if self.loop_lag_samples else 0.0
+        )
+
+    def collect(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Metrics collector error: {str(e)}")
+
+    async def render_prometheus(self) -> str:
+        self.collect()
+        lines = []
+        since_yield = 0
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in list(metric.values.items()):
+                lines.append(f"{metric.name}{metric.label_text(labels)} {_format_value(value)}")
+                since_yield += 1
+                if since_yield >= RENDER_CHUNK:
+                    since_yield = 0
+                    await asyncio.sleep(0)
+        lines.append("")
+        return "\n".join(lines)
+
+    async def snapshot(self) -> dict:
+        """Nested dict of every series, keyed by metric then label values"""
+        self.collect()
+        result = {}
+        since_yield = 0
+        for metric in list(self.metrics.values()):
+            name = metric.name[len(self.prefix) + 1:]
+            if not metric.labelnames:
+                result[name] = metric.values.get((), None)
+                continue
+            series = result[name] = {}
+            for labels, value in list(metric.values.items()):
+                node = series
+                for label in labels[:-1]:
+                    node = node.setdefault(str(label), {})
+                node[str(labels[-1])] = None if value != value else value
+                since_yield += 1
+                if since_yield >= RENDER_CHUNK:
+                    since_yield = 0
+                    await asyncio.sleep(0)
+        return result
+
+    async def watch_event_loop(self, interval: float = 0.5):
+        """Measure how late the loop wakes a sleeping task and sample message rates"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, loop.time() - expected)
+            self.loop_lag_samples.append(self.loop_lag)
+            now = time.monotonic()
+            for feed in self.feeds:
+                feed.sample_rate(now)
+
+class MetricsServer:
+    """aiohttp app serving a MetricsRegistry; status() can add fields to the JSON"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = '0.0.0.0', port: int = 9101, status=None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.status = status
+        self.runner = None
+        self.watcher = None
+
+    async def metrics(self, request):
+        self.registry.scrapes += 1
+        text = await self.registry.render_prometheus()
+        return web.Response(text=text, content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def status_json(self, request):
+        self.registry.scrapes += 1
+        body = {'uptime_seconds': time.time() - self.registry.started}
+        if self.status:
+            body.update(self.status())
+        body['metrics'] = await self.registry.snapshot()
+        return web.json_response(body)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.metrics)
+        app.router.add_get('/status', self.status_json)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.watcher = asyncio.create_task(self.registry.watch_event_loop())
+        logger.info(f"Metrics on http://{self.host}:{self.port}/metrics and /status")
+
+    async def stop(self):
+        if self.watcher:
+            self.watcher.cancel()
+        if self.runner:
+            await self.runner.cleanup()
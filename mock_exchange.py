@@ -0,0 +1,520 @@
+"""Local stand-in for the Kraken v1 and Coinbase Exchange ticker feeds.
+
+Runs two websocket servers that accept the same subscribe messages as the
+real exchanges and stream synthetic ticker or L2 book frames for whatever was
+subscribed, with configurable rate, bursts, disconnects and latency.
+
+    python mock_exchange.py --rate 2000 --burst-every 10 --burst-size 5000
+    python exchange_monitor.py --kraken-url ws://localhost:8765 --coinbase-url ws://localhost:8766
+"""
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import random
+import time
+import websockets
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class MockSettings:
+    symbols: int = 0             # max active symbols per connection, 0 = all subscribed
+    rate: float = 100.0          # ticker messages per second per connection
+    burst_every: float = 0.0     # seconds between bursts, 0 = no bursts
+    burst_size: int = 0          # extra messages sent at once in a burst
+    disconnect_every: float = 0.0  # drop each connection after roughly this many seconds
+    latency_ms: float = 0.0      # fixed delay between generating and sending a frame
+    jitter_ms: float = 0.0       # random extra delay, uniform in [0, jitter_ms]
+    heartbeat_secs: float = 1.0
+
+class PriceWalk:
+    """Per-symbol random walk with a fixed relative spread"""
+
+    def __init__(self, seed: int = None):
+        self.rng = random.Random(seed)
+        self.prices = {}
+
+    def next(self, symbol: str):
+        price = self.prices.get(symbol)
+        if price is None:
+            price = 10 ** self.rng.uniform(-2, 4.5)
+        price *= 1 + self.rng.gauss(0, 0.0005)
+        self.prices[symbol] = price
+        half_spread = price * 0.0001
+        return price - half_spread, price + half_spread, price
+
+class VenuePrices:
+    """One venue's quotes on a PriceWalk shared by every mock venue.
+
+    Wire symbols map to the walk's standard pair, so "XBT/USD" and "BTC-USD"
+    follow the same price; each venue quotes it at a small fixed basis (drawn
+    once per pair) plus per-quote noise, both relative to the price.
+    """
+
+    def __init__(self, walk: PriceWalk, symbols: dict = None, basis: float = 0.001,
+                 noise: float = 0.0002, seed: int = None):
+        self.walk = walk
+        self.symbols = symbols or {}
+        self.basis = basis
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.offsets = {}
+
+    def next(self, symbol: str):
+        key = self.symbols.get(symbol, symbol)
+        price = self.walk.next(key)[2]
+        offset = self.offsets.get(key)
+        if offset is None:
+            offset = self.offsets[key] = self.rng.gauss(0, self.basis)
+        price *= 1 + offset + self.rng.gauss(0, self.noise)
+        half_spread = price * 0.0001
+        return price - half_spread, price + half_spread, price
+
+def venue_symbols(filename: str) -> dict:
+    """{venue: {wire symbol: standard pair}} from a config file's pairs section"""
+    # Imported here so config's logging setup does not replace this module's
+    from config import Config
+    from instruments import InstrumentRegistry
+    registry = InstrumentRegistry.from_config(Config.load(filename))
+    return {venue: {symbol: registry[pair_id].standard_pair for symbol, pair_id in symbols.items()}
+            for venue, symbols in registry.by_symbol.items()}
+
+def _fmt(price: float) -> str:
+    return f"{price:.8f}" if price < 1 else f"{price:.5f}"
+
+class MockBook:
+    """Per-symbol L2 books that follow a venue's prices and emit level changes.
+
+    Levels are keyed by their formatted price so clients see exactly the
+    strings they will use as book keys. Levels that would cross the new top
+    of book are deleted, so the client's book never ends up crossed.
+    """
+
+    def __init__(self, walk, levels: int = 25):
+        self.walk = walk
+        self.levels = levels
+        self.books = {}
+
+    def _tick(self, price: float) -> float:
+        return price * 0.0001
+
+    def snapshot(self, symbol: str):
+        """(bids, asks) as [price, size] strings, best first"""
+        bid, ask, last = self.walk.next(symbol)
+        tick = self._tick(last)
+        rng = self.walk.rng
+        bids = {_fmt(bid - i * tick): f"{rng.uniform(0.01, 5):.8f}" for i in range(self.levels)}
+        asks = {_fmt(ask + i * tick): f"{rng.uniform(0.01, 5):.8f}" for i in range(self.levels)}
+        self.books[symbol] = (bids, asks)
+        return self._sorted(bids, True), self._sorted(asks, False)
+
+    def _sorted(self, side, is_bid):
+        return [[p, s] for p, s in sorted(side.items(), key=lambda kv: float(kv[0]), reverse=is_bid)]
+
+    def changes(self, symbol: str):
+        """Move the price and return (bid_changes, ask_changes); size "0" deletes"""
+        if symbol not in self.books:
+            self.snapshot(symbol)
+        bids, asks = self.books[symbol]
+        bid, ask, last = self.walk.next(symbol)
+        tick = self._tick(last)
+        rng = self.walk.rng
+        bid_changes, ask_changes = [], []
+        # Compare at wire precision so two prices that format alike count as crossed
+        bid_key, ask_key = float(_fmt(bid)), float(_fmt(ask))
+        for side, changes, crossed in ((bids, bid_changes, lambda p: p >= ask_key),
+                                       (asks, ask_changes, lambda p: p <= bid_key)):
+            for price in [p for p in side if crossed(float(p))]:
+                del side[price]
+                changes.append([price, "0.00000000"])
+        # New top of book plus one change somewhere deeper
+        for side, changes, top, step in ((bids, bid_changes, bid, -tick), (asks, ask_changes, ask, tick)):
+            for price in (_fmt(top), _fmt(top + step * rng.randrange(1, self.levels))):
+                size = "0.00000000" if price in side and rng.random() < 0.3 else f"{rng.uniform(0.01, 5):.8f}"
+                if size == "0.00000000":
+                    del side[price]
+                else:
+                    side[price] = size
+                changes.append([price, size])
+            # Trim the far end so the book stays around the configured depth
+            if len(side) > 2 * self.levels:
+                for price in sorted(side, key=float, reverse=step > 0)[:len(side) - 2 * self.levels]:
+                    del side[price]
+                    changes.append([price, "0.00000000"])
+        return bid_changes, ask_changes
+
+class MockFeed:
+    """Shared connection loop; subclasses implement the exchange wire format"""
+    name = None
+
+    def __init__(self, settings: MockSettings, seed: int = None, prices: VenuePrices = None):
+        self.settings = settings
+        # Without shared prices the feed runs its own walk, unrelated to other venues
+        self.walk = prices or PriceWalk(seed)
+        self.sent = 0
+        self.connections = 0
+
+    async def handler(self, websocket, path=None):
+        self.connections += 1
+        subscribed = []
+        pending = deque()
+        rng = random.Random()
+        started = time.monotonic()
+        disconnect_at = None
+        if self.settings.disconnect_every > 0:
+            disconnect_at = started + self.settings.disconnect_every * rng.uniform(0.5, 1.5)
+        logger.info(f"[{self.name}] client connected")
+        try:
+            await self.on_connect(websocket)
+            reader = asyncio.create_task(self._read(websocket, subscribed))
+            try:
+                emitted = 0
+                next_burst = started + self.settings.burst_every if self.settings.burst_every > 0 else None
+                last_sent = time.monotonic()
+                while not reader.done():
+                    now = time.monotonic()
+                    if disconnect_at and now >= disconnect_at:
+                        logger.info(f"[{self.name}] injecting disconnect")
+                        await websocket.close(code=1001, reason="mock disconnect")
+                        break
+
+                    active = subscribed[:self.settings.symbols] if self.settings.symbols else subscribed
+                    if active:
+                        due = int((now - started) * self.settings.rate) - emitted
+                        if next_burst and now >= next_burst:
+                            due += self.settings.burst_size
+                            next_burst += self.settings.burst_every
+                        for _ in range(max(due, 0)):
+                            symbol, channel = rng.choice(active)
+                            send_at = now
+                            if self.settings.latency_ms or self.settings.jitter_ms:
+                                send_at += (self.settings.latency_ms
+                                            + rng.uniform(0, self.settings.jitter_ms)) / 1000
+                            pending.append((send_at, self.data_frame(symbol, channel)))
+                        emitted += max(due, 0)
+                    else:
+                        # Keep the rate clock anchored until something is subscribed
+                        started = now
+                        emitted = 0
+
+                    frames = []
+                    while pending and pending[0][0] <= now:
+                        frames.append(pending.popleft()[1])
+                    for frame in frames:
+                        await websocket.send(frame)
+                    self.sent += len(frames)
+                    if frames:
+                        last_sent = now
+                    elif now - last_sent >= self.settings.heartbeat_secs:
+                        heartbeat = self.heartbeat_frame(active)
+                        if heartbeat:
+                            await websocket.send(heartbeat)
+                        last_sent = now
+                    await asyncio.sleep(0.001)
+            finally:
+                # Collect the reader's outcome too, or a dropped client leaves it unretrieved
+                reader.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await reader
+        except websockets.ConnectionClosed:
+            pass
+        logger.info(f"[{self.name}] client disconnected")
+
+    async def _read(self, websocket, subscribed):
+        try:
+            async for message in websocket:
+                try:
+                    request = json.loads(message)
+                except ValueError:
+                    continue
+                for reply in self.on_request(request, subscribed):
+                    await websocket.send(reply)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def on_connect(self, websocket):
+        pass
+
+    def on_request(self, request, subscribed):
+        return []
+
+    def data_frame(self, symbol: str, channel: str) -> str:
+        if channel == 'ticker':
+            return self.ticker_frame(symbol)
+        return self.book_frame(symbol, channel)
+
+    def ticker_frame(self, symbol: str) -> str:
+        raise NotImplementedError
+
+    def book_frame(self, symbol: str, channel: str) -> str:
+        raise NotImplementedError
+
+    def heartbeat_frame(self, active):
+        return None
+
+class KrakenMock(MockFeed):
+    """Kraken v1: subscriptionStatus acks, channelID arrays, event heartbeats"""
+    name = 'Kraken mock'
+    book_depths = (10, 25, 100, 500, 1000)
+
+    def __init__(self, settings: MockSettings, seed: int = None, prices: VenuePrices = None):
+        super().__init__(settings, seed, prices)
+        self.channel_ids = itertools.count(100)
+        self.channels = {}
+        self.book = MockBook(self.walk)
+
+    async def on_connect(self, websocket):
+        await websocket.send(json.dumps({
+            "connectionID": random.getrandbits(63),
+            "event": "systemStatus",
+            "status": "online",
+            "version": "1.9.1"
+        }))
+
+    def on_request(self, request, subscribed):
+        event = request.get('event')
+        subscription = request.get('subscription', {})
+        name = subscription.get('name', 'ticker')
+        channel = name
+        if name == 'book':
+            channel = f"book-{subscription.get('depth', 10)}"
+        replies = []
+        for pair in request.get('pair', []):
+            stream = (pair, channel)
+            if event == 'subscribe' and (name == 'ticker' or
+                                         (name == 'book' and subscription.get('depth', 10) in self.book_depths)):
+                if stream not in self.channels:
+                    self.channels[stream] = next(self.channel_ids)
+                if stream not in subscribed:
+                    subscribed.append(stream)
+                status = 'subscribed'
+            elif event == 'unsubscribe' and stream in subscribed:
+                subscribed.remove(stream)
+                status = 'unsubscribed'
+            else:
+                replies.append(json.dumps({
+                    "errorMessage": f"Subscription {name} not supported by mock",
+                    "event": "subscriptionStatus", "pair": pair, "status": "error"
+                }))
+                continue
+            replies.append(json.dumps({
+                "channelID": self.channels[stream],
+                "channelName": channel,
+                "event": "subscriptionStatus",
+                "pair": pair,
+                "status": status,
+                "subscription": subscription or {"name": "ticker"}
+            }))
+            if status == 'subscribed' and name == 'book':
+                replies.append(self.book_snapshot(pair, channel))
+        return replies
+
+    def ticker_frame(self, symbol: str) -> str:
+        bid, ask, last = self.walk.next(symbol)
+        return json.dumps([
+            self.channels[(symbol, 'ticker')],
+            {
+                "a": [_fmt(ask), 1, "1.00000000"],
+                "b": [_fmt(bid), 1, "1.00000000"],
+                "c": [_fmt(last), "0.01000000"],
+                "v": ["100.00000000", "200.00000000"],
+                "p": [_fmt(last), _fmt(last)],
+                "t": [100, 200],
+                "l": [_fmt(last * 0.99), _fmt(last * 0.99)],
+                "h": [_fmt(last * 1.01), _fmt(last * 1.01)],
+                "o": [_fmt(last), _fmt(last)]
+            },
+            "ticker",
+            symbol
+        ], separators=(',', ':'))
+
+    def book_snapshot(self, symbol: str, channel: str) -> str:
+        bids, asks = self.book.snapshot(symbol)
+        ts = f"{time.time():.6f}"
+        return json.dumps([
+            self.channels[(symbol, channel)],
+            {"as": [[p, s, ts] for p, s in asks], "bs": [[p, s, ts] for p, s in bids]},
+            channel,
+            symbol
+        ], separators=(',', ':'))
+
+    def book_frame(self, symbol: str, channel: str) -> str:
+        bid_changes, ask_changes = self.book.changes(symbol)
+        ts = f"{time.time():.6f}"
+        # Like Kraken, each side that changed gets its own object
+        parts = []
+        if ask_changes:
+            parts.append({"a": [[p, s, ts] for p, s in ask_changes]})
+        if bid_changes:
+            parts.append({"b": [[p, s, ts] for p, s in bid_changes]})
+        return json.dumps([self.channels[(symbol, channel)], *parts, channel, symbol],
+                          separators=(',', ':'))
+
+    def heartbeat_frame(self, active):
+        return '{"event":"heartbeat"}'
+
+class CoinbaseMock(MockFeed):
+    """Coinbase Exchange: subscriptions ack, typed ticker objects, optional heartbeats"""
+    name = 'Coinbase mock'
+
+    def __init__(self, settings: MockSettings, seed: int = None, prices: VenuePrices = None):
+        super().__init__(settings, seed, prices)
+        self.sequence = itertools.count(1)
+        self.heartbeats = False
+        self.book = MockBook(self.walk)
+
+    def on_request(self, request, subscribed):
+        if request.get('type') not in ('subscribe', 'unsubscribe'):
+            return [json.dumps({"type": "error", "message": "Failed to subscribe"})]
+        product_ids = list(request.get('product_ids', []))
+        channels = []
+        for channel in request.get('channels', []):
+            if isinstance(channel, dict):
+                channels.append(channel['name'])
+                product_ids.extend(channel.get('product_ids', []))
+            else:
+                channels.append(channel)
+        replies = []
+        for channel in channels:
+            if channel not in ('ticker', 'level2', 'level2_batch'):
+                continue
+            for product_id in product_ids:
+                stream = (product_id, channel)
+                if request['type'] == 'subscribe' and stream not in subscribed:
+                    subscribed.append(stream)
+                    if channel != 'ticker':
+                        replies.append(self.book_snapshot(product_id))
+                elif request['type'] == 'unsubscribe' and stream in subscribed:
+                    subscribed.remove(stream)
+        if 'heartbeat' in channels:
+            self.heartbeats = request['type'] == 'subscribe'
+        by_channel = {}
+        for product_id, channel in subscribed:
+            by_channel.setdefault(channel, []).append(product_id)
+        ack = json.dumps({
+            "type": "subscriptions",
+            "channels": [{"name": name, "product_ids": ids} for name, ids in by_channel.items()]
+        })
+        return [ack] + replies
+
+    def ticker_frame(self, symbol: str) -> str:
+        bid, ask, last = self.walk.next(symbol)
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        return json.dumps({
+            "type": "ticker",
+            "sequence": next(self.sequence),
+            "product_id": symbol,
+            "price": _fmt(last),
+            "open_24h": _fmt(last),
+            "volume_24h": "1000.00000000",
+            "low_24h": _fmt(last * 0.99),
+            "high_24h": _fmt(last * 1.01),
+            "volume_30d": "30000.00000000",
+            "best_bid": _fmt(bid),
+            "best_bid_size": "1.00000000",
+            "best_ask": _fmt(ask),
+            "best_ask_size": "1.00000000",
+            "side": "buy",
+            "time": now,
+            "trade_id": next(self.sequence),
+            "last_size": "0.01000000"
+        }, separators=(',', ':'))
+
+    def book_snapshot(self, symbol: str) -> str:
+        bids, asks = self.book.snapshot(symbol)
+        return json.dumps({"type": "snapshot", "product_id": symbol, "bids": bids, "asks": asks},
+                          separators=(',', ':'))
+
+    def book_frame(self, symbol: str, channel: str) -> str:
+        bid_changes, ask_changes = self.book.changes(symbol)
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        return json.dumps({
+            "type": "l2update",
+            "product_id": symbol,
+            "changes": [["buy", p, s] for p, s in bid_changes] + [["sell", p, s] for p, s in ask_changes],
+            "time": now
+        }, separators=(',', ':'))
+
+    def heartbeat_frame(self, active):
+        if not self.heartbeats or not active:
+            return None
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        return json.dumps({
+            "type": "heartbeat", "last_trade_id": 0, "product_id": active[0][0],
+            "sequence": next(self.sequence), "time": now
+        }, separators=(',', ':'))
+
+async def report(feeds, interval: float = 5.0):
+    last = {feed.name: 0 for feed in feeds}
+    while True:
+        await asyncio.sleep(interval)
+        for feed in feeds:
+            rate = (feed.sent - last[feed.name]) / interval
+            last[feed.name] = feed.sent
+            logger.info(f"[{feed.name}] {rate:.0f} msgs/sec, {feed.sent} sent, {feed.connections} connections")
+
+async def serve(args):
+    settings = MockSettings(
+        symbols=args.symbols,
+        rate=args.rate,
+        burst_every=args.burst_every,
+        burst_size=args.burst_size,
+        disconnect_every=args.disconnect_every,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms
+    )
+    walk = PriceWalk(args.seed)
+    symbols = venue_symbols(args.config)
+    basis, noise = args.basis_bps / 10000, args.noise_bps / 10000
+
+    def prices(venue, offset):
+        seed = None if args.seed is None else args.seed + offset
+        return VenuePrices(walk, symbols.get(venue), basis, noise, seed)
+
+    kraken = KrakenMock(settings, args.seed, prices('kraken', 1))
+    coinbase = CoinbaseMock(settings, args.seed, prices('coinbase', 2))
+    async with websockets.serve(kraken.handler, args.host, args.kraken_port, max_size=None), \
+               websockets.serve(coinbase.handler, args.host, args.coinbase_port, max_size=None):
+        logger.info(f"Kraken mock on ws://{args.host}:{args.kraken_port}")
+        logger.info(f"Coinbase mock on ws://{args.host}:{args.coinbase_port}")
+        await report([kraken, coinbase])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mock Kraken/Coinbase ticker feeds for load testing")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--kraken-port', type=int, default=8765)
+    parser.add_argument('--coinbase-port', type=int, default=8766)
+    parser.add_argument('--symbols', type=int, default=0,
+                        help="max active symbols per connection (0 = every subscribed symbol)")
+    parser.add_argument('--rate', type=float, default=100.0,
+                        help="ticker messages per second per connection")
+    parser.add_argument('--burst-every', type=float, default=0.0, help="seconds between bursts")
+    parser.add_argument('--burst-size', type=int, default=0, help="extra messages per burst")
+    parser.add_argument('--disconnect-every', type=float, default=0.0,
+                        help="close each connection after roughly this many seconds")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="fixed send delay")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="random extra send delay")
+    parser.add_argument('--seed', type=int, help="seed for reproducible prices")
+    parser.add_argument('--config', default='config.json',
+                        help="config whose pairs section maps each venue's symbols to one shared price")
+    parser.add_argument('--basis-bps', type=float, default=10.0,
+                        help="std dev of each venue's fixed price offset per pair, in basis points")
+    parser.add_argument('--noise-bps', type=float, default=2.0,
+                        help="std dev of per-quote price noise per venue, in basis points")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        logger.info("Mock exchange stopped")
@@ -0,0 +1,160 @@
+"""L2 order books kept as compact sorted arrays.
+
+Each side stores its levels in two parallel array('d') buffers ordered so
+the best level is last. Most updates land near the top of the book, so an
+insert or delete only shifts a few trailing elements, and walking the book
+for a fill starts at the end.
+"""
+from array import array
+from bisect import bisect_left
+from typing import List, NamedTuple, Sequence
+import math
+
+from decoders import BookUpdate
+
+class BookSide:
+    """Levels for one side; bid keys are prices, ask keys are negated prices"""
+    __slots__ = ('sign', 'keys', 'sizes')
+
+    def __init__(self, is_bid: bool):
+        self.sign = 1.0 if is_bid else -1.0
+        self.keys = array('d')
+        self.sizes = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        del self.keys[:]
+        del self.sizes[:]
+
+    def load(self, levels):
+        """Replace every level with a snapshot of (price, size) pairs"""
+        sign = self.sign
+        ordered = sorted((price * sign, size) for price, size in levels if size > 0)
+        self.keys = array('d', [key for key, _ in ordered])
+        self.sizes = array('d', [size for _, size in ordered])
+
+    def set(self, price: float, size: float):
+        """Apply one level update; a size of 0 removes the level"""
+        key = price * self.sign
+        keys = self.keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            if size > 0:
+                self.sizes[i] = size
+            else:
+                del keys[i]
+                del self.sizes[i]
+        elif size > 0:
+            keys.insert(i, key)
+            self.sizes.insert(i, size)
+
+    def truncate(self, depth: int):
+        """Keep only the best depth levels"""
+        extra = len(self.keys) - depth
+        if extra > 0:
+            del self.keys[:extra]
+            del self.sizes[:extra]
+
+    def best(self) -> float:
+        return self.keys[-1] * self.sign if self.keys else math.nan
+
+    def levels(self, n: int = None) -> List[tuple]:
+        """(price, size) pairs, best first"""
+        count = len(self.keys) if n is None else min(n, len(self.keys))
+        sign = self.sign
+        return [(self.keys[-1 - i] * sign, self.sizes[-1 - i]) for i in range(count)]
+
+    def fill_notional(self, notional: float) -> float:
+        """Quantity obtained by spending notional from the best level outward, NaN if too thin"""
+        keys, sizes, sign = self.keys, self.sizes, self.sign
+        qty = 0.0
+        remaining = notional
+        for i in range(len(keys) - 1, -1, -1):
+            price = keys[i] * sign
+            level_value = price * sizes[i]
+            if level_value >= remaining:
+                return qty + remaining / price
+            qty += sizes[i]
+            remaining -= level_value
+        return math.nan
+
+    def fill_quantity(self, qty: float) -> float:
+        """Value of qty taken from the best level outward, NaN if too thin"""
+        keys, sizes, sign = self.keys, self.sizes, self.sign
+        value = 0.0
+        remaining = qty
+        for i in range(len(keys) - 1, -1, -1):
+            price = keys[i] * sign
+            if sizes[i] >= remaining:
+                return value + remaining * price
+            value += sizes[i] * price
+            remaining -= sizes[i]
+        return math.nan
+
+class OrderBook:
+    """Bids and asks for one pair on one venue; depth > 0 caps the levels kept"""
+    __slots__ = ('bids', 'asks', 'depth', 'updates')
+
+    def __init__(self, depth: int = 0):
+        self.bids = BookSide(True)
+        self.asks = BookSide(False)
+        self.depth = depth
+        self.updates = 0
+
+    def apply(self, update: BookUpdate):
+        if update.snapshot:
+            self.bids.load(update.bids)
+            self.asks.load(update.asks)
+        else:
+            bids, asks = self.bids, self.asks
+            for price, size in update.bids:
+                bids.set(price, size)
+            for price, size in update.asks:
+                asks.set(price, size)
+        if self.depth:
+            # Venues with a subscribed depth do not send deletes for levels
+            # that fall out of range, so drop them here
+            self.bids.truncate(self.depth)
+            self.asks.truncate(self.depth)
+        self.updates += 1
+
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+
+    def best_bid(self) -> float:
+        return self.bids.best()
+
+    def best_ask(self) -> float:
+        return self.asks.best()
+
+class BookBoard:
+    """Per-pair books for every venue: books[venue][pair id], venues in VENUES order"""
+
+    def __init__(self, n_pairs: int, depths: Sequence[int]):
+        """depths: levels kept per venue (0 = unlimited), e.g. from ExchangeAdapter.book_levels"""
+        self.books = [[OrderBook(depth) for _ in range(n_pairs)] for depth in depths]
+
+    def reset(self, venue: int):
+        """Drop a venue's books, e.g. after a reconnect and before the new snapshots"""
+        for book in self.books[venue]:
+            book.clear()
+
+class Execution(NamedTuple):
+    net: float          # net spread per unit after fees, NaN if either book is too thin
+    qty: float
+    buy_vwap: float
+    sell_vwap: float
+
+def executable_spread(buy_book: OrderBook, sell_book: OrderBook, notional: float,
+                      fee_buy: float, fee_sell: float) -> Execution:
+    """Buy notional (quote currency) on buy_book's asks and sell the fill into sell_book's bids"""
+    qty = buy_book.asks.fill_notional(notional)
+    if not qty > 0:
+        return Execution(math.nan, math.nan, math.nan, math.nan)
+    proceeds = sell_book.bids.fill_quantity(qty)
+    buy_vwap = notional / qty
+    sell_vwap = proceeds / qty
+    return Execution(sell_vwap * (1 - fee_sell) - buy_vwap * (1 + fee_buy), qty, buy_vwap, sell_vwap)
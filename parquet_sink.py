@@ -0,0 +1,164 @@
+"""Buffered Parquet time series for spread and quote updates.
+
+Rows are appended to one flat array('d') on the event loop (a single
+extend per row, no per-row objects), and a full or aged batch is swapped
+out and handed to a single writer thread, which reshapes it into columns,
+builds an Arrow table and writes it as a Hive partitioned dataset:
+
+    <root>/<name>/date=2026-01-31/group=usd/<name>-<ms>-<seq>-0.parquet
+
+Pair and category columns are stored dictionary-encoded; groups are the
+PairsConfig quote groups carried by InstrumentRegistry.
+"""
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+logger = logging.getLogger(__name__)
+
+# Value columns after ts and pair; category columns hold indexes into their labels
+SPREAD_COLUMNS = ('kraken', 'coinbase', 'variation')
+QUOTE_COLUMNS = ('exchange', 'bid', 'ask')
+
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.date32()), ('group', pa.string())]), flavor='hive')
+
+class ParquetSink:
+    """Columnar batches for one dataset, flushed by size (flush_rows) or age (flush_seconds).
+
+    Once max_rows are buffered (the writer cannot keep up) new rows are
+    counted in dropped instead of growing memory without bound.
+    """
+
+    def __init__(self, root: str, name: str, registry, columns: Sequence[str],
+                 categories: Dict[str, List[str]] = None, flush_rows: int = 100000,
+                 flush_seconds: float = 60.0, max_rows: int = None):
+        self.path = os.path.join(root, name)
+        self.name = name
+        self.columns = tuple(columns)
+        self.width = len(self.columns) + 2
+        self.categories = categories or {}
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_rows = max_rows or flush_rows * 10
+
+        self.pair_labels = pa.array(registry.standard_pairs, pa.string())
+        group_names = sorted({instrument.group for instrument in registry})
+        self.group_labels = pa.array(group_names, pa.string())
+        group_index = {group: i for i, group in enumerate(group_names)}
+        self.pair_group = np.array([group_index[instrument.group] for instrument in registry], dtype=np.int32)
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.errors = 0
+        self._rows = array('d')
+        self._full = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"parquet-{name}")
+        self._writing = None
+
+    def __len__(self):
+        return len(self._rows) // self.width
+
+    def add_pairs(self, registry):
+        """Follow a registry that grew (config reload). Codes are only ever appended,
+        and labels are swapped in before the codes that use them, so a batch on
+        the writer thread resolves with either the old or the new arrays."""
+        group_names = self.group_labels.to_pylist()
+        for instrument in registry:
+            if instrument.group not in group_names:
+                group_names.append(instrument.group)
+        group_index = {group: i for i, group in enumerate(group_names)}
+        self.pair_labels = pa.array(registry.standard_pairs, pa.string())
+        self.group_labels = pa.array(group_names, pa.string())
+        self.pair_group = np.array([group_index[instrument.group] for instrument in registry], dtype=np.int32)
+
+    def record(self, row: tuple):
+        """Append (ts, pair_id, *values); ts is wall-clock seconds, values follow the column order"""
+        rows = self._rows
+        rows.extend(row)
+        n = len(rows) // self.width
+        if n >= self.flush_rows:
+            if n > self.max_rows:
+                del rows[-self.width:]
+                self.dropped += 1
+            elif n == self.flush_rows:
+                self._full.set()
+
+    async def run(self):
+        """Flush whenever a batch fills up or flush_seconds pass, until cancelled"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Hand the buffered rows to the writer thread and wait for them to land"""
+        if not self._rows:
+            return
+        batch = self._rows
+        self._rows = array('d')
+        loop = asyncio.get_running_loop()
+        self._writing = loop.run_in_executor(self._executor, self._write, batch)
+        try:
+            await self._writing
+        finally:
+            self._writing = None
+
+    async def close(self):
+        """Write what is buffered and stop the writer thread"""
+        if self._writing is not None:
+            await asyncio.shield(self._writing)
+        await self.flush()
+        self._executor.shutdown(wait=True)
+        logger.info(
+            f"[Parquet] {self.name}: {self.rows_written} rows in {self.flushes} flushes"
+            f"{f', {self.dropped} dropped' if self.dropped else ''} under {self.path}"
+        )
+
+    def to_table(self, batch: array) -> pa.Table:
+        rows = np.frombuffer(batch, dtype=np.float64).reshape(-1, self.width)
+        ts = rows[:, 0]
+        pair_ids = rows[:, 1].astype(np.int32)
+        columns = {
+            'ts': pa.array((ts * 1e6).astype(np.int64), pa.timestamp('us', tz='UTC')),
+            'pair': pa.DictionaryArray.from_arrays(pa.array(pair_ids), self.pair_labels),
+        }
+        for i, name in enumerate(self.columns, 2):
+            if name in self.categories:
+                codes = pa.array(rows[:, i].astype(np.int8))
+                columns[name] = pa.DictionaryArray.from_arrays(codes, pa.array(self.categories[name]))
+            else:
+                columns[name] = pa.array(np.ascontiguousarray(rows[:, i]))
+        columns['date'] = pa.array((ts // 86400).astype(np.int32), pa.date32())
+        columns['group'] = self.group_labels.take(pa.array(self.pair_group[pair_ids]))
+        return pa.table(columns)
+
+    def _write(self, batch):
+        """Runs on the writer thread"""
+        started = time.perf_counter()
+        try:
+            table = self.to_table(batch)
+            # use_threads=False: this is already a dedicated thread, and Arrow's own
+            # pool, once driven from here, aborts the interpreter at exit
+            ds.write_dataset(
+                table, self.path, format='parquet', partitioning=PARTITIONING,
+                basename_template=f"{self.name}-{int(time.time() * 1000)}-{self.flushes}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore', use_threads=False
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[Parquet] Failed to write {len(batch) // self.width} {self.name} rows: {str(e)}")
+            return
+        self.rows_written += table.num_rows
+        self.flushes += 1
+        logger.debug(f"[Parquet] {self.name}: wrote {table.num_rows} rows in {time.perf_counter() - started:.3f}s")
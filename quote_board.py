@@ -0,0 +1,364 @@
+"""Shared-memory quote board: one feed publisher, any number of local readers.
+
+The publisher owns the exchange connections (in this process, or split
+across --workers feed shards) and writes the latest bid/ask/last of every
+pair and exchange into a multiprocessing.shared_memory segment. The monitor
+and the dry-run bot attach with --board instead of opening their own
+sockets, so both run off one set of subscriptions.
+
+    python quote_board.py --workers 2
+    python exchange_monitor.py --board
+    python arbitrage-dryrun.py --board
+
+Layout (little endian):
+    header  HEADER_SIZE bytes: MAGIC, version, exchanges, pairs, crc32 of the
+            pair list, publisher pid, heartbeat (monotonic ns), total writes,
+            then FEED counters per exchange
+    slots   SLOT_SIZE bytes per (pair, exchange), slot = pair_id * exchanges + exchange:
+            uint64 seq, bid, ask, last, exchange ts, receive wall time,
+            receive perf_counter_ns, decoded perf_counter_ns
+
+Every slot is a seqlock: the publisher makes seq odd, writes the fields and
+makes seq even again. A reader that sees an odd seq, or a different seq
+after copying the fields, retries, so it never applies a torn quote. This
+relies on stores becoming visible in program order (x86-64); there is a
+single writer per board.
+
+Readers find changed slots by comparing the seq column with the seqs they
+last applied. The board holds latest values only: a reader that falls
+behind gets each pair's newest quote, not every update in between.
+"""
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, Optional
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import struct
+import time
+import zlib
+import numpy as np
+
+from config import Config
+from instruments import InstrumentRegistry
+from metrics import FeedStats
+from shards import EXCHANGES, STATS_INTERVAL, ShardWorker, ShardedFeeds, nan_if_none
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME = 'trader-quotes'
+
+MAGIC = b'QBRD'
+VERSION = 1
+
+# magic, version, exchanges, pairs, pair list crc32, publisher pid, heartbeat ns, writes
+HEADER = struct.Struct('<4sHHIIQqQ')
+HEARTBEAT_OFFSET = 24
+WRITES_OFFSET = 32
+# messages, decode errors, reconnects, connected, last message (monotonic ns, 0 = never)
+FEED = struct.Struct('<QQQqq')
+FEEDS_OFFSET = 40
+# Rounded up to a cache line; 128 bytes for two venues
+HEADER_SIZE = -(-(FEEDS_OFFSET + FEED.size * len(EXCHANGES)) // 64) * 64
+N_EXCHANGES = len(EXCHANGES)
+
+SEQ = struct.Struct('<Q')
+FIELDS = struct.Struct('<dddddqq')
+SLOT_SIZE = 64
+
+READ_RETRIES = 8
+POLL_INTERVAL = 0.001
+# A publisher that has not touched its heartbeat for this long is treated as gone
+STALE_AFTER = 5.0
+
+def pairs_crc(registry: InstrumentRegistry) -> int:
+    return zlib.crc32("\n".join(registry.standard_pairs).encode('utf-8'))
+
+def _open(name: str) -> SharedMemory:
+    """Attach to an existing segment without taking ownership of it"""
+    shm = SharedMemory(name)
+    # Before Python 3.13 attaching also registers the segment with this process's
+    # resource tracker, which would unlink someone else's board when we exit
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class QuoteBoard:
+    """Publisher side: creates the segment and writes slots"""
+
+    def __init__(self, name: str, registry: InstrumentRegistry):
+        self.name = name
+        self.n_pairs = len(registry)
+        self.n_slots = self.n_pairs * len(EXCHANGES)
+        size = HEADER_SIZE + self.n_slots * SLOT_SIZE
+        try:
+            self.shm = SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = _open(name)
+            pid = HEADER.unpack_from(stale.buf, 0)[5] if stale.size >= HEADER_SIZE else 0
+            stale.close()
+            if pid and pid != os.getpid() and _pid_alive(pid):
+                raise RuntimeError(f"Quote board {name} is already published by pid {pid}")
+            # Left behind by a publisher that did not exit cleanly
+            stale.unlink()
+            self.shm = SharedMemory(name, create=True, size=size)
+        self.buf = self.shm.buf
+        self.writes = 0
+        self._seq = [0] * self.n_slots
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, len(EXCHANGES), self.n_pairs,
+                         pairs_crc(registry), os.getpid(), time.monotonic_ns(), 0)
+
+    def publish(self, exchange: int, pair_id: int, bid: float, ask: float, last: float,
+                exchange_ts: float, received, decoded_ns: int):
+        """Same signature as a ShardedFeeds on_quote callback"""
+        slot = pair_id * N_EXCHANGES + exchange
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+        seq = self._seq[slot] + 1
+        buf = self.buf
+        SEQ.pack_into(buf, offset, seq)
+        FIELDS.pack_into(buf, offset + 8, bid, ask, last, exchange_ts, received[0], received[1], decoded_ns)
+        SEQ.pack_into(buf, offset, seq + 1)
+        self._seq[slot] = seq + 1
+        self.writes += 1
+        SEQ.pack_into(buf, WRITES_OFFSET, self.writes)
+
+    def heartbeat(self, stats: Dict[str, dict]):
+        """Refresh the heartbeat and feed counters (ShardWorker.stats layout, by exchange name)"""
+        for i, exchange in enumerate(EXCHANGES):
+            s = stats[exchange]
+            last = s['last_message']
+            FEED.pack_into(self.buf, FEEDS_OFFSET + i * FEED.size, s['messages'], s['decode_errors'],
+                           s['reconnects'], int(s['connected']), int(last * 1e9) if last else 0)
+        struct.pack_into('<q', self.buf, HEARTBEAT_OFFSET, time.monotonic_ns())
+
+    def close(self):
+        """Mark the board as abandoned and remove the segment"""
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, len(EXCHANGES), self.n_pairs, 0, 0, 0, self.writes)
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+        logger.info(f"[Board] {self.name}: {self.writes} quotes published")
+
+class BoardWorker(ShardWorker):
+    """Single-process publisher: a ShardWorker over every pair that writes to the board instead of a pipe"""
+
+    def __init__(self, config: Config, board: QuoteBoard, urls: Optional[Dict[str, str]] = None):
+        super().__init__(0, config, range(board.n_pairs), None, urls)
+        self.board = board
+
+    def emit(self, exchange: int, pair_id: int, tick, received, decoded_ns: int):
+        self.board.publish(exchange, pair_id, nan_if_none(tick.bid), nan_if_none(tick.ask),
+                           nan_if_none(tick.last), nan_if_none(tick.timestamp), received, decoded_ns)
+
+    async def report_stats(self):
+        while True:
+            self.board.heartbeat(self.stats)
+            await asyncio.sleep(STATS_INTERVAL)
+
+class BoardReader:
+    """Reader side: attaches to a published board and calls on_quote for every slot that changed.
+
+    on_quote has the ShardedFeeds signature, so the callbacks written for
+    --workers apply board quotes unchanged. Publisher counters are copied
+    into feeds (FeedStats by exchange name) when given. If the publisher
+    goes away the reader keeps polling and re-attaches to its replacement.
+    """
+
+    def __init__(self, name: str, registry: InstrumentRegistry, on_quote: Callable,
+                 feeds: Optional[Dict] = None, interval: float = POLL_INTERVAL):
+        self.name = name
+        self.on_quote = on_quote
+        self.feeds = feeds
+        self.interval = interval
+        self.n_pairs = len(registry)
+        self.n_slots = self.n_pairs * len(EXCHANGES)
+        self.crc = pairs_crc(registry)
+        self.quotes = 0
+        self.retries = 0
+        self.shm = None
+        self.pid = None
+        self._seqs = None
+        self._applied = np.zeros(self.n_slots, dtype=np.uint64)
+        self._writes = -1
+        self.attach()
+
+    def attach(self):
+        """Map the segment; raises FileNotFoundError if nothing is published under name"""
+        shm = _open(self.name)
+        magic, version, n_exchanges, n_pairs, crc, pid, _, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION or n_exchanges != len(EXCHANGES):
+            shm.close()
+            raise ValueError(f"{self.name} is not a quote board")
+        if n_pairs != self.n_pairs or crc != self.crc:
+            shm.close()
+            raise ValueError(f"Quote board {self.name} was published for a different pair list")
+        self.detach()
+        self.shm = shm
+        self.pid = pid
+        self._seqs = np.ndarray((self.n_slots,), dtype='<u8', buffer=shm.buf,
+                                offset=HEADER_SIZE, strides=(SLOT_SIZE,))
+        self._applied[:] = 0
+        self._writes = -1
+        logger.info(f"[Board] Attached to {self.name} (publisher pid {pid}, {n_pairs} pairs)")
+
+    def detach(self):
+        if self.shm is not None:
+            self._seqs = None
+            self.shm.close()
+            self.shm = None
+
+    def read(self, slot: int):
+        """(seq, fields) of one slot, or None while the publisher keeps rewriting it"""
+        buf = self.shm.buf
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+        for _ in range(READ_RETRIES):
+            seq = SEQ.unpack_from(buf, offset)[0]
+            if not seq & 1:
+                fields = FIELDS.unpack_from(buf, offset + 8)
+                if SEQ.unpack_from(buf, offset)[0] == seq:
+                    return seq, fields
+            self.retries += 1
+        return None
+
+    def poll(self) -> list:
+        """Every slot changed since the last poll as (exchange, pair_id, bid, ask, last, exchange_ts, received, decoded_ns)"""
+        writes = SEQ.unpack_from(self.shm.buf, WRITES_OFFSET)[0]
+        if writes == self._writes:
+            return []
+        self._writes = writes
+        changed = np.flatnonzero(self._seqs != self._applied)
+        records = []
+        applied = self._applied
+        for slot in changed.tolist():
+            snapshot = self.read(slot)
+            if snapshot is None:
+                # Still mid-write; look at it again on the next poll
+                self._writes = -1
+                continue
+            seq, (bid, ask, last, exchange_ts, recv_wall, recv_ns, decoded_ns) = snapshot
+            applied[slot] = seq
+            pair_id, exchange = divmod(slot, N_EXCHANGES)
+            records.append((exchange, pair_id, bid, ask, last, exchange_ts, (recv_wall, recv_ns), decoded_ns))
+        return records
+
+    def publisher_alive(self) -> bool:
+        pid = HEADER.unpack_from(self.shm.buf, 0)[5]
+        heartbeat = struct.unpack_from('<q', self.shm.buf, HEARTBEAT_OFFSET)[0]
+        return pid != 0 and time.monotonic_ns() - heartbeat < STALE_AFTER * 1e9
+
+    def _update_feeds(self, alive: bool):
+        if not self.feeds:
+            return
+        for i, exchange in enumerate(EXCHANGES):
+            feed = self.feeds.get(exchange)
+            if feed is None:
+                continue
+            messages, decode_errors, reconnects, connected, last = FEED.unpack_from(
+                self.shm.buf, FEEDS_OFFSET + i * FEED.size
+            )
+            feed.messages = messages
+            feed.decode_errors = decode_errors
+            feed.reconnects = reconnects
+            feed.connected = alive and bool(connected)
+            feed.last_message = last / 1e9 if last else None
+
+    def _reattach(self):
+        try:
+            self.attach()
+        except (FileNotFoundError, ValueError):
+            pass
+
+    async def run(self):
+        """Poll the board and dispatch changed quotes until cancelled"""
+        on_quote = self.on_quote
+        is_async = asyncio.iscoroutinefunction(on_quote)
+        next_check = 0.0
+        alive = True
+        try:
+            while True:
+                records = self.poll()
+                for record in records:
+                    result = on_quote(*record)
+                    if is_async:
+                        await result
+                self.quotes += len(records)
+                now = time.monotonic()
+                if now >= next_check:
+                    next_check = now + STATS_INTERVAL
+                    was_alive, alive = alive, self.publisher_alive()
+                    if not alive:
+                        if was_alive:
+                            logger.error(f"[Board] Publisher of {self.name} went away; waiting for a new one")
+                        self._reattach()
+                        alive = self.publisher_alive()
+                    self._update_feeds(alive)
+                await asyncio.sleep(self.interval)
+        finally:
+            self.detach()
+
+async def publish(args):
+    config = Config.load()
+    if args.kraken_url:
+        config.feeds.kraken_ws_url = args.kraken_url
+    if args.coinbase_url:
+        config.feeds.coinbase_ws_url = args.coinbase_url
+    registry = InstrumentRegistry.from_config(config)
+    try:
+        board = QuoteBoard(args.name, registry)
+    except RuntimeError as e:
+        logger.error(f"[Board] {str(e)}")
+        return
+    # docker stop / kill: unwind through the finally below so the segment is removed
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    logger.info(f"[Board] Publishing {len(registry)} pairs as {args.name}")
+    try:
+        if args.workers:
+            feeds = {exchange: FeedStats(exchange) for exchange in EXCHANGES}
+            shards = ShardedFeeds(config, range(len(registry)), args.workers, board.publish, feeds=feeds)
+
+            async def heartbeat():
+                while True:
+                    board.heartbeat({
+                        name: {'messages': feed.messages, 'decode_errors': feed.decode_errors,
+                               'reconnects': feed.reconnects, 'connected': feed.connected,
+                               'last_message': feed.last_message}
+                        for name, feed in feeds.items()
+                    })
+                    await asyncio.sleep(STATS_INTERVAL)
+
+            await asyncio.gather(shards.run(), heartbeat())
+        else:
+            await BoardWorker(config, board).run()
+    finally:
+        board.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Publish Kraken/Coinbase quotes to a shared-memory quote board")
+    parser.add_argument('--name', default=DEFAULT_NAME, help="shared memory segment name")
+    parser.add_argument('--workers', type=int, default=0, metavar='N',
+                        help="split the pairs across N feed worker processes")
+    parser.add_argument('--kraken-url', help="override feeds.kraken_ws_url (e.g. a local mock)")
+    parser.add_argument('--coinbase-url', help="override feeds.coinbase_ws_url (e.g. a local mock)")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    # force: importing config.py has already pointed the root logger at exchange_monitor.log
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        force=True
+    )
+    try:
+        asyncio.run(publish(parse_args()))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Quote board publisher stopped")
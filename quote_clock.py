@@ -0,0 +1,121 @@
+"""Per-leg quote timestamps, quote age and exchange clock offset.
+
+Every quote is stamped with its local receive time and, when the feed
+carries one, the exchange's own timestamp. The exchange timestamps cannot
+be compared with the local clock directly: the two clocks disagree by an
+unknown skew. ClockSkew estimates it per exchange as the smallest
+(receive time - exchange time) seen recently. That is the skew plus the
+fastest transit, so each delivery's excess over it is time the quote spent
+queued somewhere on the way.
+
+A quote's as-of time is its receive time minus that excess delay, kept on
+the monotonic clock. Age is then one subtraction, and the max-age gate is
+a vectorized compare over the pairs being evaluated. A leg without an
+exchange timestamp is as old as its receive time. Legs on venues that do
+not list the pair are +inf as of, so they never make a pair look old.
+"""
+from typing import Sequence
+import math
+import time
+import numpy as np
+
+class ClockSkew:
+    """Local clock minus one exchange's clock, from the fastest recent deliveries"""
+    __slots__ = ('window', 'offset', 'samples', '_current', '_previous', '_count')
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.offset = math.nan
+        self.samples = 0
+        # Minimum over the current and the previous window, so the estimate follows clock steps
+        self._current = math.inf
+        self._previous = math.inf
+        self._count = 0
+
+    def observe(self, exchange_ts: float, received_wall: float) -> float:
+        """Record one delivery and return its delay beyond the fastest recent one (>= 0)"""
+        delay = received_wall - exchange_ts
+        if delay < self._current:
+            self._current = delay
+        self._count += 1
+        self.samples += 1
+        if self._count >= self.window:
+            self._previous = self._current
+            self._current = math.inf
+            self._count = 0
+        offset = self._current if self._current < self._previous else self._previous
+        self.offset = offset
+        return delay - offset if delay > offset else 0.0
+
+class QuoteClock:
+    """Receive, exchange and as-of times for every pair and exchange leg.
+
+    received and as_of hold time.monotonic() values; exchange holds the
+    feed's epoch timestamps. All are NaN until the leg is first quoted.
+    listed is an optional (pairs, exchanges) mask of the legs that exist.
+    """
+
+    def __init__(self, n_pairs: int, exchanges: Sequence[str], skew_window: int = 1000,
+                 listed: np.ndarray = None):
+        self.exchanges = tuple(exchanges)
+        shape = (n_pairs, len(self.exchanges))
+        self.received = np.full(shape, np.nan)
+        self.exchange = np.full(shape, np.nan)
+        self.as_of = np.full(shape, np.nan)
+        if listed is not None:
+            self.as_of[~listed] = np.inf
+        self.skews = [ClockSkew(skew_window) for _ in self.exchanges]
+
+    def resize(self, n_pairs: int, listed: np.ndarray = None):
+        """Grow to n_pairs rows (pairs added on a config reload); new legs start unquoted"""
+        extra = n_pairs - len(self.as_of)
+        if extra <= 0:
+            return
+        pad = np.full((extra, len(self.exchanges)), np.nan)
+        self.received = np.concatenate([self.received, pad])
+        self.exchange = np.concatenate([self.exchange, pad])
+        self.as_of = np.concatenate([self.as_of, pad])
+        if listed is not None:
+            self.as_of[-extra:][~listed[-extra:]] = np.inf
+
+    def clear(self, pair_ids, leg: int, listed=True):
+        """Forget legs whose symbol changed; listed (per pair) says whether they still exist"""
+        self.received[pair_ids, leg] = np.nan
+        self.exchange[pair_ids, leg] = np.nan
+        self.as_of[pair_ids, leg] = np.where(listed, np.nan, np.inf)
+
+    def stamp(self, pair_id: int, leg: int, exchange_ts: float = None, received_wall: float = None):
+        """Stamp a quote that was just applied to the store"""
+        now = time.monotonic()
+        self.received[pair_id, leg] = now
+        if exchange_ts is not None and received_wall is not None:
+            self.exchange[pair_id, leg] = exchange_ts
+            now -= self.skews[leg].observe(exchange_ts, received_wall)
+        self.as_of[pair_id, leg] = now
+
+    def oldest(self, pair_id: int) -> float:
+        """as_of of the older leg of one pair (NaN until both legs are quoted)"""
+        return self.as_of[pair_id].min()
+
+    def ages(self, idx=None, now: float = None) -> np.ndarray:
+        """Age of the older leg per pair, NaN where a leg is missing"""
+        now = time.monotonic() if now is None else now
+        as_of = self.as_of if idx is None else self.as_of[idx]
+        return now - as_of.min(axis=1)
+
+    def fresh(self, idx, max_age: float, now: float = None) -> np.ndarray:
+        """True where both legs are quoted and no older than max_age seconds"""
+        return self.ages(idx, now) <= max_age
+
+    def fresh_legs(self, idx, max_age: float, now: float = None) -> np.ndarray:
+        """(len(idx), exchanges): True where that leg is quoted and no older than max_age"""
+        now = time.monotonic() if now is None else now
+        return now - self.as_of[idx] <= max_age
+
+    def offsets(self) -> dict:
+        """Estimated local minus exchange clock per exchange (seconds; includes the fastest transit)"""
+        return {
+            exchange: skew.offset
+            for exchange, skew in zip(self.exchanges, self.skews)
+            if skew.samples
+        }
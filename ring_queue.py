@@ -0,0 +1,145 @@
+"""Bounded ring-buffer queue between a websocket receiver and its consumer.
+
+The receiver only timestamps a frame and puts it here; a separate consumer
+task drains it in batches and does the decoding and table updates. A slow
+consumer then costs queued or dropped frames, instead of an unread socket
+that the exchange eventually disconnects.
+
+Overflow policies:
+    drop-oldest  a put into a full queue evicts the oldest waiting item
+    conflate     a put whose key is already waiting replaces that item in
+                 place (it keeps its position, so a busy pair cannot starve
+                 the others); unkeyed puts and new keys behave as drop-oldest
+    block        put() waits for room, pushing back on the socket as before
+
+Slots are preallocated and reused; head and tail are running counts, so
+the slot of an item is its index modulo the capacity.
+"""
+from typing import Hashable, List, Optional
+import asyncio
+
+POLICIES = ('drop-oldest', 'conflate', 'block')
+
+class RingQueue:
+    """Single-producer, single-consumer FIFO for one event loop"""
+
+    def __init__(self, name: str, capacity: int = 4096, policy: str = 'drop-oldest'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        if capacity < 1:
+            raise ValueError("Queue capacity must be at least 1")
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        self.conflating = policy == 'conflate'
+        self.blocking = policy == 'block'
+        self._items = [None] * capacity
+        self._keys = [None] * capacity
+        self._head = 0
+        self._tail = 0
+        # key -> running index of its waiting item (conflate only)
+        self._pending = {}
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._tail - self._head
+
+    def put_nowait(self, item, key: Optional[Hashable] = None) -> bool:
+        """Queue item; False only under the block policy when the queue is full"""
+        if key is not None and self.conflating:
+            index = self._pending.get(key)
+            if index is not None:
+                self._items[index % self.capacity] = item
+                self.conflated += 1
+                return True
+        size = self._tail - self._head
+        if size >= self.capacity:
+            if self.blocking:
+                return False
+            self._evict()
+            size -= 1
+        slot = self._tail % self.capacity
+        self._items[slot] = item
+        self._keys[slot] = key
+        if key is not None and self.conflating:
+            self._pending[key] = self._tail
+        self._tail += 1
+        self.enqueued += 1
+        if size + 1 > self.high_water:
+            self.high_water = size + 1
+        self._ready.set()
+        return True
+
+    async def put(self, item, key: Optional[Hashable] = None):
+        """put_nowait, waiting for the consumer to make room under the block policy"""
+        if self.put_nowait(item, key):
+            return
+        self.blocked += 1
+        while True:
+            self._room.clear()
+            await self._room.wait()
+            if self.put_nowait(item, key):
+                return
+
+    def _pop(self):
+        slot = self._head % self.capacity
+        item = self._items[slot]
+        key = self._keys[slot]
+        if key is not None and self._pending.get(key) == self._head:
+            del self._pending[key]
+        self._items[slot] = None
+        self._keys[slot] = None
+        self._head += 1
+        return item
+
+    def _evict(self):
+        self._pop()
+        self.dropped += 1
+
+    def get_nowait(self, limit: int = None) -> List:
+        """Up to limit waiting items, oldest first (all of them if limit is None)"""
+        size = self._tail - self._head
+        if limit is not None and limit < size:
+            size = limit
+        items = [self._pop() for _ in range(size)]
+        self.dequeued += size
+        if self._tail == self._head:
+            self._ready.clear()
+        if size:
+            self._room.set()
+        return items
+
+    async def get(self, limit: int = None) -> List:
+        """Wait until something is queued, then take up to limit items"""
+        while self._tail == self._head:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.get_nowait(limit)
+
+    def clear(self):
+        """Drop everything waiting (e.g. frames from a connection that has gone away)"""
+        self.dropped += self._tail - self._head
+        while self._tail != self._head:
+            self._pop()
+        self._ready.clear()
+        self._room.set()
+
+    def stats(self) -> dict:
+        return {
+            'policy': self.policy,
+            'capacity': self.capacity,
+            'depth': len(self),
+            'high_water': self.high_water,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'blocked': self.blocked,
+        }
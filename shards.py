@@ -0,0 +1,305 @@
+"""Sharded feed ingestion: the pair universe split across worker processes.
+
+Each worker owns the ticker subscriptions on every venue for its share of
+the pairs, does the JSON decoding, and forwards normalized quotes to the
+coordinator over a pipe as fixed-size records. The coordinator (monitor UI
+or arbitrage checks) only unpacks records and applies them, so decode work
+scales with the number of workers.
+
+Records written by one pass over the worker's ready sockets go out as one
+pipe message; a pass is flushed as soon as the loop goes idle, so batching
+adds no waiting time.
+
+Both processes read time.perf_counter_ns() from the same monotonic clock,
+so receive and decode stamps taken in a worker stay comparable with the
+coordinator's own.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import signal
+import struct
+import time
+
+from config import Config
+from decoders import TICKER, CONTROL
+from exchanges import VENUES, ExchangeAdapter, build_adapters
+from feed_session import Backoff
+from instruments import InstrumentRegistry
+
+logger = logging.getLogger(__name__)
+
+# The exchange code of a record is its index here
+EXCHANGES = VENUES
+
+# exchange, pair id, bid, ask, last, exchange ts (NaN if none), receive wall time,
+# receive perf_counter_ns, decoded perf_counter_ns
+QUOTE = struct.Struct('<BHdddddqq')
+
+# First byte of every pipe message
+QUOTES_MSG = b'Q'
+STATS_MSG = b'S'
+
+MAX_BATCH = 512
+STATS_INTERVAL = 1.0
+HEALTH_INTERVAL = 1.0
+
+def shard_pairs(pair_ids: Sequence[int], n_shards: int) -> List[List[int]]:
+    """Round-robin split of pair ids; never returns an empty shard"""
+    pair_ids = list(pair_ids)
+    n_shards = max(1, min(n_shards, len(pair_ids)))
+    return [pair_ids[i::n_shards] for i in range(n_shards)]
+
+def nan_if_none(x) -> float:
+    return math.nan if x is None else x
+
+class ShardWorker:
+    """Runs inside a worker process: subscribe, decode, forward"""
+
+    def __init__(self, index: int, config: Config, pair_ids: List[int], conn,
+                 urls: Optional[Dict[str, str]] = None, venues: Optional[Sequence[str]] = None):
+        self.index = index
+        self.registry = InstrumentRegistry.from_config(config)
+        self.instruments = [self.registry[pair_id] for pair_id in pair_ids]
+        self.conn = conn
+        self.adapters = build_adapters(self.registry, config.feeds, urls, venues)
+        self.feed_config = config.feeds
+        self.stats = {
+            exchange: {'messages': 0, 'quotes': 0, 'decode_errors': 0, 'reconnects': 0,
+                       'connected': False, 'last_message': None}
+            for exchange in EXCHANGES
+        }
+        self._batch = bytearray(QUOTES_MSG)
+        self._count = 0
+        self._flush_scheduled = False
+        self._loop = None
+
+    def emit(self, exchange: int, pair_id: int, tick, received, decoded_ns: int):
+        self._batch += QUOTE.pack(
+            exchange, pair_id, nan_if_none(tick.bid), nan_if_none(tick.ask), nan_if_none(tick.last),
+            nan_if_none(tick.timestamp), received[0], received[1], decoded_ns
+        )
+        self._count += 1
+        if self._count >= MAX_BATCH:
+            self.flush()
+        elif not self._flush_scheduled:
+            # Runs once the loop has worked through every frame that is ready now
+            self._flush_scheduled = True
+            self._loop.call_soon(self.flush)
+
+    def flush(self):
+        self._flush_scheduled = False
+        if self._count:
+            self.conn.send_bytes(self._batch)
+            self._batch = bytearray(QUOTES_MSG)
+            self._count = 0
+
+    def _received(self, exchange: str):
+        received = (time.time(), time.perf_counter_ns())
+        stats = self.stats[exchange]
+        stats['messages'] += 1
+        stats['last_message'] = time.monotonic()
+        return received
+
+    def _backoff(self) -> Backoff:
+        return Backoff(self.feed_config.reconnect_min, self.feed_config.reconnect_max)
+
+    def _connected(self, exchange: str, connected: bool):
+        stats = self.stats[exchange]
+        if stats['connected'] and not connected:
+            stats['reconnects'] += 1
+        stats['connected'] = connected
+
+    async def feed(self, adapter: ExchangeAdapter):
+        decoder = adapter.decoder
+        name = adapter.name
+        stats = self.stats[name]
+        symbols = adapter.symbols(self.instruments)
+        subscribe = adapter.subscribe_messages(symbols)
+        backoff = self._backoff()
+        while True:
+            # Frames include acks and heartbeats; only forwarded quotes count as delivering
+            seen = stats['quotes']
+            try:
+                async with adapter.connect() as ws:
+                    backoff.connected()
+                    adapter.on_connect()
+                    for message in subscribe:
+                        await ws.send(message)
+                    self._connected(name, True)
+                    logger.info(f"[Shard {self.index}] {adapter.label} connected ({len(symbols)} pairs)")
+                    async for message in ws:
+                        received = self._received(name)
+                        kind = decoder.classify(message)
+                        if kind == TICKER:
+                            tick = decoder.decode_ticker(message)
+                            if tick is None:
+                                stats['decode_errors'] += 1
+                                continue
+                            pair_id = adapter.pair_id(tick)
+                            if pair_id is not None:
+                                stats['quotes'] += 1
+                                self.emit(adapter.index, pair_id, tick, received, time.perf_counter_ns())
+                        elif kind == CONTROL:
+                            adapter.on_control(decoder.decode_control(message))
+            except Exception as e:
+                logger.error(f"[Shard {self.index}] {adapter.label} error: {str(e)}; reconnecting...")
+            self._connected(name, False)
+            backoff.disconnected(delivered=stats['quotes'] > seen)
+            await asyncio.sleep(backoff.next_delay())
+
+    async def report_stats(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            self.conn.send_bytes(STATS_MSG + json.dumps(self.stats).encode())
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        await asyncio.gather(*(self.feed(adapter) for adapter in self.adapters.values()), self.report_stats())
+
+def worker_main(index: int, config: Config, pair_ids: List[int], conn, urls: Optional[Dict[str, str]] = None,
+                venues: Optional[Sequence[str]] = None):
+    """Worker process entry point; exits when the coordinator goes away"""
+    # Ctrl-C goes to the whole process group; the coordinator decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(ShardWorker(index, config, pair_ids, conn, urls, venues).run())
+    except (BrokenPipeError, EOFError, OSError):
+        pass
+
+class Shard:
+    __slots__ = ('index', 'pair_ids', 'process', 'conn', 'stats', 'restarts')
+
+    def __init__(self, index: int, pair_ids: List[int]):
+        self.index = index
+        self.pair_ids = pair_ids
+        self.process = None
+        self.conn = None
+        self.stats = None
+        self.restarts = 0
+
+class ShardedFeeds:
+    """Coordinator side: starts the workers, drains their pipes and calls on_quote per record.
+
+    on_quote(exchange, pair_id, bid, ask, last, exchange_ts, received, decoded_ns)
+    may be a plain function or a coroutine function; exchange is an index into
+    EXCHANGES, missing prices and exchange_ts are NaN, and received is
+    (wall time, perf_counter_ns). Worker counters are summed into feeds
+    (FeedStats by exchange name) when given. venues limits the workers to
+    those exchanges (default every one).
+    """
+
+    def __init__(self, config: Config, pair_ids: Sequence[int], n_workers: int, on_quote: Callable,
+                 feeds: Optional[Dict] = None, urls: Optional[Dict[str, str]] = None,
+                 venues: Optional[Sequence[str]] = None):
+        self.config = config
+        self.on_quote = on_quote
+        self.feeds = feeds
+        self.urls = urls
+        self.venues = venues
+        self.shards = [Shard(i, ids) for i, ids in enumerate(shard_pairs(pair_ids, n_workers))]
+        self.quotes = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._ready = asyncio.Event()
+        self._loop = None
+
+    def _start(self, shard: Shard):
+        reader, writer = self._context.Pipe(duplex=False)
+        shard.process = self._context.Process(
+            target=worker_main, name=f"feed-shard-{shard.index}", daemon=True,
+            args=(shard.index, self.config, shard.pair_ids, writer, self.urls, self.venues)
+        )
+        shard.process.start()
+        writer.close()
+        shard.conn = reader
+        self._loop.add_reader(reader.fileno(), self._ready.set)
+        logger.info(f"[Shards] Worker {shard.index} (pid {shard.process.pid}) owns {len(shard.pair_ids)} pairs")
+
+    def _stop(self, shard: Shard):
+        if shard.conn is not None:
+            self._loop.remove_reader(shard.conn.fileno())
+            shard.conn.close()
+            shard.conn = None
+        if shard.process is not None:
+            if shard.process.is_alive():
+                shard.process.terminate()
+            shard.process.join(timeout=2)
+            shard.process = None
+
+    async def _drain(self, shard: Shard):
+        on_quote = self.on_quote
+        is_async = asyncio.iscoroutinefunction(on_quote)
+        while shard.conn is not None and shard.conn.poll():
+            try:
+                data = shard.conn.recv_bytes()
+            except (EOFError, OSError):
+                # Worker exited; the health check restarts it
+                self._loop.remove_reader(shard.conn.fileno())
+                shard.conn.close()
+                shard.conn = None
+                return
+            if data[:1] == QUOTES_MSG:
+                records = QUOTE.iter_unpack(memoryview(data)[1:])
+                for exchange, pair_id, bid, ask, last, exchange_ts, recv_wall, recv_ns, decoded_ns in records:
+                    result = on_quote(exchange, pair_id, bid, ask, last, exchange_ts,
+                                      (recv_wall, recv_ns), decoded_ns)
+                    if is_async:
+                        await result
+                self.quotes += (len(data) - 1) // QUOTE.size
+            elif data[:1] == STATS_MSG:
+                shard.stats = json.loads(data[1:])
+                self._update_feeds()
+            # Let other tasks in between pipe messages when a backlog builds up
+            await asyncio.sleep(0)
+
+    def _update_feeds(self):
+        if not self.feeds:
+            return
+        for exchange, feed in self.feeds.items():
+            reports = [shard.stats[exchange] for shard in self.shards if shard.stats]
+            if not reports:
+                continue
+            feed.messages = sum(r['messages'] for r in reports)
+            feed.decode_errors = sum(r['decode_errors'] for r in reports)
+            reconnects = sum(r['reconnects'] for r in reports) + sum(s.restarts for s in self.shards)
+            connected = all(r['connected'] for r in reports)
+            # Reports come once a second, so a quick reconnect may only show up in the count;
+            # the gap is then timed from the last frame of the previous report
+            if reconnects > feed.reconnects or (feed.connected and not connected):
+                feed.open_gap()
+            feed.reconnects = reconnects
+            feed.connected = connected
+            seen = [r['last_message'] for r in reports if r['last_message'] is not None]
+            feed.last_message = max(seen) if seen else None
+
+    async def _health(self):
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            for shard in self.shards:
+                if shard.process is not None and not shard.process.is_alive():
+                    logger.error(
+                        f"[Shards] Worker {shard.index} exited (code {shard.process.exitcode}); restarting"
+                    )
+                    self._stop(shard)
+                    shard.restarts += 1
+                    self._start(shard)
+
+    async def run(self):
+        """Start every worker and dispatch their quotes until cancelled"""
+        self._loop = asyncio.get_running_loop()
+        for shard in self.shards:
+            self._start(shard)
+        health = asyncio.create_task(self._health())
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                for shard in self.shards:
+                    await self._drain(shard)
+        finally:
+            health.cancel()
+            for shard in self.shards:
+                self._stop(shard)
@@ -0,0 +1,126 @@
+from typing import NamedTuple, Sequence
+import numpy as np
+
+from exchanges import VENUES
+from quote_clock import QuoteClock
+
+# Column layout of ArbitrageEngine.params
+BUY_MULT, SELL_MULT, MIN_SPREAD, MIN_SPREAD_PCT, NOTIONAL = range(5)
+
+class Opportunities(NamedTuple):
+    """Qualifying (pair, route) hits and their net spreads, ordered by pair"""
+    pair_ids: np.ndarray
+    routes: np.ndarray       # index into ArbitrageEngine.routes
+    net: np.ndarray
+    stale: np.ndarray        # per route: hits suppressed because a leg was older than max_age
+
+class ArbitrageEngine:
+    """Top-of-book quotes and per-pair trading parameters in contiguous arrays.
+
+    Rows are indexed by InstrumentRegistry id and columns by venue, so every
+    ordered (buy venue, sell venue) route is evaluated for the whole universe
+    (or any subset of ids) in one pass. Routes are gathered through fixed
+    index arrays: a quote costs the same however many venues there are, and
+    an evaluation is one (pairs x routes) array expression. Missing quotes
+    are NaN and never qualify; with max_age set, neither do routes whose
+    buy or sell leg is older than max_age seconds.
+    """
+
+    def __init__(self, n_pairs: int, max_age: float = 0.0, skew_window: int = 1000,
+                 venues: Sequence[str] = VENUES, listed: np.ndarray = None):
+        self.n_pairs = n_pairs
+        self.venues = tuple(venues)
+        n_venues = len(self.venues)
+        # One row per pair so a subset is gathered with a single fancy index
+        self.bids = np.full((n_pairs, n_venues), np.nan)
+        self.asks = np.full((n_pairs, n_venues), np.nan)
+        self.params = np.zeros((n_pairs, 5))
+        self.params[:, BUY_MULT] = 1.0
+        self.params[:, SELL_MULT] = 1.0
+        # Receive, exchange and as-of times of each venue's last quote
+        self.clock = QuoteClock(n_pairs, self.venues, skew_window, listed)
+        self.quote_time = self.clock.received
+        self.max_age = max_age
+        self.watched = np.zeros(n_pairs, dtype=bool)
+        self.dirty = np.zeros(n_pairs, dtype=bool)
+        self._dirty_ids = []
+
+        # Every ordered venue pair: buy at routes[r][0]'s ask, sell at routes[r][1]'s bid
+        self.routes = [(b, s) for b in range(n_venues) for s in range(n_venues) if b != s]
+        self.route_names = [f"buy_{self.venues[b]}_sell_{self.venues[s]}" for b, s in self.routes]
+        self.buy_venue = np.array([b for b, _ in self.routes], dtype=np.int64)
+        self.sell_venue = np.array([s for _, s in self.routes], dtype=np.int64)
+        no_stale = np.zeros(len(self.routes), dtype=np.int64)
+        no_stale.flags.writeable = False
+        empty = np.empty(0, dtype=np.int64)
+        self._nothing = Opportunities(empty, empty, np.empty(0), no_stale)
+
+    def configure(self, pair_id: int, fee_buy: float, fee_sell: float,
+                  min_spread: float = 0.0, min_spread_pct: float = 0.0, notional: float = 0.0):
+        """Set taker fees, thresholds (absolute in quote currency, and relative to the
+        buy price) and the trade size in quote currency used for depth-aware checks"""
+        self.params[pair_id] = (1 + fee_buy, 1 - fee_sell, min_spread, min_spread_pct, notional)
+        self.watched[pair_id] = True
+
+    def trade_params(self, pair_id: int):
+        """(fee_buy, fee_sell, min_spread, min_spread_pct, notional) for one pair"""
+        buy_mult, sell_mult, min_spread, min_spread_pct, notional = self.params[pair_id].tolist()
+        return buy_mult - 1, 1 - sell_mult, min_spread, min_spread_pct, notional
+
+    def _mark(self, pair_id: int):
+        if not self.dirty[pair_id]:
+            self.dirty[pair_id] = True
+            self._dirty_ids.append(pair_id)
+
+    def update(self, pair_id: int, venue: int, bid: float, ask: float,
+               exchange_ts: float = None, received_wall: float = None):
+        """Store one venue's top of book (venue is an index into venues)"""
+        self.bids[pair_id, venue] = bid
+        self.asks[pair_id, venue] = ask
+        self.clock.stamp(pair_id, venue, exchange_ts, received_wall)
+        self._mark(pair_id)
+
+    def pending(self) -> int:
+        """Pairs quoted since the last take_dirty"""
+        return len(self._dirty_ids)
+
+    def take_dirty(self) -> np.ndarray:
+        """Return and clear the watched pair ids quoted since the last call"""
+        if not self._dirty_ids:
+            return np.empty(0, dtype=np.int64)
+        idx = np.array(self._dirty_ids, dtype=np.int64)
+        self._dirty_ids = []
+        self.dirty[idx] = False
+        return idx[self.watched[idx]]
+
+    def net_spreads(self, idx=None) -> np.ndarray:
+        """(pairs, routes) net spread per unit after taker fees"""
+        idx = np.arange(self.n_pairs) if idx is None else np.asarray(idx)
+        p = self.params[idx]
+        at = idx[:, None]
+        sell = self.bids[at, self.sell_venue] * p[:, SELL_MULT, None]
+        return sell - self.asks[at, self.buy_venue] * p[:, BUY_MULT, None]
+
+    def evaluate(self, idx=None) -> Opportunities:
+        """Evaluate every route for idx (default: every watched pair)"""
+        if idx is None:
+            idx = np.flatnonzero(self.watched)
+        p = self.params[idx]
+        # (pairs, routes) gathers: the buy leg's ask and the sell leg's bid of every route
+        at = idx[:, None]
+        buy = self.asks[at, self.buy_venue]
+        net = self.bids[at, self.sell_venue] * p[:, SELL_MULT, None] - buy * p[:, BUY_MULT, None]
+        # Thresholds: the larger of the absolute floor and the share of the buy price.
+        # NaN (missing quote) compares False, so incomplete routes drop out here.
+        hit = net > np.maximum(p[:, MIN_SPREAD, None], p[:, MIN_SPREAD_PCT, None] * buy)
+        if not hit.any():
+            # The common path: nothing qualifies, so no freshness check and no result arrays
+            return self._nothing
+        stale = self._nothing.stale
+        if self.max_age > 0:
+            legs = self.clock.fresh_legs(idx, self.max_age)
+            fresh = legs[:, self.buy_venue] & legs[:, self.sell_venue]
+            stale = np.count_nonzero(hit & ~fresh, axis=0)
+            hit &= fresh
+        rows, cols = np.nonzero(hit)
+        return Opportunities(idx[rows], cols, net[rows, cols], stale)
@@ -0,0 +1,294 @@
+"""Query the stored spread history (see --store) without loading it into pandas.
+
+Reads the Hive-partitioned Parquet dataset written by ParquetSink as a
+stream of record batches: date and group filters prune whole directories,
+only the columns an aggregation needs are read, files are memory-mapped,
+and every aggregation keeps fixed-size per-pair state, so memory does not
+grow with the time range.
+
+    python spread_query.py stats --pair SOL-EUR --since 7d
+    python spread_query.py above 0.5 --group eur --since 2024-05-01 --until 2024-05-08
+    python spread_query.py top -n 10 --by p99 --since 24h
+
+Percentiles come from log-spaced histograms (16 buckets per decade, about
+15% wide), interpolated within the bucket. Time above a threshold counts the time between consecutive
+updates of a pair while its variation was above it; gaps longer than
+--max-gap seconds (feed outages, restarts) are not counted.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import re
+import sys
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from config import Config
+from parquet_sink import PARTITIONING
+
+# Histogram bucket upper bounds in percent: 16 per decade from 0.0001% to 1000%.
+# The extra last bucket collects anything wider.
+BUCKET_BOUNDS = 10 ** (np.arange(-4 * 16, 3 * 16 + 1) / 16)
+N_BUCKETS = len(BUCKET_BOUNDS) + 1
+
+BATCH_ROWS = 1 << 16
+
+_RELATIVE = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$')
+_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+def parse_time(text: str, now: datetime = None) -> datetime:
+    """ISO date/datetime (UTC unless it carries an offset) or a span back from now like 90m, 24h, 7d"""
+    now = now or datetime.now(timezone.utc)
+    match = _RELATIVE.match(text.strip())
+    if match:
+        return now - timedelta(**{_UNITS[match.group(2)]: float(match.group(1))})
+    when = datetime.fromisoformat(text)
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+class SpreadScan:
+    """Filtered, projected batch stream over <root>/spreads"""
+
+    def __init__(self, root: str, pairs: List[str] = None, groups: List[str] = None,
+                 since: datetime = None, until: datetime = None):
+        self.path = os.path.join(root, 'spreads')
+        self.dataset = ds.dataset(
+            self.path, format='parquet', partitioning=PARTITIONING,
+            filesystem=fs.LocalFileSystem(use_mmap=True)
+        )
+        conditions = []
+        # Partition columns first: these drop whole directories before any file is opened
+        if since is not None:
+            conditions.append(ds.field('date') >= pa.scalar(since.date(), pa.date32()))
+            conditions.append(ds.field('ts') >= pa.scalar(since, pa.timestamp('us', tz='UTC')))
+        if until is not None:
+            conditions.append(ds.field('date') <= pa.scalar(until.date(), pa.date32()))
+            conditions.append(ds.field('ts') < pa.scalar(until, pa.timestamp('us', tz='UTC')))
+        if groups:
+            conditions.append(ds.field('group').isin(groups))
+        self.pairs = set(pairs) if pairs else None
+        self.filter = None
+        for condition in conditions:
+            self.filter = condition if self.filter is None else self.filter & condition
+
+    def batches(self) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]]:
+        """(pair labels, per-row label index, ts seconds, variation) for each non-empty batch"""
+        scanner = self.dataset.scanner(
+            columns=['ts', 'pair', 'variation'], filter=self.filter, batch_size=BATCH_ROWS
+        )
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            pair = batch.column(1)
+            if isinstance(pair, pa.DictionaryArray):
+                labels = pair.dictionary.to_pylist()
+                codes = pair.indices.to_numpy(zero_copy_only=False)
+            else:
+                encoded = pc.dictionary_encode(pair)
+                labels = encoded.dictionary.to_pylist()
+                codes = encoded.indices.to_numpy(zero_copy_only=False)
+            ts = batch.column(0).cast(pa.int64()).to_numpy() / 1e6
+            variation = batch.column(2).to_numpy(zero_copy_only=False)
+            if self.pairs is not None:
+                wanted = np.array([label in self.pairs for label in labels], dtype=bool)
+                keep = wanted[codes]
+                if not keep.any():
+                    continue
+                codes, ts, variation = codes[keep], ts[keep], variation[keep]
+            yield labels, codes, ts, variation
+
+class SpreadStats:
+    """Running per-pair aggregates: count, sum, min, max, histogram and time above a threshold"""
+
+    def __init__(self, threshold: float = None, max_gap: float = 60.0):
+        self.threshold = threshold
+        self.max_gap = max_gap
+        self.index: Dict[str, int] = {}
+        self.labels: List[str] = []
+        self._alloc(16)
+
+    def _alloc(self, capacity: int):
+        old = getattr(self, 'count', None)
+        fields = {
+            'count': (np.int64, 0), 'total': (np.float64, 0.0),
+            'low': (np.float64, np.inf), 'high': (np.float64, -np.inf),
+            'last_ts': (np.float64, np.nan),
+            'last_above': (bool, False), 'observed': (np.float64, 0.0), 'above': (np.float64, 0.0),
+        }
+        for name, (dtype, fill) in fields.items():
+            grown = np.full(capacity, fill, dtype=dtype)
+            if old is not None:
+                grown[:len(old)] = getattr(self, name)
+            setattr(self, name, grown)
+        hist = np.zeros((capacity, N_BUCKETS), dtype=np.int64)
+        if old is not None:
+            hist[:len(old)] = self.hist
+        self.hist = hist
+
+    def _global_codes(self, labels: List[str]) -> np.ndarray:
+        index = self.index
+        for label in labels:
+            if label not in index:
+                index[label] = len(self.labels)
+                self.labels.append(label)
+        if len(self.labels) > len(self.count):
+            self._alloc(max(len(self.labels), 2 * len(self.count)))
+        return np.array([index[label] for label in labels], dtype=np.int64)
+
+    def add(self, labels: List[str], codes: np.ndarray, ts: np.ndarray, variation: np.ndarray):
+        pair = self._global_codes(labels)[codes]
+        n = len(self.count)
+        self.count += np.bincount(pair, minlength=n)
+        self.total += np.bincount(pair, weights=variation, minlength=n)
+        np.minimum.at(self.low, pair, variation)
+        np.maximum.at(self.high, pair, variation)
+        buckets = np.searchsorted(BUCKET_BOUNDS, variation)
+        self.hist += np.bincount(pair * N_BUCKETS + buckets, minlength=n * N_BUCKETS).reshape(n, N_BUCKETS)
+        if self.threshold is not None:
+            self._add_durations(pair, ts, variation)
+
+    def _add_durations(self, pair: np.ndarray, ts: np.ndarray, variation: np.ndarray):
+        """Credit each interval between consecutive updates of a pair to the earlier update's state"""
+        order = np.lexsort((ts, pair))
+        pair, ts = pair[order], ts[order]
+        above = variation[order] > self.threshold
+        starts = np.ones(len(pair), dtype=bool)
+        starts[1:] = pair[1:] != pair[:-1]
+
+        # Interval from each pair's last update in earlier batches to its first one here
+        prev_ts = self.last_ts[pair]
+        prev_above = self.last_above[pair]
+        # Intervals inside the batch
+        prev_ts[~starts] = ts[:-1][~starts[1:]]
+        prev_above[~starts] = above[:-1][~starts[1:]]
+
+        dt = ts - prev_ts
+        valid = (dt >= 0) & (dt <= self.max_gap)      # NaN (no earlier update) is never valid
+        dt = np.where(valid, dt, 0.0)
+        n = len(self.count)
+        self.observed += np.bincount(pair, weights=dt, minlength=n)
+        self.above += np.bincount(pair, weights=np.where(prev_above, dt, 0.0), minlength=n)
+
+        ends = np.ones(len(pair), dtype=bool)
+        ends[:-1] = pair[1:] != pair[:-1]
+        self.last_ts[pair[ends]] = ts[ends]
+        self.last_above[pair[ends]] = above[ends]
+
+    def percentile(self, i: int, q: float) -> Optional[float]:
+        """Interpolated geometrically inside the bucket holding the q-th percentile"""
+        counts = self.hist[i]
+        total = counts.sum()
+        if not total:
+            return None
+        cumulative = np.cumsum(counts)
+        target = total * q / 100
+        bucket = int(np.searchsorted(cumulative, target))
+        if bucket >= len(BUCKET_BOUNDS):
+            return float(self.high[i])
+        upper = BUCKET_BOUNDS[bucket]
+        lower = BUCKET_BOUNDS[bucket - 1] if bucket else self.low[i]
+        before = cumulative[bucket - 1] if bucket else 0
+        fraction = (target - before) / counts[bucket]
+        value = lower * (upper / lower) ** fraction if lower > 0 else upper * fraction
+        return float(min(max(value, self.low[i]), self.high[i]))
+
+    def rows(self, quantiles=(50, 90, 99)) -> List[dict]:
+        result = []
+        for i, label in enumerate(self.labels):
+            if not self.count[i]:
+                continue
+            row = {
+                'pair': label,
+                'updates': int(self.count[i]),
+                'mean': float(self.total[i] / self.count[i]),
+                'min': float(self.low[i]),
+                'max': float(self.high[i]),
+            }
+            for q in quantiles:
+                row[f"p{q:g}"] = self.percentile(i, q)
+            if self.threshold is not None:
+                row['observed_s'] = float(self.observed[i])
+                row['above_s'] = float(self.above[i])
+                row['above_pct'] = float(self.above[i] / self.observed[i] * 100) if self.observed[i] else None
+            result.append(row)
+        return result
+
+def run_scan(scan: SpreadScan, stats: SpreadStats) -> SpreadStats:
+    for labels, codes, ts, variation in scan.batches():
+        stats.add(labels, codes, ts, variation)
+    return stats
+
+def _format(value) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+def print_rows(rows: List[dict], as_json: bool = False, out=sys.stdout):
+    if as_json:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+        return
+    if not rows:
+        out.write("No matching spread updates\n")
+        return
+    columns = list(rows[0])
+    cells = [[_format(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    out.write("  ".join(c.ljust(w) for c, w in zip(columns, widths)) + "\n")
+    for r in cells:
+        out.write("  ".join(v.ljust(w) for v, w in zip(r, widths)) + "\n")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query stored Kraken/Coinbase spread history")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--data', metavar='DIR', help="storage root (default storage.path from config.json)")
+    common.add_argument('--pair', action='append', help="standard pair, e.g. SOL-EUR (repeatable)")
+    common.add_argument('--group', action='append', help="quote group: usd, eur, gbp, btc, eth, stablecoin (repeatable)")
+    common.add_argument('--since', type=parse_time, help="start: ISO date/time (UTC) or 90m, 24h, 7d back")
+    common.add_argument('--until', type=parse_time, help="end (exclusive), same formats as --since")
+    common.add_argument('--max-gap', type=float, default=60.0, metavar='SECS',
+                        help="ignore intervals between updates longer than this")
+    common.add_argument('--json', action='store_true', help="one JSON object per line")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('stats', parents=[common], help="per-pair count, mean, min/max and percentiles")
+    above = commands.add_parser('above', parents=[common], help="time each pair spent above a variation")
+    above.add_argument('threshold', type=float, help="variation in percent, e.g. 0.5")
+    top = commands.add_parser('top', parents=[common], help="top N pairs by a statistic")
+    top.add_argument('-n', type=int, default=10)
+    top.add_argument('--by', choices=('max', 'mean', 'p50', 'p90', 'p99', 'above_s', 'above_pct'), default='max')
+    top.add_argument('--threshold', type=float, default=0.5, help="variation for --by above_s/above_pct")
+    args = parser.parse_args(argv)
+    args.data = args.data or Config.load().storage.path
+    path = os.path.join(args.data, 'spreads')
+    if not os.path.isdir(path):
+        parser.error(f"no stored spreads under {path}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    scan = SpreadScan(args.data, args.pair, args.group, args.since, args.until)
+    threshold = None
+    if args.command == 'above' or (args.command == 'top' and args.by.startswith('above')):
+        threshold = args.threshold
+    rows = run_scan(scan, SpreadStats(threshold, args.max_gap)).rows()
+    if args.command == 'above':
+        rows = [{k: row[k] for k in ('pair', 'updates', 'observed_s', 'above_s', 'above_pct', 'max')}
+                for row in rows]
+        rows.sort(key=lambda row: row['above_s'], reverse=True)
+    elif args.command == 'top':
+        rows = [row for row in rows if row[args.by] is not None]
+        rows.sort(key=lambda row: row[args.by], reverse=True)
+        rows = rows[:args.n]
+    else:
+        rows.sort(key=lambda row: row['pair'])
+    print_rows(rows, args.json)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Rolling statistics of each pair's spread variation.
+
+Every pair owns a fixed slice of one preallocated ring buffer (the last
+window values and their times), so memory is n_pairs x window however
+long the process runs. A tick updates, in constant time:
+
+    mean, variance   over the window: Welford's update, sliding (the value
+                     falling out of the window is removed as the new one
+                     enters), which avoids the cancellation of sum/sum of
+                     squares on small spreads
+    ewma, ewm std    exponentially weighted, with a half-life in ticks
+    z                the new value against the window as it was before it
+
+Min, max and tick rate are read from the ring when asked for, for the rows
+on screen or an anomaly, so no tick pays for them. State lives in flat
+array('d') buffers: per-tick access stays in plain Python (NumPy scalar
+indexing costs more than the arithmetic), and snapshot() reads them through
+zero-copy NumPy views.
+"""
+from array import array
+from collections import namedtuple
+import math
+import numpy as np
+
+COLUMNS = ('z', 'mean', 'std', 'min', 'max', 'ewma', 'rate')
+
+StatsRow = namedtuple('StatsRow', ['samples'] + list(COLUMNS))
+
+class SpreadStats:
+    """Windowed and exponentially weighted variation statistics per pair"""
+
+    def __init__(self, n_pairs: int, window: int = 300, halflife: float = 20.0, min_samples: int = 20):
+        self.window = max(2, window)
+        self.alpha = 1.0 - 0.5 ** (1.0 / max(halflife, 1e-9))
+        self.min_samples = min(max(2, min_samples), self.window)
+        self.n_pairs = 0
+        self.values = array('d')
+        self.times = array('d')
+        self.head = array('l')      # next ring position to write
+        self.count = array('l')     # values in the window
+        self.mean = array('d')
+        self.m2 = array('d')        # sum of squared deviations from the mean
+        self.ewma = array('d')
+        self.ewvar = array('d')
+        self.z = array('d')
+        self.resize(n_pairs)
+
+    def resize(self, n_pairs: int):
+        """Grow to n_pairs (pairs added on a config reload)"""
+        extra = n_pairs - self.n_pairs
+        if extra <= 0:
+            return
+        ring = array('d', bytes(self.values.itemsize * extra * self.window))
+        self.values.extend(ring)
+        self.times.extend(ring)
+        for column in (self.head, self.count):
+            column.extend([0] * extra)
+        for column in (self.mean, self.m2, self.ewma, self.ewvar, self.z):
+            column.extend([0.0] * extra)
+        self.n_pairs = n_pairs
+
+    def reset(self, pair_id: int):
+        """Start a pair's statistics over (one of its legs now means another market)"""
+        self.head[pair_id] = 0
+        self.count[pair_id] = 0
+        for column in (self.mean, self.m2, self.ewma, self.ewvar, self.z):
+            column[pair_id] = 0.0
+
+    def push(self, pair_id: int, value: float, now: float) -> float:
+        """Add one observation at time now; returns its z-score (0.0 until min_samples)"""
+        count = self.count[pair_id]
+        mean = self.mean[pair_id]
+        m2 = self.m2[pair_id]
+        z = 0.0
+        if count >= self.min_samples and m2 > 0.0:
+            z = (value - mean) / math.sqrt(m2 / count)
+
+        window = self.window
+        head = self.head[pair_id]
+        slot = pair_id * window + head
+        if count == window:
+            # Slide: the oldest value leaves as this one enters
+            old = self.values[slot]
+            new_mean = mean + (value - old) / window
+            m2 += (value - old) * (value - new_mean + old - mean)
+            if m2 < 0.0:
+                m2 = 0.0
+        else:
+            count += 1
+            self.count[pair_id] = count
+            new_mean = mean + (value - mean) / count
+            m2 += (value - mean) * (value - new_mean)
+        self.values[slot] = value
+        self.times[slot] = now
+        self.head[pair_id] = head + 1 if head + 1 < window else 0
+        self.mean[pair_id] = new_mean
+        self.m2[pair_id] = m2
+
+        if count == 1:
+            self.ewma[pair_id] = value
+        else:
+            alpha = self.alpha
+            ewma = self.ewma[pair_id]
+            diff = value - ewma
+            self.ewma[pair_id] = ewma + alpha * diff
+            self.ewvar[pair_id] = (1.0 - alpha) * (self.ewvar[pair_id] + alpha * diff * diff)
+        self.z[pair_id] = z
+        return z
+
+    def _oldest(self, pair_id: int) -> int:
+        return pair_id * self.window + (self.head[pair_id] if self.count[pair_id] == self.window else 0)
+
+    def row(self, pair_id: int) -> StatsRow:
+        """Every statistic of one pair (NaN until it has two samples)"""
+        count = self.count[pair_id]
+        if count < 2:
+            return StatsRow(count, *([math.nan] * len(COLUMNS)))
+        base = pair_id * self.window
+        # Unfilled rings hold their values in [0, count)
+        recent = self.values[base:base + count]
+        newest = self.times[base + (self.head[pair_id] - 1) % self.window]
+        span = newest - self.times[self._oldest(pair_id)]
+        return StatsRow(
+            count,
+            self.z[pair_id],
+            self.mean[pair_id],
+            math.sqrt(self.m2[pair_id] / count),
+            min(recent),
+            max(recent),
+            self.ewma[pair_id],
+            (count - 1) / span if span > 0 else math.nan,
+        )
+
+    def snapshot(self, idx=None) -> dict:
+        """Vectorized columns for idx (default: every pair), plus samples and ewm_std"""
+        idx = np.arange(self.n_pairs) if idx is None else np.asarray(idx, dtype=np.int64)
+        ints = np.dtype(f"i{self.count.itemsize}")
+        count = np.frombuffer(self.count, dtype=ints)[idx]
+        head = np.frombuffer(self.head, dtype=ints)[idx]
+        ring = np.frombuffer(self.values).reshape(-1, self.window)[idx]
+        times = np.frombuffer(self.times).reshape(-1, self.window)[idx]
+        filled = np.arange(self.window) < count[:, None]
+        rows = np.arange(len(idx))
+        span = times[rows, (head - 1) % self.window] - times[rows, np.where(count == self.window, head, 0)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'samples': count,
+                'z': np.frombuffer(self.z)[idx],
+                'mean': np.where(count > 0, np.frombuffer(self.mean)[idx], np.nan),
+                'std': np.sqrt(np.frombuffer(self.m2)[idx] / count),
+                'min': np.where(count > 0, np.where(filled, ring, np.inf).min(axis=1), np.nan),
+                'max': np.where(count > 0, np.where(filled, ring, -np.inf).max(axis=1), np.nan),
+                'ewma': np.where(count > 0, np.frombuffer(self.ewma)[idx], np.nan),
+                'rate': np.where((count > 1) & (span > 0), (count - 1) / span, np.nan),
+                'ewm_std': np.sqrt(np.frombuffer(self.ewvar)[idx]),
+            }
@@ -0,0 +1,169 @@
+"""Spread updates as a stream instead of a curses table.
+
+SpreadStream stands in for ConsoleUI when the monitor runs headless: the
+ingestion and variation pipeline marks slots dirty exactly as before, and
+instead of drawing rows the stream writes one record per update.
+
+With a conflation window every pair is written at most once per window
+(its latest values); with no window every update is written. Records are
+batched and flushed together, so the cost per update is one encode.
+
+Formats:
+    ndjson  {"pair":"BTC-USD","ts":...,"kraken":...,"coinbase":...,"variation":...}
+    binary  header: MAGIC, uint16 version, uint32 length, newline-separated pair names
+            records: RECORD (uint16 slot, float64 ts, kraken, coinbase, variation)
+"""
+from typing import BinaryIO, Iterator, List, Tuple
+import json
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'binary')
+
+MAGIC = b'SPRD'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+RECORD = struct.Struct('<Hdddd')
+
+# How often batched records are flushed when updates are not conflated
+FLUSH_INTERVAL = 0.05
+
+class SpreadStream:
+    """Writes SpreadTable rows to a binary file object; drop-in for the parts of ConsoleUI the monitor drives"""
+
+    def __init__(self, out: BinaryIO, fmt: str = 'ndjson', conflate: float = 0.0):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown stream format: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.conflate = conflate
+        self.interval = conflate if conflate > 0 else FLUSH_INTERVAL
+        self.table = None
+        self.dirty_slots = set()
+        self.full_redraw = False
+        self.closed = False
+        self.records = 0
+        self._batch = []
+        self._queued = 0           # records in _batch (the binary header is not one)
+        self._names = []
+        self._named = 0            # slots the header or name list covers
+
+    def bind(self, table) -> 'SpreadStream':
+        """Attach the table to stream from and write the format header"""
+        self.table = table
+        if self.fmt == 'ndjson':
+            # Pre-encoded JSON strings, one per slot
+            self._names = [json.dumps(pair) for pair in table.pairs]
+        else:
+            names = "\n".join(table.pairs).encode('utf-8')
+            self._batch.append(HEADER.pack(MAGIC, VERSION, len(names)) + names)
+        self._named = len(table.pairs)
+        return self
+
+    def add_pairs(self, table):
+        """Follow pairs added to the table after bind (config reload).
+
+        NDJSON names every record, so new pairs simply appear. The binary
+        header was written once, so a binary stream keeps the pairs it
+        started with.
+        """
+        if self.fmt == 'ndjson':
+            self._names = [json.dumps(pair) for pair in table.pairs]
+            self._named = len(table.pairs)
+        elif len(table.slots) > self._named:
+            logger.warning("Binary spread stream: pairs added after startup are not streamed until a restart")
+
+    def _encode(self, slot: int) -> bytes:
+        table = self.table
+        if self.fmt == 'binary':
+            if slot >= self._named:
+                return b''
+            return RECORD.pack(slot, table.timestamp[slot], table.kraken_price[slot],
+                               table.coinbase_price[slot], table.variation[slot])
+        return (
+            f'{{"pair":{self._names[slot]},"ts":{table.timestamp[slot]!r},'
+            f'"kraken":{table.kraken_price[slot]!r},"coinbase":{table.coinbase_price[slot]!r},'
+            f'"variation":{table.variation[slot]!r}}}\n'
+        ).encode('utf-8')
+
+    def mark_dirty(self, slot=None):
+        """Queue a changed slot (every quoted slot if None); unconflated updates are encoded right away"""
+        if slot is None:
+            self.full_redraw = True
+        elif self.conflate > 0:
+            self.dirty_slots.add(slot)
+        else:
+            record = self._encode(slot)
+            if record:
+                self._batch.append(record)
+                self._queued += 1
+
+    def frame_pending(self) -> bool:
+        return bool(self.dirty_slots or self.full_redraw or self._batch)
+
+    def record_trend(self, pair, price):
+        """Trend arrows only exist on screen"""
+
+    def draw_status(self, message):
+        logger.info(f"Status: {message}")
+
+    def draw_variations(self, table=None):
+        """Encode every queued slot and flush the batch"""
+        table = table or self.table
+        if self.full_redraw:
+            slots = table.valid.nonzero()[0].tolist()
+            self.full_redraw = False
+            self.dirty_slots.clear()
+        else:
+            slots = self.dirty_slots
+        encode = self._encode
+        records = [record for record in map(encode, slots) if record]
+        self._batch.extend(records)
+        self._queued += len(records)
+        self.dirty_slots = set()
+        self.flush()
+
+    def flush(self):
+        if not self._batch or self.closed:
+            self._batch.clear()
+            self._queued = 0
+            return
+        batch, queued = self._batch, self._queued
+        self._batch, self._queued = [], 0
+        try:
+            self.out.write(b"".join(batch))
+            self.out.flush()
+        except (BrokenPipeError, ValueError) as e:
+            # Reader went away (e.g. piped into head) or the file was closed
+            logger.warning(f"Spread stream closed: {str(e)}")
+            self.closed = True
+            return
+        self.records += queued
+
+    def close(self):
+        self.flush()
+        self.closed = True
+
+def read_binary(f: BinaryIO) -> Iterator[Tuple[str, float, float, float, float]]:
+    """Decode a binary spread stream into (pair, ts, kraken, coinbase, variation) tuples"""
+    magic, version, length = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a spread stream")
+    pairs: List[str] = f.read(length).decode('utf-8').split("\n")
+    size = RECORD.size
+    while True:
+        chunk = f.read(size * 4096)
+        if not chunk:
+            return
+        usable = len(chunk) - len(chunk) % size
+        for slot, ts, kraken, coinbase, variation in RECORD.iter_unpack(chunk[:usable]):
+            yield pairs[slot], ts, kraken, coinbase, variation
+        if usable != len(chunk):
+            # Partial record at the end of the read; complete it from the next one
+            rest = chunk[usable:] + f.read(size - (len(chunk) - usable))
+            if len(rest) < size:
+                return
+            slot, ts, kraken, coinbase, variation = RECORD.unpack(rest)
+            yield pairs[slot], ts, kraken, coinbase, variation
@@ -0,0 +1,204 @@
+from collections import namedtuple
+from datetime import datetime
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+SpreadRow = namedtuple(
+    'SpreadRow',
+    ['standard_pair', 'kraken_price', 'coinbase_price', 'variation_percentage', 'timestamp']
+)
+
+class SpreadView:
+    """Lightweight, read-only window over a SpreadTable for a list of slots"""
+
+    def __init__(self, table: 'SpreadTable', slots: np.ndarray):
+        self.table = table
+        self.slots = slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.slots) == 0
+
+    def itertuples(self):
+        """Yield rows in display order without materialising a DataFrame"""
+        row = self.table.row
+        for slot in self.slots.tolist():
+            yield row(slot)
+
+class SpreadTable:
+    """Fixed-capacity columnar store of Kraken/Coinbase spreads, one slot per pair.
+
+    Updates are applied in place. The slots are also kept ordered by variation
+    (descending) so the top rows can be read without sorting the whole table.
+    """
+
+    def __init__(self, pairs: List[str], capacity: Optional[int] = None):
+        self.capacity = max(capacity or 0, len(pairs))
+        self.pairs = list(pairs) + [''] * (self.capacity - len(pairs))
+        self.slots = {pair: i for i, pair in enumerate(pairs)}
+
+        self.kraken_price = np.full(self.capacity, np.nan)
+        self.coinbase_price = np.full(self.capacity, np.nan)
+        self.variation = np.zeros(self.capacity)
+        self.timestamp = np.zeros(self.capacity)
+        self.valid = np.zeros(self.capacity, dtype=bool)
+
+        # order[:size] holds valid slots by descending variation, rank is its inverse
+        self.order = np.zeros(self.capacity, dtype=np.int64)
+        self.rank = np.full(self.capacity, -1, dtype=np.int64)
+        self.size = 0
+        self._positions = np.arange(self.capacity, dtype=np.int64)
+
+        # Alphabetical slot order only changes when a pair is added
+        self.name_order = self._name_order()
+        self._filter_text = None
+        self._filter_mask = None
+        self.version = 0
+
+    def __len__(self):
+        return self.size
+
+    def _name_order(self) -> np.ndarray:
+        return np.array(sorted(self.slots.values(), key=lambda i: self.pairs[i]), dtype=np.int64)
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+        self.kraken_price = np.concatenate([self.kraken_price, np.full(extra, np.nan)])
+        self.coinbase_price = np.concatenate([self.coinbase_price, np.full(extra, np.nan)])
+        self.variation = np.concatenate([self.variation, np.zeros(extra)])
+        self.timestamp = np.concatenate([self.timestamp, np.zeros(extra)])
+        self.valid = np.concatenate([self.valid, np.zeros(extra, dtype=bool)])
+        self.order = np.concatenate([self.order, np.zeros(extra, dtype=np.int64)])
+        self.rank = np.concatenate([self.rank, np.full(extra, -1, dtype=np.int64)])
+        self._positions = np.arange(capacity, dtype=np.int64)
+        self.pairs += [''] * extra
+        self.capacity = capacity
+
+    def add(self, standard_pair: str) -> int:
+        """Give a new pair the next slot, growing the arrays when full"""
+        slot = len(self.slots)
+        if slot >= self.capacity:
+            self._grow(max(2 * self.capacity, slot + 1))
+        self.pairs[slot] = standard_pair
+        self.slots[standard_pair] = slot
+        self.name_order = self._name_order()
+        self._filter_text = None
+        self.version += 1
+        return slot
+
+    def remove(self, slot: int):
+        """Take a slot out of the table until its next update (e.g. one of its legs was relisted)"""
+        old = int(self.rank[slot])
+        if old < 0:
+            return
+        order = self.order
+        n = self.size - 1
+        order[old:n] = order[old + 1:n + 1]
+        self.rank[order[old:n]] = self._positions[old:n]
+        self.rank[slot] = -1
+        self.size = n
+        self.valid[slot] = False
+        self.version += 1
+
+    def slot(self, standard_pair: str) -> Optional[int]:
+        return self.slots.get(standard_pair)
+
+    def row(self, slot: int) -> SpreadRow:
+        return SpreadRow(
+            self.pairs[slot],
+            float(self.kraken_price[slot]),
+            float(self.coinbase_price[slot]),
+            float(self.variation[slot]),
+            float(self.timestamp[slot])
+        )
+
+    def update(self, slot: int, kraken_price: float, coinbase_price: float, timestamp: float) -> float:
+        """Store both legs for a slot, reposition it in the ranking and return its variation"""
+        variation = abs((kraken_price - coinbase_price) / kraken_price * 100)
+        self.kraken_price[slot] = kraken_price
+        self.coinbase_price[slot] = coinbase_price
+        self.timestamp[slot] = timestamp
+        self._reposition(slot, variation)
+        self.valid[slot] = True
+        self.version += 1
+        return variation
+
+    def _search(self, variation: float, n: int, skip: int) -> int:
+        """Insertion point for variation among order[:n] ignoring position skip"""
+        order = self.order
+        values = self.variation
+        lo, hi = 0, n - (1 if skip >= 0 else 0)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            idx = mid if skip < 0 or mid < skip else mid + 1
+            if values[order[idx]] >= variation:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _reposition(self, slot: int, variation: float):
+        order = self.order
+        old = int(self.rank[slot])
+        if old < 0:
+            new = self._search(variation, self.size, -1)
+            n = self.size
+            if new < n:
+                order[new + 1:n + 1] = order[new:n]
+            order[new] = slot
+            self.size = n + 1
+            self.variation[slot] = variation
+            self.rank[order[new:n + 1]] = self._positions[new:n + 1]
+            return
+
+        new = self._search(variation, self.size, old)
+        self.variation[slot] = variation
+        if new == old:
+            return
+        if new < old:
+            order[new + 1:old + 1] = order[new:old]
+            lo, hi = new, old
+        else:
+            order[old:new] = order[old + 1:new + 1]
+            lo, hi = old, new
+        order[new] = slot
+        self.rank[order[lo:hi + 1]] = self._positions[lo:hi + 1]
+
+    def _matching(self, filter_text: str) -> np.ndarray:
+        if filter_text != self._filter_text:
+            needle = filter_text.lower()
+            self._filter_mask = np.array(
+                [needle in pair.lower() for pair in self.pairs], dtype=bool
+            )
+            self._filter_text = filter_text
+        return self._filter_mask
+
+    def view(self, limit: int, sort_by: str = 'variation_percentage',
+             ascending: bool = False, filter_text: str = '') -> SpreadView:
+        """Return the first `limit` rows in the requested order"""
+        if sort_by == 'standard_pair':
+            slots = self.name_order[self.valid[self.name_order]]
+            if not ascending:
+                slots = slots[::-1]
+        else:
+            slots = self.order[:self.size]
+            if ascending:
+                slots = slots[::-1]
+        if filter_text:
+            slots = slots[self._matching(filter_text)[slots]]
+        return SpreadView(self, slots[:limit])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Materialise the valid rows as a DataFrame ordered by variation"""
+        slots = self.order[:self.size]
+        return pd.DataFrame({
+            'standard_pair': pd.Series([self.pairs[s] for s in slots], dtype='str'),
+            'kraken_price': self.kraken_price[slots],
+            'coinbase_price': self.coinbase_price[slots],
+            'variation_percentage': self.variation[slots],
+            'timestamp': pd.to_datetime([datetime.fromtimestamp(t) for t in self.timestamp[slots]])
+        })